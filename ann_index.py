@@ -0,0 +1,152 @@
+import os
+import math
+
+import numpy as np
+
+# 벡터 수가 이 값 이상이면 HNSW로 전환 (0이면 사용 안 함)
+ANN_HNSW_THRESHOLD = int(os.environ.get('ANN_HNSW_THRESHOLD', '20000'))
+# 벡터 수가 이 값 이상이면 IVF로 전환 (0이면 사용 안 함)
+ANN_IVF_THRESHOLD = int(os.environ.get('ANN_IVF_THRESHOLD', '500000'))
+
+# HNSW 파라미터
+HNSW_M = int(os.environ.get('HNSW_M', '32'))
+HNSW_EF_CONSTRUCTION = int(os.environ.get('HNSW_EF_CONSTRUCTION', '80'))
+HNSW_EF_SEARCH = int(os.environ.get('HNSW_EF_SEARCH', '64'))
+
+# IVF 파라미터 (nlist는 벡터 수에 맞춰 자동 결정)
+IVF_NPROBE = int(os.environ.get('IVF_NPROBE', '16'))
+
+INDEX_KINDS = ('flat', 'hnsw', 'ivf')
+
+def choose_index_kind(vector_count: int, hnsw_threshold: int = ANN_HNSW_THRESHOLD,
+                      ivf_threshold: int = ANN_IVF_THRESHOLD) -> str:
+    """벡터 수에 맞는 인덱스 종류 선택 (작은 코퍼스는 정확한 Flat 검색 유지)"""
+    if ivf_threshold > 0 and vector_count >= ivf_threshold:
+        return 'ivf'
+    if hnsw_threshold > 0 and vector_count >= hnsw_threshold:
+        return 'hnsw'
+    return 'flat'
+
+def unwrap_index(faiss, index):
+    """IndexIDMap 래퍼를 벗긴 실제 검색 인덱스 반환"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+def index_kind(faiss, index) -> str:
+    """FAISS 인덱스 객체의 종류 반환"""
+    if index is None:
+        return 'flat'
+    index = unwrap_index(faiss, index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf'
+    return 'flat'
+
+def ivf_nlist(vector_count: int) -> int:
+    """IVF 클러스터 수 (일반적인 4·sqrt(n) 규칙, 클러스터당 최소 39개 학습 벡터 확보)"""
+    nlist = int(4 * math.sqrt(max(vector_count, 1)))
+    return max(1, min(nlist, vector_count // 39 or 1))
+
+def build_index(faiss, kind: str, dimension: int, vectors: np.ndarray, ids=None):
+    """지정한 종류의 내적(코사인) 인덱스를 만들고 벡터 추가
+
+    ids를 주면 IndexIDMap2로 감싸 검색 결과가 청크 ID를 직접 반환합니다.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+
+    if kind == 'flat':
+        index = faiss.IndexFlatIP(dimension)
+    elif kind == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == 'ivf':
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, ivf_nlist(len(vectors)), faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = IVF_NPROBE
+        # 개별 벡터 복원/삭제를 위해 해시 기반 direct map 유지
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        raise ValueError(f"지원하지 않는 인덱스 종류: {kind} ({', '.join(INDEX_KINDS)})")
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        if len(vectors):
+            index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype='int64'))
+    elif len(vectors):
+        index.add(vectors)
+    return index
+
+def export_vectors(faiss, index, start: int = 0):
+    """인덱스의 start번째 행 이후 (청크 ID, 벡터)를 추가된 순서대로 복원"""
+    count = index.ntotal - start
+    dimension = index.d
+    if count <= 0:
+        return np.empty(0, dtype='int64'), np.empty((0, dimension), dtype='float32')
+
+    if isinstance(index, faiss.IndexIDMap):
+        ids = faiss.vector_to_array(index.id_map)[start:]
+        vectors = faiss.downcast_index(index.index).reconstruct_n(start, count)
+        return ids.astype('int64'), vectors
+    if hasattr(index, 'ids'):
+        # vector_store.MmapFlatIndex
+        return np.array(index.ids[start:], dtype='int64'), index.reconstruct_n(start, count)
+    return np.arange(start, index.ntotal, dtype='int64'), index.reconstruct_n(start, count)
+
+def index_ids(faiss, index) -> np.ndarray:
+    """인덱스에 들어 있는 청크 ID (벡터는 복원하지 않음)"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype('int64')
+    if hasattr(index, 'ids'):
+        # vector_store.MmapFlatIndex
+        return np.array(index.ids, dtype='int64')
+    return np.arange(index.ntotal, dtype='int64')
+
+def estimate_index_bytes(kind: str, vector_count: int, dimension: int) -> int:
+    """인덱스가 차지하는 메모리 추정치 (바이트)
+
+    원시 벡터(float32) + IndexIDMap2의 ID 배열과 역방향 해시맵을 기본으로,
+    HNSW는 0층 이웃 목록(2·M개 int32), IVF는 역리스트 ID와 centroid를 더합니다.
+    """
+    per_vector = dimension * 4 + 8 + 32
+    if kind == 'hnsw':
+        per_vector += 2 * HNSW_M * 4 + 8
+    elif kind == 'ivf':
+        per_vector += 8 + 16
+    extra = ivf_nlist(vector_count) * dimension * 4 if kind == 'ivf' else 0
+    return vector_count * per_vector + extra
+
+def search_params(faiss, index, ef_search: int = None, nprobe: int = None, exclude_ids=None):
+    """요청별 검색 파라미터 생성 (인덱스 종류에 맞지 않는 값은 무시)
+
+    exclude_ids(삭제 표시된 청크 ID 배열)를 주면 해당 벡터를 검색 결과에서 제외합니다.
+    """
+    kind = index_kind(faiss, index)
+    excluding = exclude_ids is not None and len(exclude_ids) > 0
+    if not (excluding or (kind == 'hnsw' and ef_search) or (kind == 'ivf' and nprobe)):
+        return None
+
+    inner = unwrap_index(faiss, index)
+    if kind == 'hnsw':
+        params = faiss.SearchParametersHNSW()
+        # 파라미터 객체의 기본값이 인덱스 설정을 덮어쓰지 않도록 현재 값을 기본으로 사용
+        params.efSearch = int(ef_search or inner.hnsw.efSearch)
+    elif kind == 'ivf':
+        params = faiss.SearchParametersIVF()
+        params.nprobe = int(nprobe or inner.nprobe)
+    else:
+        params = faiss.SearchParameters()
+
+    if excluding:
+        exclude_ids = np.ascontiguousarray(exclude_ids, dtype='int64')
+        batch = faiss.IDSelectorBatch(exclude_ids)
+        selector = faiss.IDSelectorNot(batch)
+        params.sel = selector
+        # C++ 파라미터는 selector를 소유하지 않으므로 파이썬 참조를 함께 보관
+        params.selector_refs = (batch, selector)
+        # vector_store.MmapFlatIndex가 사용하는 제외 목록
+        params.exclude_ids = exclude_ids
+    return params
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+ANN 인덱스 recall / 지연 시간 리포트
+- Flat(정확 검색)을 기준으로 HNSW, IVF의 recall@k와 쿼리 지연 시간을 측정
+- ANN_HNSW_THRESHOLD / ANN_IVF_THRESHOLD 및 efSearch / nprobe 값을 고르는 데 사용
+
+사용법:
+    python benchmark_ann.py                         # 합성 벡터 (10k, 50k, 200k)
+    python benchmark_ann.py --sizes 20000,100000 --queries 500
+    python benchmark_ann.py --user user_xxx         # 해당 사용자의 DB 임베딩 사용
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from ann_index import build_index, search_params
+
+DIMENSION = 384
+
+def synthetic_vectors(count: int, dimension: int = DIMENSION, clusters: int = 256, seed: int = 0):
+    """문장 임베딩처럼 군집된 정규화 벡터 생성"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((count, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+async def load_user_vectors(user_id: str):
+    """사용자의 DB 임베딩을 행렬로 로드"""
+    from sqlalchemy import select
+    from database import async_session, DocumentChunk
+    from embedding_codec import decode_matrix
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(DocumentChunk.embedding_vec).where(
+                DocumentChunk.user_id == user_id,
+                DocumentChunk.embedding_vec.isnot(None)
+            )
+        )
+        return decode_matrix([row.embedding_vec for row in result])
+
+def measure(index, queries, k, params, truth):
+    """쿼리별 지연 시간과 recall@k 측정"""
+    latencies = []
+    hits = 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids[0]) & set(truth[i]))
+    latencies = np.array(latencies)
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def report(vectors, query_count: int, k: int, ef_values, nprobe_values):
+    """하나의 코퍼스 크기에 대한 결과 표 출력"""
+    import faiss
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(query_count, len(vectors)), replace=False)]
+    # 자기 자신이 아닌 이웃을 찾도록 약간의 노이즈 추가
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"\n📊 벡터 {len(vectors):,}개, 쿼리 {len(queries)}개, k={k}")
+    print(f"{'인덱스':<8} {'파라미터':<14} {'구축(초)':>9} {'recall@k':>9} {'p50(ms)':>9} {'p99(ms)':>9}")
+    print("-" * 64)
+
+    start = time.perf_counter()
+    flat = build_index(faiss, 'flat', vectors.shape[1], vectors)
+    flat_build = time.perf_counter() - start
+    _, truth = flat.search(queries, k)
+    row = measure(flat, queries, k, None, truth)
+    print(f"{'flat':<8} {'-':<14} {flat_build:>9.2f} {row['recall']:>9.3f} {row['p50_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+
+    for kind, values, label in (('hnsw', ef_values, 'efSearch'), ('ivf', nprobe_values, 'nprobe')):
+        start = time.perf_counter()
+        index = build_index(faiss, kind, vectors.shape[1], vectors)
+        build_seconds = time.perf_counter() - start
+        for value in values:
+            params = search_params(faiss, index, ef_search=value, nprobe=value)
+            row = measure(index, queries, k, params, truth)
+            print(f"{kind:<8} {f'{label}={value}':<14} {build_seconds:>9.2f} "
+                  f"{row['recall']:>9.3f} {row['p50_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN 인덱스 recall / 지연 시간 리포트")
+    parser.add_argument("--sizes", default="10000,50000,200000", help="합성 코퍼스 크기 (쉼표 구분)")
+    parser.add_argument("--user", help="합성 벡터 대신 사용할 사용자 ID")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", default="16,32,64,128", help="HNSW efSearch 후보")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF nprobe 후보")
+    args = parser.parse_args()
+
+    ef_values = [int(v) for v in args.ef.split(",")]
+    nprobe_values = [int(v) for v in args.nprobe.split(",")]
+
+    if args.user:
+        vectors = asyncio.run(load_user_vectors(args.user))
+        if len(vectors) == 0:
+            print(f"❌ 사용자 {args.user}의 저장된 임베딩이 없습니다")
+            return
+        report(vectors, args.queries, args.k, ef_values, nprobe_values)
+    else:
+        for size in (int(v) for v in args.sizes.split(",")):
+            report(synthetic_vectors(size), args.queries, args.k, ef_values, nprobe_values)
+
+if __name__ == "__main__":
+    main()
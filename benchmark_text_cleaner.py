@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+텍스트 정제 처리량 리포트
+- text_cleaner.clean_text(미리 계산한 삭제 문자 클래스 + 컴파일된 정규식)와 문자 단위 category 검사 방식의 MB/s 비교
+- 한국어 / 영어 합성 코퍼스 또는 지정한 텍스트 파일 사용
+
+사용법:
+    python benchmark_text_cleaner.py                    # 한국어, 영어 합성 코퍼스 (각 8MB)
+    python benchmark_text_cleaner.py --size-mb 32 --repeat 5
+    python benchmark_text_cleaner.py --file sample.txt  # 파일 내용으로 측정
+"""
+
+import argparse
+import random
+import re
+import time
+import unicodedata
+
+from text_cleaner import clean_text
+
+KOREAN_WORDS = ["서울은", "한국의", "수도입니다.", "문서를", "검색하고", "임베딩을", "생성합니다.",
+                "사용자별로", "격리된", "인덱스에", "저장됩니다.", "업로드한", "파일은", "청크로", "나뉩니다."]
+ENGLISH_WORDS = ["The", "document", "search", "service", "splits", "uploaded", "files", "into",
+                 "chunks", "and", "stores", "embeddings", "per", "user.", "Results", "are", "ranked."]
+# PDF/DOCX 추출 결과에 섞여 나오는 문자 (제어 문자, null, 대체 문자, zero-width space, 탭/개행)
+NOISE = ["\x00", "\x0c", "\ufffd", "\u200b", "\t", "\n", "\r\n", "  "]
+
+def synthetic_corpus(words, size_mb: float, seed: int = 0) -> str:
+    """단어와 가끔 섞인 잡음 문자로 size_mb(UTF-8 기준) 크기의 텍스트 생성"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    while size < target:
+        word = rng.choice(words)
+        sep = rng.choice(NOISE) if rng.random() < 0.05 else " "
+        parts.append(word + sep)
+        size += len(word.encode("utf-8")) + len(sep.encode("utf-8"))
+    return "".join(parts)
+
+def per_char_clean(text):
+    """비교 기준: 문자마다 unicodedata.category를 호출하던 기존 정제 방식"""
+    if not text:
+        return ""
+    text = text.replace('\x00', '')
+    text = text.replace('\ufffd', '')
+    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    text = unicodedata.normalize('NFC', text)
+    text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char in '\t\n\r')
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+def measure(cleaner, text: str, repeat: int):
+    """repeat회 중 가장 빠른 실행 시간으로 MB/s 계산 (UTF-8 바이트 기준)"""
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = cleaner(text)
+        best = min(best, time.perf_counter() - start)
+    return size_mb / best, best, result
+
+def report(name: str, text: str, repeat: int):
+    """하나의 코퍼스에 대한 결과 표 출력"""
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    print(f"\n📊 {name}: {size_mb:.1f}MB, {len(text):,}자")
+    print(f"{'방식':<16} {'시간(초)':>9} {'MB/s':>9} {'배율':>7}")
+    print("-" * 44)
+
+    baseline_rate, baseline_seconds, expected = measure(per_char_clean, text, repeat)
+    rate, seconds, cleaned = measure(clean_text, text, repeat)
+    print(f"{'문자 단위':<16} {baseline_seconds:>9.3f} {baseline_rate:>9.1f} {1.0:>6.1f}x")
+    print(f"{'text_cleaner':<16} {seconds:>9.3f} {rate:>9.1f} {rate / baseline_rate:>6.1f}x")
+    if cleaned != expected:
+        print("⚠️ 두 방식의 정제 결과가 다릅니다")
+
+def main():
+    parser = argparse.ArgumentParser(description="텍스트 정제 처리량 리포트")
+    parser.add_argument("--size-mb", type=float, default=8.0, help="합성 코퍼스 크기 (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="반복 횟수 (가장 빠른 값 사용)")
+    parser.add_argument("--file", help="합성 코퍼스 대신 사용할 UTF-8 텍스트 파일")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="replace") as f:
+            report(args.file, f.read(), args.repeat)
+    else:
+        report("한국어", synthetic_corpus(KOREAN_WORDS, args.size_mb), args.repeat)
+        report("영어", synthetic_corpus(ENGLISH_WORDS, args.size_mb, seed=1), args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 검색 결과 하이드레이션용 청크 캐시 최대 항목 수 (0이면 사용 안 함)
+CHUNK_CACHE_SIZE = int(os.environ.get('CHUNK_CACHE_SIZE', '5000'))
+
+class ChunkTextCache:
+    """검색 결과에 필요한 청크 컬럼(텍스트, 문서 ID)을 보관하는 프로세스 내 LRU 캐시
+
+    청크는 업로드 후 변경되지 않으므로 (user_id, chunk_id) 키로 캐시하며,
+    청크를 삭제할 때는 discard / discard_user로 무효화합니다.
+    """
+
+    def __init__(self, max_entries: int = CHUNK_CACHE_SIZE):
+        self.max_entries = max(0, max_entries)
+        self._entries = OrderedDict()  # (user_id, chunk_id) -> (chunk_text, document_id)
+        self._lock = threading.Lock()
+        self._text_chars = 0
+
+        # 적중 통계
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, user_id: str, chunk_ids):
+        """캐시에 있는 청크만 {chunk_id: (chunk_text, document_id)}로 반환"""
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (user_id, chunk_id)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[chunk_id] = entry
+        return found
+
+    def put_many(self, user_id: str, rows):
+        """DB에서 읽은 (chunk_id, chunk_text, document_id) 행 저장"""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            for chunk_id, chunk_text, document_id in rows:
+                key = (user_id, chunk_id)
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._text_chars -= len(old[0] or '')
+                self._entries[key] = (chunk_text, document_id)
+                self._text_chars += len(chunk_text or '')
+            while len(self._entries) > self.max_entries:
+                _, (chunk_text, _) = self._entries.popitem(last=False)
+                self._text_chars -= len(chunk_text or '')
+
+    def discard(self, user_id: str, chunk_ids):
+        """삭제된 청크 무효화"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                entry = self._entries.pop((user_id, chunk_id), None)
+                if entry is not None:
+                    self._text_chars -= len(entry[0] or '')
+
+    def discard_user(self, user_id: str):
+        """사용자의 모든 청크 무효화"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                chunk_text, _ = self._entries.pop(key)
+                self._text_chars -= len(chunk_text or '')
+
+    def get_stats(self):
+        """캐시 적중 통계 반환"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "text_chars": self._text_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# 전역 청크 캐시
+chunk_cache = ChunkTextCache()
@@ -0,0 +1,101 @@
+"""pytest 공통 설정
+
+모듈들이 import 시점에 환경변수와 현재 디렉토리 기준 경로(ngpt.db, faiss_indexes, ingest_uploads)를
+읽으므로, 테스트 모듈을 import하기 전에 임시 작업 디렉토리로 옮기고 환경변수를 설정합니다.
+"""
+import asyncio
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+WORKDIR = tempfile.mkdtemp(prefix="ngpt-test-")
+
+os.environ.pop('CLOUDTYPE_DEPLOYMENT', None)
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'ngpt.db')}"
+# write-behind 기록은 테스트에서 save_index()로 직접 호출
+os.environ['INDEX_FLUSH_DEBOUNCE_SECONDS'] = '3600'
+os.environ['INDEX_FLUSH_MAX_DELAY_SECONDS'] = '3600'
+# 업로드 크기 제한 테스트가 작은 본문으로 제한을 넘길 수 있도록
+os.environ['MAX_UPLOAD_SIZE_MB'] = '1'
+
+sys.path.insert(0, ROOT)
+# main.py가 static/templates를 현재 디렉토리 기준으로 마운트
+for name in ("static", "templates"):
+    os.symlink(os.path.join(ROOT, name), os.path.join(WORKDIR, name))
+os.chdir(WORKDIR)
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def user_id():
+    """테스트마다 다른 사용자 ID (인덱스 파일이 겹치지 않도록)"""
+    return f"test_{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def service(user_id):
+    """FAISS 인덱스를 로드한 쓰기 가능한 사용자 임베딩 서비스"""
+    from index_flusher import index_flusher
+    from lightweight_embedding import UserEmbeddingService
+
+    service = UserEmbeddingService(user_id)
+    service._load_faiss()
+    yield service
+    index_flusher.discard(service)
+    service.delete_files()
+
+
+@pytest.fixture
+def run():
+    """코루틴을 새 이벤트 루프에서 실행 (루프에 묶인 DB 연결은 끝날 때 정리)"""
+    from database import create_tables, engine
+
+    async def with_tables(coro):
+        await create_tables()
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return lambda coro: asyncio.run(with_tables(coro))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """API 테스트 클라이언트 (테스트 세션 동안 서버 하나를 유지)
+
+    시작 이벤트의 DB 초기화는 PostgreSQL용 DROP ... CASCADE를 쓰므로 건너뛰고 테이블만 만듭니다.
+    """
+    import main
+    from database import create_tables, engine
+    from fastapi.testclient import TestClient
+
+    async def setup():
+        await create_tables()
+        await engine.dispose()
+
+    main.app.router.on_startup.clear()
+    asyncio.run(setup())
+    with TestClient(main.app) as client:
+        yield client
+
+
+def wait_for_job(client, response, timeout=60.0):
+    """업로드 응답의 작업이 끝날 때까지 /jobs/{job_id}를 조회해 마지막 상태 반환"""
+    import time
+
+    assert response.status_code == 202, response.text
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{response.json()['job_id']}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise TimeoutError(f"업로드 작업이 {timeout}초 안에 끝나지 않음: {job}")
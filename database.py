@@ -1,7 +1,7 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, LargeBinary
 from datetime import datetime
 
 # CloudType 환경 감지
@@ -53,6 +53,15 @@ else:
     # 로컬 환경
     engine = create_async_engine(DATABASE_URL, echo=True)
 
+if engine.dialect.name == 'sqlite':
+    from sqlalchemy import event
+    from keyword_index import keyword_terms
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _register_sqlite_functions(dbapi_connection, connection_record):
+        """전문 검색 동기화 트리거(fulltext_search)가 호출하는 keyword_terms()를 연결마다 등록"""
+        dbapi_connection.create_function("keyword_terms", 1, keyword_terms, deterministic=True)
+
 # 세션 팩토리
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -78,7 +87,8 @@ class Document(Base):
     user_id = Column(String, nullable=False, index=True)  # 사용자 ID 추가 (인덱싱)
     filename = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    embedding = Column(Text, nullable=True)  # JSON 형태로 저장
+    embedding = Column(Text, nullable=True)  # 레거시 JSON 형태 (migrate_embedding_to_binary.py로 변환)
+    embedding_vec = Column(LargeBinary, nullable=True)  # float16/float32 바이너리 (embedding_codec)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)  # 정렬용 인덱스 추가
 
 class DocumentChunk(Base):
@@ -88,7 +98,8 @@ class DocumentChunk(Base):
     user_id = Column(String, nullable=False, index=True)  # 사용자 ID 추가 (인덱싱)
     document_id = Column(Integer, nullable=False, index=True)  # 조인용 인덱스 추가
     chunk_text = Column(Text, nullable=False)
-    embedding = Column(Text, nullable=True)  # JSON 형태로 저장
+    embedding = Column(Text, nullable=True)  # 레거시 JSON 형태 (migrate_embedding_to_binary.py로 변환)
+    embedding_vec = Column(LargeBinary, nullable=True)  # float16/float32 바이너리 (embedding_codec)
     chunk_index = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -108,5 +119,8 @@ async def get_db():
         
 # 테이블 생성
 async def create_tables():
+    from fulltext_search import full_text_search
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # 청크 텍스트 전문 검색 인덱스 (SQLite FTS5 / PostgreSQL tsvector)
+        await full_text_search.setup(conn)
@@ -1,153 +1,408 @@
 import os
+import mmap
 import docx
-import re
-import unicodedata
+import codecs
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 from PyPDF2 import PdfReader # PdfReadError는 PyPDF2.errors에서 가져옵니다.
 from PyPDF2.errors import PdfReadError # PdfReadError 임포트 경로 수정
 
+from text_cleaner import clean_text
+
+# PDF 페이지 텍스트 추출 프로세스 수 (0 또는 1이면 프로세스 풀 없이 현재 스레드에서 추출)
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+# 프로세스 하나가 한 번에 처리하는 페이지 수 (이 값 이하의 PDF는 현재 스레드에서 추출)
+PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', '8'))
+# TXT를 스트리밍 디코딩할 때 한 번에 읽는 바이트 수
+TXT_BLOCK_BYTES = 256 * 1024
+# 블록 경계에서 단어가 잘리지 않도록 다음 블록으로 넘기는 최대 글자 수 (이보다 긴 공백 없는 구간은 그냥 자름)
+TXT_MAX_CARRY_CHARS = 256
+# 청크를 문장 경계에서 자를 때 찾는 구두점 (앞쪽 항목 우선)
+CHUNK_PUNCTUATION = ['. ', '! ', '? ', '.\n', '!\n', '?\n']
+
+def _extract_pdf_page_range(source, start, end):
+    """PDF의 [start, end) 페이지 텍스트를 정제해서 반환 (프로세스 풀 워커에서 실행, source는 경로 또는 bytes)"""
+    # 경로를 주면 PdfReader가 파일 전체를 BytesIO로 복사하므로 파일 핸들로 전달
+    with (open(source, 'rb') if isinstance(source, str) else BytesIO(source)) as stream:
+        reader = PdfReader(stream)
+        texts = []
+        for page_number in range(start, min(end, len(reader.pages))):
+            try:
+                page_text = reader.pages[page_number].extract_text()
+            except Exception as e:
+                print(f"PDF {page_number + 1}페이지 텍스트 추출 실패: {e}")
+                page_text = ""
+            texts.append(DocumentProcessor.clean_text(page_text) if page_text else "")
+        return texts
+
+class PdfPagePool:
+    """PDF 페이지 범위별 텍스트 추출을 병렬로 실행하는 프로세스 풀
+
+    PyPDF2의 extract_text는 순수 Python이라 GIL을 잡고 있으므로 스레드 대신 프로세스를 사용하며,
+    각 워커는 PDF를 직접 열어 맡은 페이지 범위만 추출합니다 (페이지 객체는 pickle할 수 없음).
+    이벤트 루프/스레드가 있는 프로세스에서 fork하지 않도록 spawn으로 시작합니다.
+    """
+
+    def __init__(self, max_workers: int = PDF_EXTRACT_WORKERS, pages_per_task: int = PDF_PAGES_PER_TASK):
+        self.max_workers = max_workers
+        self.pages_per_task = max(1, pages_per_task)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        # 실행 통계
+        self.documents = 0
+        self.tasks = 0
+        self.failures = 0
+
+    def enabled(self) -> bool:
+        return self.max_workers > 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """필요할 때 프로세스 풀 생성 (지연 초기화)"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    print(f"PDF 추출 프로세스 풀 시작: 워커 {self.max_workers}개")
+        return self._pool
+
+    def iter_pages(self, source, page_count: int):
+        """페이지 범위 작업을 제출하고 페이지 텍스트를 순서대로 yield
+
+        앞쪽 범위가 끝나는 대로 바로 내보내므로 뒤쪽 페이지를 파싱하는 동안 청킹을 시작할 수 있고,
+        미리 제출하는 작업은 워커 수의 2배로 제한해 결과가 소비보다 앞서 쌓이지 않게 합니다.
+        """
+        pool = self._get_pool()
+        ranges = deque(range(0, page_count, self.pages_per_task))
+        pending = deque()
+        self.documents += 1
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < self.max_workers * 2:
+                    start = ranges.popleft()
+                    pending.append(pool.submit(_extract_pdf_page_range, source, start, start + self.pages_per_task))
+                    self.tasks += 1
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def reset(self):
+        """워커가 비정상 종료된 풀 폐기 (다음 요청에서 새로 생성)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self.failures += 1
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True):
+        """프로세스 풀 종료"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+            print("PDF 추출 프로세스 풀 종료")
+
+    def get_stats(self):
+        """실행 통계 반환"""
+        return {
+            "workers": self.max_workers,
+            "pages_per_task": self.pages_per_task,
+            "documents": self.documents,
+            "tasks": self.tasks,
+            "failures": self.failures
+        }
+
 class DocumentProcessor:
+    TXT_ENCODINGS = ['utf-8', 'euc-kr', 'cp949', 'latin-1']
+
     @staticmethod
-    def clean_text(text):
-        """텍스트에서 문제가 될 수 있는 문자들을 정제"""
-        if not text:
-            return ""
-        
-        text = str(text) # 입력이 문자열이 아닐 경우를 대비
+    def _as_stream(source):
+        """bytes는 BytesIO로 감싸고 파일 객체/mmap은 그대로 반환 (PdfReader, docx.Document 입력용)"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return BytesIO(source)
+        return source
 
-        # 1. null 바이트 제거
-        text = text.replace('\x00', '')
-        
-        # 2. 대체 문자 제거
-        text = text.replace('\ufffd', '')
-        
-        # 3. 기타 제어 문자 제거 (탭, 개행, 캐리지 리턴은 유지)
-        text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    @staticmethod
+    def _map_file(f):
+        """파일 핸들을 읽기 전용 mmap으로 (빈 파일이나 mmap을 쓸 수 없는 파일 객체는 bytes)"""
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            return f.read()
+
+    @staticmethod
+    def clean_text(text):
+        """텍스트에서 문제가 될 수 있는 문자들을 정제 (text_cleaner.clean_text)"""
+        return clean_text(text)
+    
+    @staticmethod
+    def iter_text_from_pdf(file_content, progress=None):
+        """PDF 페이지 텍스트를 순서대로 yield (정제된 텍스트, 빈 페이지 제외)
         
-        # 4. Unicode 정규화 (NFD -> NFC)
+        페이지가 PDF_PAGES_PER_TASK보다 많으면 페이지 범위를 프로세스 풀에서 병렬로 추출합니다.
+        프로세스 풀은 경로나 bytes로만 PDF를 넘길 수 있으므로 그 밖의 파일 객체는 현재 스레드에서 추출합니다.
+        progress(처리한 페이지 수, 전체 페이지 수)는 페이지마다 호출됩니다.
+        읽기 오류는 출력 후 다시 발생시키므로, 업로드 작업이 앞쪽 페이지만 저장한 채 완료되지 않고 실패 처리됩니다.
+        """
         try:
-            text = unicodedata.normalize('NFC', text)
+            source = file_content
+            if isinstance(source, os.PathLike):
+                source = os.fspath(source)
+            elif isinstance(source, (bytearray, memoryview)):
+                source = bytes(source)
+            elif hasattr(source, 'read') and isinstance(getattr(source, 'name', None), str) and os.path.isfile(source.name):
+                source = source.name  # 파일 핸들이면 워커가 같은 파일을 직접 열도록 경로 사용
+            
+            handle = open(source, 'rb') if isinstance(source, str) else None
+            try:
+                yield from DocumentProcessor._iter_pdf_pages(source, handle or DocumentProcessor._as_stream(source), progress)
+            finally:
+                if handle is not None:
+                    handle.close()
+        except PdfReadError as pre: 
+            print(f"PDF 읽기 오류 (PyPDF2): {pre}")
+            raise
         except Exception as e:
-            print(f"Unicode 정규화 중 오류 발생: {e}. 원본 텍스트 사용.")
-            # 정규화 실패 시 오류 로깅 후 원본 텍스트 반환 또는 특정 처리
-            pass # 일단 원본 텍스트로 계속 진행
-
-        # 5. 비인쇄 가능한 Unicode 문자 제거 (더 엄격하게)
-        cleaned_text = []
-        for char in text:
-            cat = unicodedata.category(char)
-            # 일반적인 제어 문자(Cc), 형식 문자(Cf), 서러게이트(Cs), 개인용(Co), 할당되지 않음(Cn)
-            if cat.startswith('C') and char not in '\t\n\r':
-                continue
-            cleaned_text.append(char)
-        text = "".join(cleaned_text)
+            print(f"PDF 텍스트 추출 중 일반 오류 발생: {e}")
+            raise
+    
+    @staticmethod
+    def _iter_pdf_pages(source, stream, progress=None):
+        """iter_text_from_pdf 본체 (source는 워커에 넘길 경로/bytes, stream은 현재 프로세스에서 읽을 파일 객체)"""
+        pdf_reader = PdfReader(stream)
+        page_count = len(pdf_reader.pages)
         
-        # 6. 연속된 공백 정리 (줄바꿈 포함)
-        text = re.sub(r'\s+', ' ', text) # 모든 공백 문자를 단일 공백으로
-        text = text.strip() # 앞뒤 공백 제거
+        if pdf_page_pool.enabled() and page_count > pdf_page_pool.pages_per_task and isinstance(source, (str, bytes)):
+            emitted = 0
+            try:
+                for page_text in pdf_page_pool.iter_pages(source, page_count):
+                    emitted += 1
+                    if progress is not None:
+                        progress(emitted, page_count)
+                    if page_text:
+                        yield page_text
+                return
+            except BrokenProcessPool as e:
+                print(f"PDF 추출 프로세스 풀 오류, 남은 페이지는 현재 스레드에서 추출: {e}")
+                pdf_page_pool.reset()
+            start = emitted
+        else:
+            start = 0
         
-        return text
+        for page_number in range(start, page_count):
+            if progress is not None:
+                progress(page_number + 1, page_count)
+            try:
+                page_text = pdf_reader.pages[page_number].extract_text()
+            except Exception as e:
+                print(f"PDF {page_number + 1}페이지 텍스트 추출 실패: {e}")
+                continue
+            if page_text:
+                page_text = DocumentProcessor.clean_text(page_text) # 각 페이지 텍스트 정제
+                if page_text:
+                    yield page_text
     
     @staticmethod
     def extract_text_from_pdf(file_content):
-        """PDF에서 텍스트 추출"""
+        """PDF에서 텍스트 추출 (페이지 텍스트를 줄바꿈으로 연결, 오류 시 빈 문자열)"""
         try:
-            # PyPDF2 관련 코드는 PdfReadError 문제 해결 후 활성화
-            pdf_reader = PdfReader(BytesIO(file_content))
-            text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text: 
-                    text += DocumentProcessor.clean_text(page_text) + "\\n" # 각 페이지 텍스트 정제
-            return text.strip() # 최종 텍스트의 앞뒤 공백 제거
-        except PdfReadError as pre: 
-            print(f"PDF 읽기 오류 (PyPDF2): {pre}")
-            return "" # 오류 발생 시 빈 문자열 반환
-        except Exception as e:
-            print(f"PDF 텍스트 추출 중 일반 오류 발생: {e}")
-            return "" # 오류 발생 시 빈 문자열 반환
+            return "\n".join(DocumentProcessor.iter_text_from_pdf(file_content)).strip()
+        except Exception:
+            return ""  # 오류 내용은 iter_text_from_pdf에서 출력
 
     @staticmethod
-    def extract_text_from_docx(file_content):
-        """DOCX에서 텍스트 추출"""
+    def iter_text_from_docx(file_content, progress=None):
+        """DOCX 문단 텍스트를 순서대로 yield (정제된 텍스트, 빈 문단 제외, progress(처리한 문단 수, 전체 문단 수))
+        
+        읽기 오류는 출력 후 다시 발생시킵니다 (iter_text_from_pdf 참고).
+        """
         try:
-            doc = docx.Document(BytesIO(file_content))
-            text_parts = []
-            for paragraph in doc.paragraphs:
-                text_parts.append(paragraph.text)
-            full_text = "\n".join(text_parts)
-            return DocumentProcessor.clean_text(full_text)
+            doc = docx.Document(DocumentProcessor._as_stream(file_content))
+            paragraphs = doc.paragraphs
+            for number, paragraph in enumerate(paragraphs, 1):
+                if progress is not None:
+                    progress(number, len(paragraphs))
+                text = DocumentProcessor.clean_text(paragraph.text)
+                if text:
+                    yield text
         except Exception as e:
             print(f"DOCX 텍스트 추출 실패: {e}")
+            raise
+    
+    @staticmethod
+    def extract_text_from_docx(file_content):
+        """DOCX에서 텍스트 추출 (bytes 또는 파일 객체/mmap, 오류 시 빈 문자열)"""
+        try:
+            return " ".join(DocumentProcessor.iter_text_from_docx(file_content))
+        except Exception:
             return ""
     
     @staticmethod
-    def extract_text_from_txt(file_content):
-        """TXT에서 텍스트 추출"""
+    def _detect_txt_encoding(file_content):
+        """TXT_ENCODINGS 중 전체를 오류 없이 디코딩할 수 있는 첫 인코딩 (결과 문자열은 만들지 않고 블록 단위로 검사)"""
+        for encoding in DocumentProcessor.TXT_ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                for offset in range(0, len(file_content), TXT_BLOCK_BYTES):
+                    decoder.decode(file_content[offset:offset + TXT_BLOCK_BYTES])
+                decoder.decode(b"", final=True)
+                return encoding
+            except UnicodeDecodeError:
+                continue # 다음 인코딩 시도
+        return None
+    
+    @staticmethod
+    def iter_text_from_txt(file_content, progress=None):
+        """TXT(bytes, mmap 등 버퍼 객체)를 블록 단위로 디코딩해서 정제된 텍스트를 yield
+        
+        블록은 공백 위치에서 나누므로 결과를 공백으로 이으면 전체를 한 번에 정제한 것과 같습니다.
+        progress(읽은 바이트 수, 전체 바이트 수)는 블록마다 호출되며, 읽기 오류는 출력 후 다시 발생시킵니다.
+        """
         try:
             # 다양한 인코딩 시도 (가장 일반적인 것부터)
-            encodings_to_try = ['utf-8', 'euc-kr', 'cp949', 'latin-1']
-            decoded_text = None
-            for encoding in encodings_to_try:
-                try:
-                    decoded_text = file_content.decode(encoding)
-                    break # 성공하면 루프 종료
-                except UnicodeDecodeError:
-                    continue # 다음 인코딩 시도
-            
-            if decoded_text is None:
+            encoding, errors = DocumentProcessor._detect_txt_encoding(file_content), 'strict'
+            if encoding is None:
                 # 모든 인코딩 시도 실패 시, errors='ignore'로 강제 디코딩
-                decoded_text = file_content.decode('utf-8', errors='ignore')
+                encoding, errors = 'utf-8', 'ignore'
                 print(f"TXT 파일 디코딩 실패. 일부 문자가 손실될 수 있습니다.")
-
-            return DocumentProcessor.clean_text(decoded_text)
+            
+            decoder = codecs.getincrementaldecoder(encoding)(errors)
+            carry = ""
+            for offset in range(0, len(file_content), TXT_BLOCK_BYTES):
+                if progress is not None:
+                    progress(min(offset + TXT_BLOCK_BYTES, len(file_content)), len(file_content))
+                text = carry + decoder.decode(file_content[offset:offset + TXT_BLOCK_BYTES])
+                # 마지막 공백 뒤의 (잘렸을 수 있는) 단어는 다음 블록으로 넘김
+                cut = len(text)
+                for i in range(len(text) - 1, max(-1, len(text) - 1 - TXT_MAX_CARRY_CHARS), -1):
+                    if text[i].isspace():
+                        cut = i
+                        break
+                carry = text[cut:]
+                text = DocumentProcessor.clean_text(text[:cut])
+                if text:
+                    yield text
+            text = DocumentProcessor.clean_text(carry + decoder.decode(b"", final=True))
+            if text:
+                yield text
         except Exception as e:
             print(f"TXT 텍스트 추출 실패: {e}")
+            raise
+    
+    @staticmethod
+    def extract_text_from_txt(file_content):
+        """TXT에서 텍스트 추출 (bytes, mmap 등 버퍼 객체 - mmap은 복사 없이 바로 디코딩, 오류 시 빈 문자열)"""
+        try:
+            return " ".join(DocumentProcessor.iter_text_from_txt(file_content))
+        except Exception:
             return ""
     
     @staticmethod
-    def extract_text(filename, file_content):
-        """파일 확장자에 따라 텍스트 추출"""
+    def iter_text(filename, file_content, progress=None):
+        """파일 확장자에 따라 정제된 텍스트 조각(PDF 페이지, DOCX 문단, TXT 블록)을 순서대로 yield
+        
+        업로드 파이프라인의 첫 단계로, 문서 전체 텍스트를 만들지 않고 조각 단위로 청킹에 넘깁니다.
+        file_content는 extract_text와 같이 bytes, 파일 객체/mmap, 또는 파일 경로입니다.
+        progress(처리량, 전체량)로 원본을 얼마나 읽었는지 알립니다 (PDF 페이지, DOCX 문단, TXT 바이트 단위).
+        """
         file_extension = filename.lower().split('.')[-1]
+        if file_extension not in ('pdf', 'docx', 'txt'):
+            raise ValueError(f"지원하지 않는 파일 형식: {file_extension}")
         
         if file_extension == 'pdf':
-            return DocumentProcessor.extract_text_from_pdf(file_content)
+            yield from DocumentProcessor.iter_text_from_pdf(file_content, progress)
+        elif isinstance(file_content, (str, os.PathLike)):
+            with open(file_content, 'rb') as f:
+                if file_extension == 'docx':
+                    yield from DocumentProcessor.iter_text_from_docx(f, progress)
+                    return
+                mapped = DocumentProcessor._map_file(f)
+                try:
+                    yield from DocumentProcessor.iter_text_from_txt(mapped, progress)
+                finally:
+                    if isinstance(mapped, mmap.mmap):
+                        mapped.close()
         elif file_extension == 'docx':
-            return DocumentProcessor.extract_text_from_docx(file_content)
-        elif file_extension == 'txt':
-            return DocumentProcessor.extract_text_from_txt(file_content)
+            yield from DocumentProcessor.iter_text_from_docx(file_content, progress)
         else:
+            if hasattr(file_content, 'read') and not isinstance(file_content, mmap.mmap):
+                file_content = file_content.read()
+            yield from DocumentProcessor.iter_text_from_txt(file_content, progress)
+    
+    @staticmethod
+    def extract_text(filename, file_content):
+        """파일 확장자에 따라 텍스트 추출
+        
+        file_content는 bytes, 파일 객체/mmap, 또는 파일 경로(str/PathLike)입니다.
+        경로를 주면 파일 전체를 bytes로 읽지 않고 파일 핸들(PDF, DOCX)이나 mmap(TXT)에서 바로 추출합니다.
+        지원하지 않는 형식은 ValueError, 읽기 오류는 빈 문자열입니다 (extract_text_from_pdf/docx/txt와 같음).
+        """
+        file_extension = filename.lower().split('.')[-1]
+        if file_extension not in ('pdf', 'docx', 'txt'):
             raise ValueError(f"지원하지 않는 파일 형식: {file_extension}")
+        # PDF는 페이지 사이를 줄바꿈으로, 나머지는 공백으로 연결 (extract_text_from_pdf/docx/txt와 같은 결과)
+        separator = "\n" if file_extension == 'pdf' else " "
+        try:
+            return separator.join(DocumentProcessor.iter_text(filename, file_content))
+        except Exception:
+            return ""
     
     @staticmethod
-    def chunk_text(text, chunk_size=500, overlap=50):
-        """텍스트를 청크로 분할"""
-        if not text:
-            return []
+    def iter_chunks(segments, chunk_size=500, overlap=50, separator=" "):
+        """텍스트 조각 스트림을 슬라이딩 윈도우로 청크 분할
         
-        chunks = []
+        조각을 separator로 이어 붙인 텍스트를 chunk_size 글자 창으로 자르되 창 안의 마지막 문장 경계에서 끊고,
+        다음 청크는 overlap 글자 겹쳐서 시작합니다. 아직 자르지 않은 꼬리와 현재 조각만 유지하므로
+        메모리 사용량이 문서 크기가 아닌 조각 크기에 비례합니다.
+        """
+        buffer = ""
         start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
+        for segment in segments:
+            if not segment:
+                continue
+            # 이미 청크로 내보낸 앞부분은 버리고 새 조각 추가
+            buffer = buffer[start:] + separator + segment if buffer else segment
+            start = 0
             
-            # 문장 경계에서 자르기 위해 조정
-            if end < len(text):
-                # 마지막 마침표, 느낌표, 물음표 찾기
-                for punct in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-                    last_punct = text.rfind(punct, start, end)
+            # 창 뒤에 텍스트가 더 있을 때만 자름 (창이 끝에 닿으면 다음 조각을 기다림)
+            while len(buffer) - start > chunk_size:
+                end = start + chunk_size
+                
+                # 문장 경계에서 자르기 위해 조정 (마지막 마침표, 느낌표, 물음표 찾기)
+                for punct in CHUNK_PUNCTUATION:
+                    last_punct = buffer.rfind(punct, start, end)
                     if last_punct > start:
                         end = last_punct + len(punct)
                         break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            
-            # 무한 루프 방지
-            if start >= len(text):
-                break
+                
+                chunk = buffer[start:end].strip()
+                if chunk:
+                    yield chunk
+                
+                # 경계가 창 앞쪽에 있어 겹침만큼 되돌아가면 제자리이므로 그때는 겹침 없이 진행
+                start = end - overlap if end - overlap > start else end
         
-        return chunks
+        chunk = buffer[start:].strip()
+        if chunk:
+            yield chunk
+    
+    @staticmethod
+    def chunk_text(text, chunk_size=500, overlap=50):
+        """텍스트를 청크로 분할"""
+        if not text:
+            return []
+        return list(DocumentProcessor.iter_chunks([text], chunk_size, overlap))
+
+# 전역 PDF 페이지 추출 프로세스 풀
+pdf_page_pool = PdfPagePool()
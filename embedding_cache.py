@@ -0,0 +1,220 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 등 fcntl이 없는 환경에서는 프로세스 간 파일 락 생략
+    fcntl = None
+
+# 메모리 LRU 계층에 보관할 최대 임베딩 수 (384차원 float32 기준 항목당 약 1.5KB)
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', '20000'))
+# 설정된 경우에만 디스크 계층 사용 (memory-mapped float32 저장소)
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', '')
+
+KEY_BYTES = 16
+
+def embedding_cache_key(text: str, model_name: str) -> bytes:
+    """정제된 청크 텍스트와 모델 이름으로 콘텐츠 주소 키 생성"""
+    digest = hashlib.blake2b(digest_size=KEY_BYTES)
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(text.strip().encode('utf-8', errors='ignore'))
+    return digest.digest()
+
+class DiskEmbeddingStore:
+    """append-only 디스크 계층: 16바이트 키 파일 + memory-mapped float32 벡터 파일
+
+    keys.bin의 i번째 키가 vectors.f32의 i번째 행을 가리킵니다.
+    벡터를 먼저 쓰고 키를 나중에 쓰므로, 기록 도중 중단되어도 키 수가 유효 행 수를 결정합니다.
+    """
+
+    def __init__(self, directory: str, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+        self.row_bytes = dimension * 4
+        os.makedirs(directory, exist_ok=True)
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+
+        self._rows = {}  # key -> row
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        for path in (self.keys_path, self.vectors_path):
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+
+        with self._lock:
+            # put_many와 같은 파일 락: 다른 프로세스가 벡터를 쓰고 키를 아직 쓰지 않은 사이에 자르지 않도록
+            with open(self.keys_path, 'ab') as keys_file:
+                if fcntl is not None:
+                    fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh_keys()
+                    # 키 없이 남은 꼬리 벡터(중단된 기록) 제거
+                    expected = len(self._rows) * self.row_bytes
+                    if os.path.getsize(self.vectors_path) > expected:
+                        with open(self.vectors_path, 'r+b') as f:
+                            f.truncate(expected)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(keys_file, fcntl.LOCK_UN)
+        print(f"임베딩 디스크 캐시 로드: {directory} ({len(self._rows)}개)")
+
+    def _refresh_keys(self):
+        """다른 프로세스가 추가한 키까지 읽어 행 매핑 갱신 (락 내부에서 호출)"""
+        known = len(self._rows)
+        total = os.path.getsize(self.keys_path) // KEY_BYTES
+        if total <= known:
+            return
+        with open(self.keys_path, 'rb') as f:
+            f.seek(known * KEY_BYTES)
+            data = f.read((total - known) * KEY_BYTES)
+        for i in range(len(data) // KEY_BYTES):
+            key = data[i * KEY_BYTES:(i + 1) * KEY_BYTES]
+            self._rows.setdefault(key, known + i)
+        self._mmap = None
+
+    def _vectors(self):
+        """현재 행 수에 맞춘 읽기 전용 memory map 반환 (락 내부에서 호출)"""
+        rows = len(self._rows)
+        if rows == 0:
+            return None
+        if self._mmap is None or self._mmap.shape[0] < rows:
+            self._mmap = np.memmap(self.vectors_path, dtype='float32', mode='r',
+                                   shape=(rows, self.dimension))
+        return self._mmap
+
+    def get(self, key: bytes):
+        """키에 해당하는 벡터 복사본 반환 (없으면 None)"""
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._vectors()[row], dtype='float32')
+
+    def put_many(self, keys, matrix):
+        """새 키의 벡터만 파일 끝에 추가"""
+        with self._lock:
+            with open(self.keys_path, 'ab') as keys_file:
+                if fcntl is not None:
+                    fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh_keys()
+                    new_rows = []
+                    seen = set()
+                    for key, vector in zip(keys, matrix):
+                        if key in self._rows or key in seen:
+                            continue
+                        seen.add(key)
+                        new_rows.append((key, vector))
+                    if not new_rows:
+                        return 0
+
+                    block = np.ascontiguousarray([v for _, v in new_rows], dtype='float32')
+                    with open(self.vectors_path, 'ab') as vectors_file:
+                        vectors_file.write(block.tobytes())
+                        vectors_file.flush()
+                        os.fsync(vectors_file.fileno())
+                    keys_file.write(b''.join(k for k, _ in new_rows))
+                    keys_file.flush()
+
+                    start = len(self._rows)
+                    for i, (key, _) in enumerate(new_rows):
+                        self._rows[key] = start + i
+                    self._mmap = None
+                    return len(new_rows)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._rows)
+
+class EmbeddingCache:
+    """사용자와 문서에 관계없이 공유되는 콘텐츠 주소 임베딩 캐시 (메모리 LRU + 선택적 디스크 계층)"""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, disk_dir: str = EMBEDDING_CACHE_DIR,
+                 dimension: int = 384):
+        self.max_entries = max(0, max_entries)
+        self.dimension = dimension
+        self._memory = OrderedDict()  # key -> np.ndarray (LRU 순서)
+        self._lock = threading.Lock()
+        self._disk = None
+        if disk_dir:
+            try:
+                self._disk = DiskEmbeddingStore(disk_dir, dimension)
+            except Exception as e:
+                print(f"임베딩 디스크 캐시 초기화 실패, 메모리 계층만 사용: {e}")
+                self._disk = None
+
+        # 적중 통계
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        """메모리 계층에 추가하고 한도를 넘으면 가장 오래된 항목 제거 (락 내부에서 호출)"""
+        if self.max_entries == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys, disk: bool = True):
+        """키 목록에 대한 벡터 목록 반환 (캐시에 없으면 None, disk=False면 메모리 계층만 확인)"""
+        results = []
+        for key in keys:
+            with self._lock:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results.append(vector)
+                    continue
+
+            vector = self._disk.get(key) if disk and self._disk is not None else None
+            with self._lock:
+                if vector is not None:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+                else:
+                    self.misses += 1
+            results.append(vector)
+        return results
+
+    def put_many(self, keys, matrix, disk: bool = True):
+        """새로 계산한 (정규화된) 임베딩을 두 계층에 저장 (disk=False면 메모리 계층에만)"""
+        with self._lock:
+            for key, vector in zip(keys, matrix):
+                self._remember(key, np.array(vector, dtype='float32'))
+        if disk and self._disk is not None:
+            try:
+                self._disk.put_many(keys, matrix)
+            except Exception as e:
+                print(f"임베딩 디스크 캐시 기록 실패: {e}")
+
+    def get_stats(self):
+        """캐시 적중 통계 반환"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_entries,
+                "memory_mb": round(len(self._memory) * self.dimension * 4 / (1024**2), 2),
+                "disk_enabled": self._disk is not None,
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+# 전역 임베딩 캐시
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,65 @@
+import os
+import json
+
+import numpy as np
+
+# DB에 저장할 임베딩 정밀도 ('float16' 또는 'float32')
+EMBEDDING_STORAGE_DTYPE = os.environ.get('EMBEDDING_STORAGE_DTYPE', 'float16')
+
+# 항상 리틀 엔디언으로 저장하여 플랫폼과 무관하게 읽을 수 있도록 함
+_STORAGE_DTYPES = {
+    'float16': np.dtype('<f2'),
+    'float32': np.dtype('<f4'),
+}
+
+def _storage_dtype(name: str) -> np.dtype:
+    """저장용 dtype 이름을 numpy dtype으로 변환"""
+    try:
+        return _STORAGE_DTYPES[name]
+    except KeyError:
+        raise ValueError(f"지원하지 않는 임베딩 저장 형식: {name} (float16, float32만 지원)")
+
+def encode_embedding(vector, dtype: str = EMBEDDING_STORAGE_DTYPE) -> bytes:
+    """임베딩 벡터를 바이너리 BLOB으로 변환 (384차원 기준 float16 768바이트, float32 1536바이트)"""
+    return np.asarray(vector, dtype=_storage_dtype(dtype)).tobytes()
+
+def detect_dtype(blob: bytes, dimension: int = 384) -> np.dtype:
+    """BLOB 길이로 저장 정밀도 판별 (차원이 고정이므로 별도 헤더가 필요 없음)"""
+    size = len(blob)
+    for dtype in _STORAGE_DTYPES.values():
+        if size == dimension * dtype.itemsize:
+            return dtype
+    raise ValueError(f"임베딩 BLOB 크기가 올바르지 않습니다: {size}바이트 (차원 {dimension})")
+
+def decode_embedding(blob: bytes, dimension: int = 384) -> np.ndarray:
+    """BLOB 하나를 float32 벡터로 복원"""
+    return np.frombuffer(blob, dtype=detect_dtype(blob, dimension)).astype('float32')
+
+def decode_matrix(blobs, dimension: int = 384) -> np.ndarray:
+    """여러 BLOB을 (n, dimension) float32 행렬로 한 번에 복원
+
+    같은 정밀도의 BLOB은 하나로 이어 붙여 np.frombuffer 한 번으로 변환합니다.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, dimension), dtype='float32')
+
+    first_dtype = detect_dtype(blobs[0], dimension)
+    row_bytes = dimension * first_dtype.itemsize
+    if all(len(blob) == row_bytes for blob in blobs):
+        flat = np.frombuffer(b''.join(blobs), dtype=first_dtype)
+        return flat.reshape(-1, dimension).astype('float32')
+
+    # 정밀도가 섞인 경우 (마이그레이션 중 등) 형식별로 묶어 변환 후 원래 순서로 배치
+    matrix = np.empty((len(blobs), dimension), dtype='float32')
+    groups = {}
+    for i, blob in enumerate(blobs):
+        groups.setdefault(detect_dtype(blob, dimension), []).append(i)
+    for dtype, rows in groups.items():
+        flat = np.frombuffer(b''.join(blobs[i] for i in rows), dtype=dtype)
+        matrix[rows] = flat.reshape(-1, dimension)
+    return matrix
+
+def embedding_from_json(value: str, dtype: str = EMBEDDING_STORAGE_DTYPE) -> bytes:
+    """레거시 JSON 텍스트 임베딩을 BLOB으로 변환 (마이그레이션용)"""
+    return encode_embedding(json.loads(value), dtype)
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 임베딩 전용 워커 수 (모델 인코딩, FAISS add/search/write 실행)
+EMBEDDING_EXECUTOR_WORKERS = int(os.environ.get('EMBEDDING_EXECUTOR_WORKERS', '2'))
+
+class EmbeddingExecutor:
+    """CPU 작업(모델 인코딩, FAISS 연산)을 이벤트 루프 밖에서 실행하는 전용 스레드 풀
+
+    torch와 FAISS는 연산 중 GIL을 해제하므로 스레드 풀로 충분하며,
+    프로세스 풀과 달리 공유 모델과 사용자 인덱스를 복사하지 않아도 됩니다.
+    """
+
+    def __init__(self, max_workers: int = EMBEDDING_EXECUTOR_WORKERS, name: str = "embedding", label: str = "임베딩"):
+        self.max_workers = max(1, max_workers)
+        self.name = name  # 스레드 이름 접두사
+        self.label = label  # 로그 표시용
+        self._pool = None
+        self._lock = threading.Lock()
+
+        # 실행 통계
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """필요할 때 스레드 풀 생성 (지연 초기화)"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=self.name
+                    )
+                    print(f"{self.label} 실행기 시작: 워커 {self.max_workers}개")
+        return self._pool
+
+    def _timed_call(self, func, *args, **kwargs):
+        """워커 스레드에서 실행되며 소요 시간을 기록"""
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
+
+    async def run(self, func, *args, **kwargs):
+        """동기 함수를 임베딩 워커에서 실행하고 결과를 await"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submitted += 1
+        call = functools.partial(self._timed_call, func, *args, **kwargs)
+        return await loop.run_in_executor(self._get_pool(), call)
+
+    def submit(self, func, *args, **kwargs):
+        """결과를 기다리지 않는 백그라운드 작업 제출 (워커 스레드에서도 호출 가능)"""
+        with self._lock:
+            self.submitted += 1
+        return self._get_pool().submit(self._timed_call, func, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        """스레드 풀 종료"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+            print(f"{self.label} 실행기 종료")
+
+    def get_stats(self):
+        """실행기 통계 반환"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": self.submitted - self.completed - self.failed,
+                "busy_seconds": round(self.busy_seconds, 3)
+            }
+
+# 전역 임베딩 실행기
+embedding_executor = EmbeddingExecutor()
@@ -0,0 +1,175 @@
+import os
+import time
+
+from sqlalchemy import text
+
+from database import engine, async_session
+from keyword_index import tokenize
+
+# 키워드 검색 엔진: auto(DB 전문 검색을 쓸 수 있으면 DB, 아니면 메모리 BM25), database, memory
+KEYWORD_SEARCH_BACKEND = os.environ.get('KEYWORD_SEARCH_BACKEND', 'auto').lower()
+
+FTS_TABLE = "document_chunks_fts"
+TERMS_FUNCTION = "keyword_terms"  # database.py에서 SQLite 연결마다 등록
+
+# SQLite: document_chunks.id를 rowid로 쓰는 FTS5 테이블(검색어 bigram 저장)과 동기화 트리거
+# 트리거가 keyword_terms()를 호출하므로 청크 추가/수정은 database.engine으로 해야 함 (삭제는 무관)
+_SQLITE_TRIGGERS = ["ai", "ad", "au"]
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(terms, prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON document_chunks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, {TERMS_FUNCTION}(new.chunk_text));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON document_chunks BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF chunk_text ON document_chunks BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, terms) VALUES (new.id, {TERMS_FUNCTION}(new.chunk_text));
+    END""",
+]
+
+_SQLITE_SEARCH = text(f"""
+    SELECT c.id AS chunk_id, -bm25({FTS_TABLE}) AS score
+    FROM {FTS_TABLE} JOIN document_chunks c ON c.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :query AND c.user_id = :user_id
+    ORDER BY bm25({FTS_TABLE})
+    LIMIT :k
+""")
+
+# PostgreSQL: keyword_terms()와 같은 토큰을 만드는 IMMUTABLE SQL 함수로 생성한 tsvector 컬럼과 GIN 인덱스
+# ('simple' 설정 - 언어별 어간 처리 없음, 예전 단어 단위 chunk_tsv 컬럼은 제거)
+_POSTGRES_SETUP = [
+    f"""CREATE OR REPLACE FUNCTION {TERMS_FUNCTION}(src text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(string_agg(t.term, ' '), '')
+        FROM regexp_matches(lower(coalesce(src, '')), '[가-힣]+|[^가-힣[:space:][:punct:]]+', 'g') AS m(parts),
+             LATERAL (
+                 SELECT substr(m.parts[1], i, 2) AS term
+                 FROM generate_series(1, greatest(length(m.parts[1]) - 1, 1)) AS i
+                 WHERE m.parts[1] ~ '^[가-힣]'
+                 UNION ALL
+                 SELECT m.parts[1] WHERE m.parts[1] !~ '^[가-힣]'
+             ) AS t
+        $$""",
+    "ALTER TABLE document_chunks DROP COLUMN IF EXISTS chunk_tsv",
+    f"""ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS chunk_terms_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', {TERMS_FUNCTION}(chunk_text))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_chunk_terms_tsv ON document_chunks USING GIN (chunk_terms_tsv)",
+]
+
+_POSTGRES_SEARCH = text("""
+    SELECT id AS chunk_id, ts_rank_cd(chunk_terms_tsv, query) AS score
+    FROM document_chunks, to_tsquery('simple', :query) AS query
+    WHERE user_id = :user_id AND chunk_terms_tsv @@ query
+    ORDER BY score DESC
+    LIMIT :k
+""")
+
+def query_terms(query: str):
+    """쿼리에서 검색어 추출 (메모리 BM25와 같은 토큰 - DB 질의 문법 문자는 모두 제거)"""
+    return list(dict.fromkeys(tokenize(query or '')))
+
+def _is_hangul(term: str) -> bool:
+    return '가' <= term[0] <= '힣'
+
+class FullTextSearch:
+    """DB 자체 전문 검색 인덱스(SQLite FTS5 / PostgreSQL tsvector + GIN)를 사용하는 키워드 검색
+
+    메모리 BM25(keyword_index.tokenize)와 같은 한글 bigram 토큰을 색인하므로 조사가 달라도 찾을 수 있습니다.
+    청크 텍스트 동기화는 DB가 담당하므로(트리거 / 생성 컬럼) 업로드와 삭제 코드에는 변경이 없고,
+    검색은 사용자별 상위 k개 (chunk_id, 점수)만 반환합니다.
+    """
+
+    def __init__(self, backend: str = KEYWORD_SEARCH_BACKEND):
+        self.backend = backend
+        self.dialect = engine.dialect.name
+        self.available = False
+
+        # 검색 통계
+        self.queries = 0
+        self.failures = 0
+        self.query_seconds = 0.0
+
+    def enabled(self) -> bool:
+        """키워드 검색에 DB 전문 검색을 사용하는지 여부 (아니면 메모리 BM25 역색인)"""
+        return self.available and self.backend in ('auto', 'database')
+
+    async def setup(self, conn) -> bool:
+        """전문 검색 테이블/인덱스 생성 (create_tables에서 테이블 생성 직후 호출)"""
+        if self.backend == 'memory':
+            return False
+        try:
+            if self.dialect == 'sqlite':
+                existing = (await conn.execute(
+                    text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE}
+                )).scalar()
+                if existing is not None and "terms" not in existing:
+                    # 예전 단어 단위(external content) 테이블과 트리거는 bigram 색인으로 교체
+                    for suffix in _SQLITE_TRIGGERS:
+                        await conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}"))
+                    await conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+                    existing = None
+                for statement in _SQLITE_SETUP:
+                    await conn.execute(text(statement))
+                if existing is None:
+                    # 기존 청크를 한 번에 색인
+                    await conn.execute(text(
+                        f"INSERT INTO {FTS_TABLE}(rowid, terms) "
+                        f"SELECT id, {TERMS_FUNCTION}(chunk_text) FROM document_chunks"
+                    ))
+            elif self.dialect == 'postgresql':
+                for statement in _POSTGRES_SETUP:
+                    await conn.execute(text(statement))
+            else:
+                print(f"전문 검색 미지원 DB ({self.dialect}), 메모리 BM25 키워드 검색 사용")
+                return False
+        except Exception as e:
+            print(f"전문 검색 인덱스 생성 실패 ({self.dialect}), 메모리 BM25 키워드 검색 사용: {e}")
+            self.available = False
+            return False
+        self.available = True
+        print(f"전문 검색 인덱스 준비 완료 ({self.dialect})")
+        return True
+
+    def _build_query(self, terms) -> str:
+        """검색어를 OR로 연결 (한글 bigram은 정확히 일치, 영문/숫자 단어는 접두사 일치)"""
+        if self.dialect == 'sqlite':
+            return " OR ".join('"' + term.replace('"', '""') + ('"' if _is_hangul(term) else '"*') for term in terms)
+        return " | ".join(term if _is_hangul(term) else f"{term}:*" for term in terms)
+
+    async def search(self, user_id: str, query: str, k: int = 5):
+        """사용자 청크에서 상위 k개 (chunk_id, 점수) 반환 (점수가 클수록 관련도 높음)"""
+        terms = query_terms(query)
+        if not terms or k <= 0:
+            return []
+        statement = _SQLITE_SEARCH if self.dialect == 'sqlite' else _POSTGRES_SEARCH
+        start = time.perf_counter()
+        try:
+            async with async_session() as session:
+                result = await session.execute(
+                    statement, {"query": self._build_query(terms), "user_id": user_id, "k": k}
+                )
+                return [(int(row.chunk_id), float(row.score)) for row in result]
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+    def get_stats(self):
+        """사용 중인 키워드 검색 엔진과 질의 통계 반환"""
+        return {
+            "backend": "database" if self.enabled() else "memory",
+            "configured": self.backend,
+            "dialect": self.dialect,
+            "available": self.available,
+            "queries": self.queries,
+            "failures": self.failures,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0
+        }
+
+# 전역 DB 전문 검색
+full_text_search = FullTextSearch()
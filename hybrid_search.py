@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+# 기본 검색 방식: dense(FAISS), keyword(BM25), hybrid(둘을 동시에 실행 후 결합, 요청별 mode로도 선택)
+SEARCH_MODES = ('dense', 'keyword', 'hybrid')
+SEARCH_MODE = os.environ.get('SEARCH_MODE', 'dense').lower()
+
+# hybrid 결합 방식: rrf(순위 기반), weighted(정규화 점수 가중합)
+FUSION_METHODS = ('rrf', 'weighted')
+HYBRID_FUSION = os.environ.get('HYBRID_FUSION', 'rrf').lower()
+# RRF 상수 (클수록 하위 순위의 영향이 커짐)
+HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', '60'))
+# 키워드 결과 가중치 (0~1, dense 가중치는 1 - 이 값)
+HYBRID_KEYWORD_WEIGHT = float(os.environ.get('HYBRID_KEYWORD_WEIGHT', '0.5'))
+# 결합 전에 각 검색기에서 가져올 최소 후보 수
+HYBRID_CANDIDATES = int(os.environ.get('HYBRID_CANDIDATES', '20'))
+
+# 단계별 지연 시간 통계에 유지할 최근 요청 수
+SEARCH_LATENCY_WINDOW = int(os.environ.get('SEARCH_LATENCY_WINDOW', '1000'))
+
+def fuse_rrf(dense_hits, keyword_hits, k: int, rrf_k: int = HYBRID_RRF_K,
+             keyword_weight: float = HYBRID_KEYWORD_WEIGHT):
+    """Reciprocal Rank Fusion - 점수 척도와 무관하게 순위만으로 결합
+
+    hits는 점수 내림차순 (chunk_id, score) 목록이며,
+    반환값은 (chunk_id, 결합 점수, dense 점수, 키워드 점수) 상위 k개입니다.
+    """
+    fused = {}
+    for weight, hits, slot in ((1.0 - keyword_weight, dense_hits, 0), (keyword_weight, keyword_hits, 1)):
+        for rank, (chunk_id, score) in enumerate(hits, start=1):
+            entry = fused.setdefault(chunk_id, [0.0, None, None])
+            entry[0] += weight / (rrf_k + rank)
+            entry[1 + slot] = score
+    ranked = sorted(fused.items(), key=lambda item: item[1][0], reverse=True)[:k]
+    return [(chunk_id, score, dense, keyword) for chunk_id, (score, dense, keyword) in ranked]
+
+def _min_max(hits):
+    """점수를 0~1로 정규화 (모두 같으면 1)"""
+    if not hits:
+        return {}
+    scores = np.array([score for _, score in hits], dtype='float64')
+    low, high = scores.min(), scores.max()
+    if high - low <= 0:
+        return {chunk_id: 1.0 for chunk_id, _ in hits}
+    return {chunk_id: float((score - low) / (high - low)) for chunk_id, score in hits}
+
+def fuse_weighted(dense_hits, keyword_hits, k: int, keyword_weight: float = HYBRID_KEYWORD_WEIGHT):
+    """검색기별로 min-max 정규화한 점수의 가중합으로 결합 (반환 형식은 fuse_rrf와 같음)"""
+    dense_norm = _min_max(dense_hits)
+    keyword_norm = _min_max(keyword_hits)
+    dense_scores = dict(dense_hits)
+    keyword_scores = dict(keyword_hits)
+    fused = []
+    for chunk_id in dense_norm.keys() | keyword_norm.keys():
+        score = (1.0 - keyword_weight) * dense_norm.get(chunk_id, 0.0) + keyword_weight * keyword_norm.get(chunk_id, 0.0)
+        fused.append((chunk_id, score, dense_scores.get(chunk_id), keyword_scores.get(chunk_id)))
+    fused.sort(key=lambda item: item[1], reverse=True)
+    return fused[:k]
+
+class SearchLatencyStats:
+    """검색 방식별, 단계별(embed / dense / keyword / fusion / hydrate / total) 최근 지연 시간 p50/p99"""
+
+    def __init__(self, window: int = SEARCH_LATENCY_WINDOW):
+        self.window = max(1, window)
+        self._samples = {}  # (mode, stage) -> deque[초]
+        self._counts = {}  # mode -> 누적 요청 수
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, timings: dict):
+        """한 요청의 단계별 소요 시간(초) 기록"""
+        with self._lock:
+            self._counts[mode] = self._counts.get(mode, 0) + 1
+            for stage, seconds in timings.items():
+                samples = self._samples.get((mode, stage))
+                if samples is None:
+                    samples = self._samples[(mode, stage)] = deque(maxlen=self.window)
+                samples.append(seconds)
+
+    def get_stats(self):
+        """{mode: {"requests": n, stage: {"p50_ms", "p99_ms", "max_ms"}}} 반환"""
+        with self._lock:
+            snapshot = {key: np.array(samples) for key, samples in self._samples.items()}
+            counts = dict(self._counts)
+        stats = {mode: {"requests": count} for mode, count in counts.items()}
+        for (mode, stage), samples in snapshot.items():
+            stats.setdefault(mode, {})[stage] = {
+                "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 3),
+                "max_ms": round(float(samples.max()) * 1000, 3)
+            }
+        return stats
+
+# 전역 검색 지연 시간 통계
+search_latency = SearchLatencyStats()
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+
+# 마지막 변경 후 이 시간 동안 추가 변경이 없으면 인덱스를 디스크에 기록
+INDEX_FLUSH_DEBOUNCE_SECONDS = float(os.environ.get('INDEX_FLUSH_DEBOUNCE_SECONDS', '2.0'))
+# 업로드가 계속 이어져도 첫 변경 후 이 시간 안에는 반드시 기록
+INDEX_FLUSH_MAX_DELAY_SECONDS = float(os.environ.get('INDEX_FLUSH_MAX_DELAY_SECONDS', '30.0'))
+
+class IndexFlushScheduler:
+    """변경된 사용자 인덱스를 모아 백그라운드에서 기록하는 write-behind 스케줄러
+
+    업로드 요청은 인덱스에 벡터를 추가한 뒤 dirty 표시만 하고 바로 응답하며,
+    전용 스레드가 debounce 간격이 지난 서비스의 save_index()를 호출합니다.
+    서비스 제거(eviction)와 서버 종료 시에는 flush / flush_all로 즉시 기록합니다.
+    매니저에서 제거되어 정리가 끝난 서비스(resident=False)는 기록하지 않습니다
+    (같은 사용자의 새 서비스와 같은 파일에 쓰지 않도록).
+    """
+
+    def __init__(self, debounce_seconds: float = INDEX_FLUSH_DEBOUNCE_SECONDS,
+                 max_delay_seconds: float = INDEX_FLUSH_MAX_DELAY_SECONDS):
+        self.debounce_seconds = max(0.0, debounce_seconds)
+        self.max_delay_seconds = max(self.debounce_seconds, max_delay_seconds)
+        self._dirty = {}  # service -> [처음 표시 시각, 마지막 표시 시각]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        # 기록 통계
+        self.marked = 0
+        self.flushes = 0
+        self.failures = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = None
+
+    def _due_at(self, first_marked: float, last_marked: float) -> float:
+        return min(last_marked + self.debounce_seconds, first_marked + self.max_delay_seconds)
+
+    def _ensure_thread(self):
+        """필요할 때 기록 스레드 시작 (조건 변수 락 내부에서 호출)"""
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name="index-flusher", daemon=True)
+            self._thread.start()
+            print(f"인덱스 write-behind 스케줄러 시작 (debounce {self.debounce_seconds}초, "
+                  f"최대 지연 {self.max_delay_seconds}초)")
+
+    def mark_dirty(self, service):
+        """서비스의 인덱스가 디스크와 달라졌음을 표시 (워커 스레드에서도 호출 가능)"""
+        if not service.resident:
+            return
+        now = time.monotonic()
+        with self._cond:
+            entry = self._dirty.get(service)
+            if entry is None:
+                self._dirty[service] = [now, now]
+            else:
+                entry[1] = now
+            self.marked += 1
+            self._ensure_thread()
+            self._cond.notify()
+
+    def is_dirty(self, service) -> bool:
+        with self._cond:
+            return service in self._dirty
+
+    def _run(self):
+        """debounce 간격이 지난 서비스를 골라 기록하는 스레드 루프"""
+        while True:
+            with self._cond:
+                due = []
+                while not self._stopped:
+                    now = time.monotonic()
+                    due = [service for service, (first, last) in self._dirty.items()
+                           if self._due_at(first, last) <= now]
+                    if due:
+                        break
+                    timeout = None
+                    if self._dirty:
+                        timeout = min(self._due_at(first, last) for first, last in self._dirty.values()) - now
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                for service in due:
+                    self._dirty.pop(service, None)
+
+            for service in due:
+                self._flush_service(service)
+
+    def _flush_service(self, service):
+        """save_index 호출 및 지연 시간 기록"""
+        if not service.resident:
+            print(f"사용자 {service.user_id}: 제거된 서비스이므로 인덱스 기록 건너뜀")
+            return False
+        start = time.perf_counter()
+        try:
+            service.save_index()
+            ok = True
+        except Exception as e:
+            print(f"사용자 {service.user_id}: 인덱스 write-behind 기록 실패: {e}")
+            ok = False
+        seconds = time.perf_counter() - start
+        with self._cond:
+            if ok:
+                self.flushes += 1
+            else:
+                self.failures += 1
+                # 다음 주기에 다시 시도
+                self._dirty.setdefault(service, [time.monotonic(), time.monotonic()])
+                self._cond.notify()
+            self.flush_seconds += seconds
+            self.max_flush_seconds = max(self.max_flush_seconds, seconds)
+            self.last_flush_seconds = seconds
+        return ok
+
+    def flush(self, service) -> bool:
+        """dirty 상태인 서비스를 즉시 기록 (서비스 제거 시 호출, 변경이 없으면 아무것도 하지 않음)"""
+        with self._cond:
+            if self._dirty.pop(service, None) is None:
+                return False
+        return self._flush_service(service)
+
+    def discard(self, service) -> bool:
+        """기록하지 않고 dirty 표시만 제거 (사용자 데이터 전체를 삭제할 때)"""
+        with self._cond:
+            return self._dirty.pop(service, None) is not None
+
+    def flush_all(self) -> int:
+        """dirty 상태인 모든 서비스를 즉시 기록 (서버 종료 시 호출)"""
+        with self._cond:
+            services = list(self._dirty)
+            self._dirty.clear()
+        flushed = sum(1 for service in services if self._flush_service(service))
+        print(f"인덱스 write-behind: {flushed}/{len(services)}개 서비스 기록 완료")
+        return flushed
+
+    def shutdown(self):
+        """남은 변경을 모두 기록하고 스레드 종료"""
+        self.flush_all()
+        with self._cond:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=5)
+        # 종료 대기 중에 실패해 다시 표시된 서비스가 있으면 한 번 더 시도
+        if self._dirty:
+            self.flush_all()
+
+    def get_stats(self):
+        """dirty 서비스 수와 기록 지연 시간 통계 반환"""
+        with self._cond:
+            attempts = self.flushes + self.failures
+            return {
+                "dirty_services": len(self._dirty),
+                "debounce_seconds": self.debounce_seconds,
+                "max_delay_seconds": self.max_delay_seconds,
+                "marked": self.marked,
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "avg_flush_ms": round(self.flush_seconds / attempts * 1000, 2) if attempts else 0.0,
+                "max_flush_ms": round(self.max_flush_seconds * 1000, 2),
+                "last_flush_ms": round(self.last_flush_seconds * 1000, 2) if self.last_flush_seconds is not None else None
+            }
+
+# 전역 인덱스 기록 스케줄러
+index_flusher = IndexFlushScheduler()
@@ -0,0 +1,321 @@
+import os
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from embedding_executor import EmbeddingExecutor
+
+# 동시에 처리할 업로드 작업 수
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '2'))
+# 대기열 최대 길이 (가득 차면 업로드를 503으로 거절)
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', '100'))
+# 업로드 원본 파일 복사/삭제 전용 스레드 수 (추출 중인 작업과 관계없이 /upload가 바로 응답하도록 분리)
+INGEST_COPY_WORKERS = int(os.environ.get('INGEST_COPY_WORKERS', '4'))
+# 상태 조회용으로 보관할 완료/실패 작업 수
+INGEST_JOB_HISTORY = int(os.environ.get('INGEST_JOB_HISTORY', '1000'))
+# 처리 전 원본 파일을 보관할 디렉토리 (CloudType 환경은 임시 디렉토리)
+if os.environ.get('CLOUDTYPE_DEPLOYMENT', '0') == '1':
+    import tempfile
+    _DEFAULT_UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "ingest_uploads")
+else:
+    _DEFAULT_UPLOAD_DIR = "ingest_uploads"
+INGEST_UPLOAD_DIR = os.environ.get('INGEST_UPLOAD_DIR', _DEFAULT_UPLOAD_DIR)
+# 업로드 파일 최대 크기 (MB, 수신 중에 적용되며 넘으면 413)
+MAX_UPLOAD_SIZE_MB = float(os.environ.get('MAX_UPLOAD_SIZE_MB', '100'))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+# 업로드 파일을 작업 디렉토리로 복사할 때 한 번에 읽는 크기
+UPLOAD_COPY_CHUNK_BYTES = 1024 * 1024
+# 확장자별 추출 진행률 단위 (DocumentProcessor.iter_text의 progress 콜백)
+EXTRACT_UNITS = {"pdf": "pages", "docx": "paragraphs", "txt": "bytes"}
+
+class UploadTooLarge(ValueError):
+    """업로드 크기 제한 초과"""
+
+    def __init__(self, max_bytes: int = MAX_UPLOAD_BYTES):
+        super().__init__(f"파일이 너무 큽니다. 최대 {max_bytes / (1024 * 1024):g}MB까지 업로드할 수 있습니다.")
+        self.max_bytes = max_bytes
+
+class IngestJob:
+    """업로드 한 건의 처리 상태 (queued -> extracting -> embedding -> saving -> completed/failed)
+
+    추출과 임베딩은 배치 단위로 겹쳐 진행되므로(첫 배치가 나오면 embedding) 전체 청크 수는 원본을 끝까지
+    읽은 뒤에야 알 수 있습니다. 그 전의 진행률은 원본을 읽은 비율(페이지/문단/바이트)로 계산합니다.
+    """
+
+    def __init__(self, user_id: str, filename: str, path: str, size: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filename = filename
+        self.path = path  # 대기 중 원본 파일 경로 (처리 후 삭제)
+        self.size = size
+        self.status = "queued"
+        self.total_chunks = None  # 원본을 끝까지 읽은 뒤 확정
+        self.chunked_chunks = 0  # 지금까지 만든 청크 수
+        self.embedded_chunks = 0  # 임베딩이 커밋된 청크 수
+        self.extract_unit = EXTRACT_UNITS.get(os.path.splitext(filename or "")[1].lower().lstrip("."))
+        self.extracted = 0  # 원본에서 읽은 양 (extract_unit 단위)
+        self.extract_total = 0
+        self.document_id = None
+        self.error = None
+        self.result = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.stage_seconds = {}  # 단계 -> 소요 시간
+        self._stage_start = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def set_extract_progress(self, done: int, total: int):
+        """원본 추출 진행 상황 기록 (업로드 처리 스레드에서 호출)"""
+        self.extracted = done
+        self.extract_total = total
+
+    @property
+    def progress(self) -> float:
+        """0~1 진행률: 전체 청크 수를 알면 임베딩된 비율, 아니면 읽은 원본 비율 x 만든 청크 중 임베딩된 비율"""
+        if self.status == "completed":
+            return 1.0
+        if self.total_chunks:
+            return self.embedded_chunks / self.total_chunks
+        if self.extract_total and self.chunked_chunks:
+            return min(self.extracted / self.extract_total, 1.0) * self.embedded_chunks / self.chunked_chunks
+        return 0.0
+
+    def set_stage(self, stage: str):
+        """현재 단계 기록 (이전 단계의 소요 시간 누적)"""
+        now = time.perf_counter()
+        if self._stage_start is not None and self.status not in ("queued", "completed", "failed"):
+            self.stage_seconds[self.status] = round(
+                self.stage_seconds.get(self.status, 0.0) + now - self._stage_start, 3)
+        self.status = stage
+        self._stage_start = now
+
+    def to_dict(self):
+        """/jobs/{id} 응답"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "size": self.size,
+            "total_chunks": self.total_chunks,
+            "chunked_chunks": self.chunked_chunks,
+            "embedded_chunks": self.embedded_chunks,
+            "extracted": self.extracted,
+            "extract_total": self.extract_total,
+            "extract_unit": self.extract_unit,
+            "progress": round(self.progress, 4),
+            "document_id": self.document_id,
+            "error": self.error,
+            "result": self.result,
+            "stage_seconds": dict(self.stage_seconds),
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "user_id": self.user_id
+        }
+
+class IngestJobQueue:
+    """프로세스 내 업로드 작업 대기열과 고정 크기 워커 풀
+
+    /upload는 원본 파일을 디스크에 저장하고 작업을 넣은 뒤 바로 job id를 반환하며,
+    워커가 handler(job)(추출 -> 정제 -> 청킹 -> 임베딩 -> 저장)를 실행합니다.
+    외부 서비스 없이 동작하는 대신 서버가 재시작되면 대기 중인 작업은 사라집니다.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_queue: int = INGEST_QUEUE_SIZE,
+                 history: int = INGEST_JOB_HISTORY, upload_dir: str = INGEST_UPLOAD_DIR,
+                 copy_workers: int = INGEST_COPY_WORKERS):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.history = max(1, history)
+        self.upload_dir = upload_dir
+        self.handler = None  # async def handler(job) - main.py에서 등록
+        self._queue = None
+        self._tasks = []
+        self._loop = None
+        self._jobs = OrderedDict()  # job_id -> IngestJob (오래된 완료 작업부터 정리)
+        # 텍스트 추출처럼 블로킹되는 단계를 실행하는 스레드 풀 (임베딩 워커와 분리)
+        self.executor = EmbeddingExecutor(self.workers, name="ingest", label="업로드 처리")
+        # 원본 파일 복사/삭제는 별도 스레드 풀 (업로드 처리 스레드가 모두 추출 중이어도 /upload가 기다리지 않음)
+        self.file_executor = EmbeddingExecutor(copy_workers, name="ingest-copy", label="업로드 파일 복사")
+        self._created = time.time()
+
+        # 처리 통계
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.job_seconds = 0.0
+
+    def configure(self, handler):
+        """작업 처리 함수 등록"""
+        self.handler = handler
+
+    def _remove_stale_files(self):
+        """이전 프로세스에서 처리되지 못한 원본 파일 정리 (대기열은 메모리에만 있어 재시작 후에는 처리할 수 없음)"""
+        try:
+            names = os.listdir(self.upload_dir)
+        except FileNotFoundError:
+            return
+        removed = 0
+        for name in names:
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < self._created:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                print(f"업로드 원본 파일 삭제 실패 ({path}): {e}")
+        if removed:
+            print(f"처리되지 못한 업로드 원본 파일 {removed}개 정리")
+
+    def _ensure_workers(self):
+        """첫 작업이 들어올 때 이벤트 루프 안에서 워커 시작 (루프가 바뀌면 새로 시작)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._remove_stale_files()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._tasks = []
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+            print(f"업로드 작업 워커 시작: {self.workers}개 (대기열 {self.max_queue})")
+
+    def _copy_file(self, path: str, source, max_bytes: int) -> int:
+        """업로드 파일 객체를 조각 단위로 path에 복사 (크기 제한을 넘으면 중단 후 UploadTooLarge)"""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    block = source.read(UPLOAD_COPY_CHUNK_BYTES)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > max_bytes:
+                        raise UploadTooLarge(max_bytes)
+                    f.write(block)
+        except BaseException:
+            self._remove_file(path)
+            raise
+        return size
+
+    async def submit(self, user_id: str, filename: str, source, max_bytes: int = MAX_UPLOAD_BYTES) -> IngestJob:
+        """업로드 파일 객체(UploadFile.file 등)를 작업 디렉토리로 스트리밍 복사한 뒤 작업 등록
+
+        파일 전체를 bytes로 읽지 않으므로 큰 업로드가 동시에 들어와도 메모리 사용량은 복사 조각 크기로 유지됩니다.
+        대기열이 가득 차면 asyncio.QueueFull, 크기 제한을 넘으면 UploadTooLarge, 빈 파일이면 ValueError.
+        """
+        self._ensure_workers()
+        if self._queue.full():
+            self.rejected += 1
+            raise asyncio.QueueFull()
+
+        extension = os.path.splitext(filename or "")[1].lower()
+        job = IngestJob(user_id, filename, None, 0)
+        job.path = os.path.join(self.upload_dir, f"{job.id}{extension}")
+        source.seek(0)
+        job.size = await self.file_executor.run(self._copy_file, job.path, source, max_bytes)
+        if job.size == 0:
+            await self.file_executor.run(self._remove_file, job.path)
+            raise ValueError("빈 파일입니다.")
+
+        try:
+            # 복사하는 동안 다른 업로드가 대기열을 채웠을 수 있음
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            await self.file_executor.run(self._remove_file, job.path)
+            raise
+        self._jobs[job.id] = job
+        self.submitted += 1
+        self._trim_history()
+        return job
+
+    def get(self, job_id: str, user_id: str = None):
+        """작업 조회 (user_id를 주면 다른 사용자의 작업은 None)"""
+        job = self._jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        return job
+
+    def _trim_history(self):
+        """보관 한도를 넘는 가장 오래된 완료 작업 정리 (진행 중인 작업은 유지)"""
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+
+    def _remove_file(self, path: str):
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"업로드 원본 파일 삭제 실패 ({path}): {e}")
+
+    async def _worker(self, worker_id: int):
+        """대기열에서 작업을 꺼내 handler 실행"""
+        while True:
+            job = await self._queue.get()
+            start = time.perf_counter()
+            job.started_at = datetime.utcnow()
+            try:
+                await self.handler(job)
+                job.set_stage("completed")
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.error = "서버 종료로 작업이 중단되었습니다."
+                job.set_stage("failed")
+                self.failed += 1
+                raise
+            except Exception as e:
+                print(f"사용자 {job.user_id}: 업로드 작업 {job.id} 실패: {e}")
+                job.error = str(e)
+                job.set_stage("failed")
+                self.failed += 1
+            finally:
+                job.finished_at = datetime.utcnow()
+                self.job_seconds += time.perf_counter() - start
+                await self.file_executor.run(self._remove_file, job.path)
+                self._queue.task_done()
+
+    async def shutdown(self, timeout: float = 30.0):
+        """대기 중인 작업을 일정 시간 처리한 뒤 워커 종료"""
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"업로드 작업 대기열 종료 시간 초과 (남은 작업 {self._queue.qsize()}개)")
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.executor.shutdown(wait=True)
+        self.file_executor.shutdown(wait=True)
+
+    def get_stats(self):
+        """대기열 길이와 처리 통계 반환"""
+        finished = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "copy_workers": self.file_executor.max_workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "running": sum(1 for job in self._jobs.values() if not job.done and job.status != "queued"),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self.job_seconds / finished, 3) if finished else 0.0
+        }
+
+# 전역 업로드 작업 대기열
+ingest_queue = IngestJobQueue()
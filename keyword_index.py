@@ -0,0 +1,155 @@
+import os
+import re
+import math
+import heapq
+import threading
+import unicodedata
+
+# BM25 파라미터 (k1: 단어 빈도 포화, b: 문서 길이 정규화)
+BM25_K1 = float(os.environ.get('BM25_K1', '1.2'))
+BM25_B = float(os.environ.get('BM25_B', '0.75'))
+
+# 한글 음절 연속 구간 / 그 밖의 단어 문자 연속 구간 (영문, 숫자 등)
+_TOKEN_RE = re.compile(r'[가-힣]+|[^\W가-힣]+')
+
+def tokenize(text: str):
+    """키워드 검색용 토큰 분리
+
+    한국어는 조사가 붙어 띄어쓰기 단위로는 일치하지 않으므로("한국의" / "한국은")
+    한글 구간은 글자 bigram으로 나누고, 영문/숫자는 소문자 단어 단위로 사용합니다.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFC', text).lower()
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        word = match.group()
+        if '가' <= word[0] <= '힣':
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+def keyword_terms(text: str) -> str:
+    """DB 전문 검색에 색인할 문자열 (tokenize 결과를 공백으로 연결)
+
+    DB 토크나이저는 띄어쓰기 단위로 나누므로 bigram을 공백으로 이어 저장해야
+    "한국은"으로 "한국의"가 들어 있는 청크를 찾을 수 있습니다.
+    """
+    return " ".join(tokenize(text))
+
+class BM25Index:
+    """사용자 청크에 대한 메모리 내 역색인과 BM25 점수 계산
+
+    업로드 시 add_many로 증분 갱신하고 삭제 시 remove로 제거하며,
+    검색은 쿼리 토큰의 posting list만 순회하므로 비용이 코퍼스 크기가 아닌
+    posting list 길이에 비례합니다.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # 토큰 -> {chunk_id: 단어 빈도}
+        self._doc_terms = {}  # chunk_id -> (토큰 수, 고유 토큰 튜플) - 삭제 시 posting 정리용
+        self._total_length = 0
+        self._posting_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._doc_terms
+
+    def add_many(self, rows) -> int:
+        """(chunk_id, text) 행 추가 - 이미 있는 청크는 건너뜀 (재구성과 업로드가 겹쳐도 안전)
+
+        토큰화는 락 밖에서 하고 역색인 갱신만 락 안에서 합니다.
+        """
+        prepared = []
+        for chunk_id, text in rows:
+            tokens = tokenize(text)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            prepared.append((int(chunk_id), len(tokens), counts))
+
+        added = 0
+        with self._lock:
+            for chunk_id, length, counts in prepared:
+                if chunk_id in self._doc_terms:
+                    continue
+                for token, tf in counts.items():
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = {}
+                    postings[chunk_id] = tf
+                self._doc_terms[chunk_id] = (length, tuple(counts))
+                self._total_length += length
+                self._posting_count += len(counts)
+                added += 1
+        return added
+
+    def remove(self, chunk_ids) -> int:
+        """청크 제거 (해당 청크의 토큰 posting만 정리)"""
+        removed = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                entry = self._doc_terms.pop(int(chunk_id), None)
+                if entry is None:
+                    continue
+                length, terms = entry
+                for token in terms:
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        continue
+                    postings.pop(int(chunk_id), None)
+                    if not postings:
+                        del self._postings[token]
+                self._total_length -= length
+                self._posting_count -= len(terms)
+                removed += 1
+        return removed
+
+    def search(self, query: str, k: int = 5):
+        """BM25 상위 k개 (chunk_id, 점수) 반환"""
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count
+            k1, b = self.k1, self.b
+            scores = {}
+            for token in terms:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = k1 * (1 - b + b * self._doc_terms[chunk_id][0] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def memory_bytes(self) -> int:
+        """역색인 메모리 사용량 추정치 (dict 항목당 평균 크기 기준)"""
+        return self._posting_count * 100 + len(self._postings) * 120 + len(self._doc_terms) * 150
+
+    def get_stats(self):
+        """문서/토큰/posting 수 반환"""
+        with self._lock:
+            return {
+                "chunks": len(self._doc_terms),
+                "terms": len(self._postings),
+                "postings": self._posting_count,
+                "avg_chunk_tokens": round(self._total_length / len(self._doc_terms), 1) if self._doc_terms else 0.0,
+                "memory_mb": round(self.memory_bytes() / (1024**2), 2)
+            }
@@ -8,9 +8,48 @@ except ImportError:
     subprocess.check_call(["pip", "install", "--no-cache-dir", "numpy==1.24.3"])
     import numpy as np
 
-from sqlalchemy import select
+from sqlalchemy import select, func
 from database import async_session, DocumentChunk
+from embedding_codec import decode_matrix
+from ann_index import build_index, choose_index_kind, estimate_index_bytes, export_vectors, index_ids, index_kind, search_params
+from vector_store import MmapFlatIndex, SegmentStore, load_vectors
+from embedding_executor import embedding_executor
+from embedding_cache import embedding_cache, embedding_cache_key
+from chunk_cache import chunk_cache
+from keyword_index import BM25Index
+from fulltext_search import full_text_search
+from hybrid_search import (SEARCH_MODE, SEARCH_MODES, HYBRID_FUSION, FUSION_METHODS, HYBRID_RRF_K,
+                           HYBRID_KEYWORD_WEIGHT, HYBRID_CANDIDATES, fuse_rrf, fuse_weighted, search_latency)
+from index_flusher import index_flusher
+from query_batcher import QueryMicroBatcher, QUERY_BATCH_MAX_SIZE
+from search_cache import search_cache, normalize_query
 import asyncio
+import functools
+import itertools
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import threading
+import time
+
+# 모든 사용자가 공유하는 임베딩 모델 이름
+EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'paraphrase-MiniLM-L3-v2')
+# 업로드 시 한 번의 forward pass에 넣을 청크 수
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '32'))
+EMBEDDING_DIMENSION = 384
+# 검색 전용 서비스의 인덱스를 memory map으로 열지 여부
+FAISS_MMAP_READONLY = os.environ.get('FAISS_MMAP_READONLY', '1') == '1'
+# DB 임베딩으로 인덱스를 재구성할 때 한 번에 읽는 행 수
+INDEX_REBUILD_BATCH_SIZE = int(os.environ.get('INDEX_REBUILD_BATCH_SIZE', '2000'))
+# delta 세그먼트가 이 개수 이상이면 base로 병합
+SEGMENT_MAX_DELTAS = int(os.environ.get('SEGMENT_MAX_DELTAS', '8'))
+# delta 행 수가 base 행 수의 이 비율 이상이면 base로 병합
+SEGMENT_COMPACT_RATIO = float(os.environ.get('SEGMENT_COMPACT_RATIO', '0.5'))
+# 삭제 표시(tombstone)된 벡터 비율이 이 값 이상이면 인덱스를 백그라운드에서 재구성
+INDEX_TOMBSTONE_RATIO = float(os.environ.get('INDEX_TOMBSTONE_RATIO', '0.2'))
+# 메모리에 유지할 사용자 인덱스 전체의 메모리 예산 (MB, 벡터 수 x 차원 기준 추정치)
+EMBEDDING_SERVICE_MEMORY_BUDGET_MB = float(os.environ.get('EMBEDDING_SERVICE_MEMORY_BUDGET_MB', '1024'))
+# 메모리 예산과 별개로 유지할 최대 서비스 수
+EMBEDDING_MAX_SERVICES = int(os.environ.get('EMBEDDING_MAX_SERVICES', '50'))
 
 # 임베딩 모델이 없을 때 사용할 간단한 대체 클래스
 class DummyEmbedder:
@@ -18,13 +57,146 @@ class DummyEmbedder:
         # 384차원의 랜덤 임베딩 생성
         return np.random.rand(len(texts), 384).astype('float32')
 
+# 프로세스 전역 임베딩 모델 레지스트리
+class SharedModelRegistry:
+    """프로세스당 한 번만 모델을 로드하고 모든 UserEmbeddingService가 참조를 공유"""
+    
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._load_attempted = False  # 실패한 로드도 반복하지 않도록 기록
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.memory_bytes = 0
+        self.load_error = None
+    
+    def get_model(self):
+        """공유 모델 반환 (최초 호출 시 스레드 안전하게 로드)"""
+        if self._load_attempted:
+            return self._model
+        
+        with self._lock:
+            # 락을 기다리는 동안 다른 스레드가 이미 로드했을 수 있음
+            if not self._load_attempted:
+                self._load()
+                self._load_attempted = True
+        return self._model
+    
+    def _load(self):
+        """실제 모델 로드 (락 내부에서 호출)"""
+        start = time.perf_counter()
+        try:
+            print(f"공유 임베딩 모델 로딩 시작: {self.model_name}")
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+            self.memory_bytes = self._estimate_memory_bytes(self._model)
+            print(f"공유 임베딩 모델 로드 완료 ({time.perf_counter() - start:.2f}초, "
+                  f"{self.memory_bytes / (1024**2):.1f}MB)")
+        except ImportError as e:
+            print("SentenceTransformer 모듈 설치 필요. CloudType 환경에서는 간단한 임베딩 사용")
+            self._model = None
+            self.load_error = str(e)
+        except Exception as e:
+            print(f"공유 임베딩 모델 로드 실패: {e}")
+            self._model = None
+            self.load_error = str(e)
+        finally:
+            self.load_seconds = time.perf_counter() - start
+    
+    @staticmethod
+    def _estimate_memory_bytes(model):
+        """모델 파라미터와 버퍼가 차지하는 메모리 크기 추정"""
+        try:
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            total += sum(b.numel() * b.element_size() for b in model.buffers())
+            return int(total)
+        except Exception as e:
+            print(f"모델 메모리 크기 계산 실패: {e}")
+            return 0
+    
+    def get_stats(self):
+        """레지스트리 통계 반환"""
+        return {
+            "model_name": self.model_name,
+            "loaded": self._model is not None,
+            "load_attempted": self._load_attempted,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "memory_mb": round(self.memory_bytes / (1024**2), 2),
+            "load_error": self.load_error
+        }
+
+# 전역 모델 레지스트리
+model_registry = SharedModelRegistry()
+
+def normalize_rows(matrix):
+    """행 단위 L2 정규화를 한 번의 벡터 연산으로 수행 (코사인 유사도용)"""
+    matrix = np.ascontiguousarray(matrix, dtype='float32')
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def _encode_with_model(model, texts, batch_size):
+    """모델로 배치 단위 인코딩 후 한 번에 정규화"""
+    batch_size = max(1, int(batch_size))
+    parts = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        parts.append(model.encode(batch, batch_size=len(batch), convert_to_numpy=True))
+    return normalize_rows(np.vstack(parts))
+
+def encode_texts(texts, batch_size=EMBEDDING_BATCH_SIZE, disk_cache=True):
+    """텍스트 목록을 배치 단위로 인코딩하여 정규화된 (n, 384) float32 행렬 반환
+    
+    임베딩 캐시를 먼저 확인하고, 캐시에 없는 텍스트만 모델로 인코딩합니다.
+    disk_cache=False면 메모리 계층만 사용합니다 (검색 쿼리가 디스크 계층에 쌓이지 않도록).
+    """
+    if not texts:
+        return np.empty((0, EMBEDDING_DIMENSION), dtype='float32')
+    
+    model = model_registry.get_model()
+    if model is None:
+        # 모델이 로드되지 않았다면 대체 임베딩 사용 (랜덤 벡터는 캐시하지 않음)
+        print("모델 로드 실패, 대체 임베딩 사용")
+        return normalize_rows(DummyEmbedder().encode(texts))
+    
+    keys = [embedding_cache_key(text, model_registry.model_name) for text in texts]
+    cached = embedding_cache.get_many(keys, disk=disk_cache)
+    
+    # 캐시에 없는 텍스트만 (배치 내 중복 제거 후) 인코딩
+    pending = {}  # key -> 첫 등장 위치
+    for i, (key, vector) in enumerate(zip(keys, cached)):
+        if vector is None and key not in pending:
+            pending[key] = i
+    
+    encoded = {}
+    if pending:
+        miss_keys = list(pending)
+        miss_matrix = _encode_with_model(model, [texts[pending[key]] for key in miss_keys], batch_size)
+        embedding_cache.put_many(miss_keys, miss_matrix, disk=disk_cache)
+        encoded = dict(zip(miss_keys, miss_matrix))
+    
+    matrix = np.empty((len(texts), EMBEDDING_DIMENSION), dtype='float32')
+    for i, (key, vector) in enumerate(zip(keys, cached)):
+        matrix[i] = vector if vector is not None else encoded[key]
+    return matrix
+
+# 동시 쿼리 임베딩을 모아서 인코딩하는 전역 마이크로 배처 (모델이 공유되므로 사용자 구분 없음)
+# 쿼리는 대부분 한 번만 나오므로 fsync가 필요한 디스크 계층에는 기록하지 않음
+query_batcher = QueryMicroBatcher(functools.partial(encode_texts, batch_size=QUERY_BATCH_MAX_SIZE, disk_cache=False))
+
 # 사용자별 임베딩 서비스
+# 인덱스 버전 발급기 - 서비스가 제거 후 다시 만들어져도 버전이 겹치지 않도록 프로세스 전역으로 증가
+_index_versions = itertools.count(1)
+
 class UserEmbeddingService:
     """사용자별로 격리된 임베딩 서비스"""
     
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, read_only: bool = False):
         self.user_id = user_id
         self.dimension = 384  # 임베딩 차원
+        # 검색만 하는 사용자는 인덱스를 memory map으로 열어 힙 복사를 피함 (업로드 시 자동 전환)
+        self.read_only = read_only and FAISS_MMAP_READONLY
         
         # CloudType 환경 감지 및 파일 경로 설정
         self.is_cloudtype = os.environ.get('CLOUDTYPE_DEPLOYMENT', '0') == '1'
@@ -41,15 +213,76 @@ class UserEmbeddingService:
             os.makedirs(faiss_dir, exist_ok=True)
             self.index_path = os.path.join(faiss_dir, f"{user_id}.index")
             self.chunk_ids_path = os.path.join(faiss_dir, f"{user_id}_chunks.json")
+        # 세그먼트 파일(base + delta)과 manifest의 경로 접두사
+        # (user_data_cleaner가 사용자 파일을 찾는 "{user_id}_*" 패턴과 일치)
+        self.segments = SegmentStore(os.path.splitext(self.index_path)[0] + "_")
+        # 세그먼트 이전 형식: 단일 파일(.vecs.npy / .index)과 ID JSON (로드 후 다음 저장 때 삭제)
+        self.vectors_path = os.path.splitext(self.index_path)[0] + ".vecs.npy"
         
         # 필요한 모듈들은 메서드 내에서 필요할 때만 로드
         self._model = None
         self._faiss = None
-        self.index = None
-        self.chunk_ids = []
+        self.index = None  # 검색 결과로 청크 ID를 직접 반환 (IndexIDMap2)
+        # 임베딩 워커 스레드 간 인덱스 접근 보호 (add/search/write)
+        self._index_lock = threading.RLock()
+        # 디스크 기록(저장/압축) 직렬화 - 인덱스 락보다 먼저 획득
+        self._persist_lock = threading.Lock()
+        
+        # 디스크에 기록된 행 수와 인덱스 종류 (None이면 다음 저장 때 base 전체를 다시 기록)
+        self._persisted_rows = None
+        self._persisted_kind = None
+        self._persisted_tombstones = frozenset()
+        self._compaction_future = None
+        # 행 추가/삭제마다 증가하는 변경 세대와 마지막 제자리 삭제(뒤쪽 행이 당겨짐) 시점의 세대
+        # (저장 도중 제자리 삭제가 있었으면 기록한 행 수를 믿을 수 없으므로 base 전체를 다시 기록)
+        self._generation = 0
+        self._shifted_generation = 0
+        
+        # 제자리 삭제가 불가능한 인덱스(HNSW/IVF, 전환 중인 인덱스)의 삭제 표시된 청크 ID
+        self._tombstones = set()
+        self._tombstone_array = None  # 검색 시 제외 목록 (변경될 때만 다시 생성)
+        self.removed_chunks = 0
+        self.last_compaction = None
+        
+        # 배치 임베딩 처리량 통계
+        self.ingested_chunks = 0
+        self.ingest_seconds = 0.0
+        
+        # DB 임베딩 기반 웜 스타트 상태
+        self._freshness_checked = False  # 확인이 끝난 뒤에만 True (실패하면 다음 요청에서 다시 확인)
+        self._freshness_lock = asyncio.Lock()  # 동시 첫 검색이 확인 결과를 기다리도록 직렬화
+        self.last_rebuild = None
+        
+        # 코퍼스 크기에 따른 인덱스 종류 전환 (백그라운드 마이그레이션)
+        self._migration_future = None
+        self.last_migration = None
+        
+        # 키워드(BM25) 역색인 - DB 전문 검색을 쓸 수 없을 때 사용
+        # 첫 키워드 검색 때 DB 청크로 채우고 이후 업로드/삭제 시 증분 갱신
+        self.keyword_index = BM25Index()
+        self._keyword_loaded = False
+        self._keyword_load_lock = asyncio.Lock()
+        self._keyword_removed = set()  # 채우는 도중 삭제된 청크 (DB 스트림에 포함되었을 수 있음)
+        self.last_keyword_build = None
+        
+        # 검색 결과 캐시 키에 들어가는 인덱스 버전 (벡터/키워드 색인이 바뀐 뒤에 갱신)
+        self.index_version = next(_index_versions)
+        # 매니저가 요청마다 참조하는 메모리 추정치 (변경될 때만 다시 계산)
+        self._memory_bytes = None
+        
+        # 매니저에서 제거되어 정리까지 끝나면 False - 이후 변경은 디스크에 기록하지 않음
+        # (같은 사용자의 새 서비스만 인덱스 파일에 쓰도록)
+        self.resident = True
         
     def _load_faiss(self):
         """필요할 때만 FAISS 모듈 로드"""
+        if self._faiss is not None:
+            return
+        with self._index_lock:
+            self._load_faiss_locked()
+    
+    def _load_faiss_locked(self):
+        """FAISS 모듈 및 인덱스 로드 (인덱스 락 내부에서 호출)"""
         if self._faiss is None:
             try:
                 print("FAISS 모듈 로딩 시작...")
@@ -64,126 +297,279 @@ class UserEmbeddingService:
                 self._faiss = None
     
     def _load_model(self):
-        """필요할 때만 임베딩 모델 로드"""
+        """공유 레지스트리에서 임베딩 모델 참조 획득 (사용자별로 새로 로드하지 않음)"""
         if self._model is None:
-            try:
-                print("임베딩 모델 로딩 시작...")
-                from sentence_transformers import SentenceTransformer
-                self._model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
-                print("임베딩 모델 로드 완료")
-            except ImportError:
-                print("SentenceTransformer 모듈 설치 필요. CloudType 환경에서는 간단한 임베딩 사용")
-                # CloudType 환경에서는 간단한 임베딩 로직 사용
-                self._model = None
+            self._model = model_registry.get_model()
+    
+    def _new_index(self):
+        """청크 ID를 직접 저장하는 빈 Flat 인덱스 생성"""
+        return self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(self.dimension))
     
     def load_index(self):
         """기존 FAISS 인덱스 로드 (CloudType 환경 대응)"""
         self._load_faiss()  # FAISS 모듈 로드
         
         try:
-            if os.path.exists(self.index_path) and self._faiss:
-                self.index = self._faiss.read_index(self.index_path)
-                print(f"사용자 {self.user_id}: FAISS 인덱스 로드됨: {self.index.ntotal}개 벡터")
+            loaded = self._read_index_files() if self._faiss else None
+            if loaded is not None:
+                self.index = loaded
+                mode = "읽기 전용 mmap" if self.read_only else "메모리"
+                print(f"사용자 {self.user_id}: FAISS 인덱스 로드됨 ({mode}): {self.index.ntotal}개 벡터")
             else:
                 if self._faiss:
-                    self.index = self._faiss.IndexFlatIP(self.dimension)
+                    self.index = self._new_index()
                 print(f"사용자 {self.user_id}: 새 FAISS 인덱스 생성")
-            
-            if os.path.exists(self.chunk_ids_path):
-                with open(self.chunk_ids_path, 'r') as f:
-                    self.chunk_ids = json.load(f)
-                print(f"사용자 {self.user_id}: 청크 ID 로드됨: {len(self.chunk_ids)}개")
-            else:
-                self.chunk_ids = []
                 
         except Exception as e:
             print(f"사용자 {self.user_id}: 인덱스 로드 실패: {e}")
             if self._faiss:
-                self.index = self._faiss.IndexFlatIP(self.dimension)
-            self.chunk_ids = []
+                self.index = self._new_index()
+            self._persisted_rows = None
+        self._update_memory_bytes()
+    
+    def _read_index_files(self):
+        """manifest가 가리키는 세그먼트를 읽음 (없으면 세그먼트 이전 형식의 단일 파일)"""
+        manifest = self.segments.read_manifest()
+        if manifest is not None:
+            return self._load_segments(manifest, mmap=self.read_only)
+        
+        candidates = [path for path in (self.vectors_path, self.index_path) if os.path.exists(path)]
+        if not candidates:
+            return None
+        path = max(candidates, key=os.path.getmtime)
+        
+        if path == self.vectors_path:
+            ids, vectors = load_vectors(path, mmap=self.read_only)
+            if ids is None:
+                return self._convert_legacy_index(None, vectors)
+            if self.read_only:
+                return MmapFlatIndex([(ids, vectors)], self.dimension)
+            return build_index(self._faiss, 'flat', self.dimension, vectors, ids)
+        
+        if self.read_only:
+            # IVF 역리스트 등 FAISS가 지원하는 부분은 memory map으로 열림
+            index = self._faiss.read_index(path, self._faiss.IO_FLAG_MMAP | self._faiss.IO_FLAG_READ_ONLY)
+        else:
+            index = self._faiss.read_index(path)
+        if not isinstance(index, self._faiss.IndexIDMap):
+            return self._convert_legacy_index(index, None)
+        return index
+    
+    def _load_segments(self, manifest, mmap=False):
+        """base 세그먼트에 delta 세그먼트를 차례로 더해 인덱스 구성
+        
+        mmap=True면 Flat 세그먼트는 합치지 않고 memory map 상태로 검색하며,
+        HNSW/IVF base는 delta가 없을 때만 memory map으로 엽니다 (delta를 더하려면 메모리가 필요).
+        """
+        kind = manifest["kind"]
+        base_path = self.segments.path(manifest["base"]["file"])
+        deltas = self.segments.load_deltas(manifest, mmap=mmap)
+        
+        if kind == 'flat':
+            segments = [load_vectors(base_path, mmap=mmap)] + deltas
+            if mmap:
+                index = MmapFlatIndex(segments, self.dimension)
+            else:
+                ids = np.concatenate([np.asarray(seg_ids, dtype='int64') for seg_ids, _ in segments])
+                vectors = np.concatenate([np.asarray(seg_vectors, dtype='float32') for _, seg_vectors in segments])
+                index = build_index(self._faiss, 'flat', self.dimension, vectors, ids)
+        else:
+            if mmap and not deltas:
+                index = self._faiss.read_index(base_path, self._faiss.IO_FLAG_MMAP | self._faiss.IO_FLAG_READ_ONLY)
+            else:
+                index = self._faiss.read_index(base_path)
+            for ids, vectors in deltas:
+                if len(ids):
+                    index.add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), np.asarray(ids, dtype='int64'))
+        
+        self._persisted_rows = SegmentStore.total_rows(manifest)
+        self._persisted_kind = kind
+        self._set_tombstones(manifest.get("tombstones", []))
+        self._persisted_tombstones = frozenset(self._tombstones)
+        return index
+    
+    def _convert_legacy_index(self, index, vectors):
+        """청크 ID를 별도 JSON으로 저장하던 예전 인덱스를 ID 포함 인덱스로 변환
+        
+        예전 형식은 인덱스 추가가 실패해도 ID가 추가되어 길이가 어긋날 수 있으므로
+        두 목록 중 짧은 쪽에 맞춥니다. 변환 결과는 백그라운드에서 세그먼트로 저장합니다.
+        """
+        chunk_ids = []
+        if os.path.exists(self.chunk_ids_path):
+            with open(self.chunk_ids_path, 'r') as f:
+                chunk_ids = json.load(f)
+        
+        if index is not None:
+            kind = index_kind(self._faiss, index)
+            count = min(index.ntotal, len(chunk_ids))
+            vectors = index.reconstruct_n(0, count) if count else np.empty((0, self.dimension), dtype='float32')
+        else:
+            kind = 'flat'
+            count = min(len(vectors), len(chunk_ids))
+            vectors = np.array(vectors[:count], dtype='float32')
+        
+        converted = build_index(self._faiss, kind, self.dimension, vectors, chunk_ids[:count])
+        print(f"사용자 {self.user_id}: 예전 인덱스 형식 변환 ({kind}, {count}개 벡터, ID {len(chunk_ids)}개)")
+        
+        # 변환 결과는 메모리에 있으므로 write-behind로 새 형식 저장
+        self.read_only = False
+        self._persisted_rows = None
+        index_flusher.mark_dirty(self)
+        return converted
+    
+    def _ensure_writable_locked(self):
+        """업로드 전에 읽기 전용(mmap) 인덱스를 쓰기 가능한 메모리 인덱스로 전환 (락 내부에서 호출)
+        
+        행 순서는 그대로이므로 디스크에 기록된 행 수(_persisted_rows)는 유지됩니다.
+        """
+        if not self.read_only:
+            return
+        self.read_only = False
+        if self._faiss is None:
+            return
+        if isinstance(self.index, MmapFlatIndex):
+            ids, vectors = export_vectors(self._faiss, self.index)
+            self.index = build_index(self._faiss, 'flat', self.dimension, vectors, ids)
+        elif self.index is not None:
+            persisted_rows = self._persisted_rows
+            reloaded = self._read_index_files()
+            if reloaded is not None:
+                self.index = reloaded
+            self._persisted_rows = persisted_rows
+        print(f"사용자 {self.user_id}: 읽기 전용 인덱스를 쓰기 가능 모드로 전환 ({self.index.ntotal if self.index is not None else 0}개)")
     
     def save_index(self):
-        """FAISS 인덱스 저장 (CloudType 환경 대응)"""
+        """FAISS 인덱스 저장 (CloudType 환경 대응)
+        
+        마지막 저장 이후 추가된 행만 delta 세그먼트로 추가하고,
+        인덱스가 통째로 바뀐 경우(종류 전환, DB 재구성)에만 base 전체를 다시 기록합니다.
+        """
+        with self._persist_lock:
+            self._save_segments()
+    
+    async def save_index_async(self):
+        """임베딩 실행기에서 인덱스 저장 (이벤트 루프 차단 방지)"""
+        await embedding_executor.run(self.save_index)
+    
+    def _save_segments(self):
+        """세그먼트 저장 (저장 락 내부에서 호출, 인덱스 락은 스냅샷 동안만 보유)
+        
+        기록 실패는 호출자(index_flusher)에게 전달되어 실패 횟수에 집계되고 다음 주기에 다시 시도합니다.
+        """
         if self.index is None:
             print("저장할 인덱스가 없습니다.")
             return
-            
+        if self.read_only:
+            # 읽기 전용으로 연 인덱스는 변경이 없으므로 다시 쓸 필요 없음
+            return
+        
         self._load_faiss()  # FAISS 모듈 로드
+        if self._faiss is None:
+            return
         
-        # CloudType 환경 감지
-        import os
-        IS_CLOUDTYPE = os.environ.get('CLOUDTYPE_DEPLOYMENT', '0') == '1'
+        manifest = None
+        ids = ()
+        with self._index_lock:
+            index = self.index
+            generation = self._generation
+            kind = self.get_index_kind()
+            total = index.ntotal
+            tombstones = frozenset(self._tombstones)
+            # manifest가 없으면(사용자 파일 정리 등) 이어 쓸 세그먼트가 없으므로 base 전체를 기록
+            full = (self._persisted_rows is None or kind != self._persisted_kind
+                    or total < self._persisted_rows or not self.segments.exists())
+            if not full and total == self._persisted_rows:
+                if tombstones == self._persisted_tombstones:
+                    return
+                # 새 행 없이 삭제 표시만 바뀜
+                manifest = self.segments.set_tombstones(sorted(tombstones))
+            elif not full:
+                ids, vectors = export_vectors(self._faiss, index, self._persisted_rows)
+            elif kind == 'flat':
+                ids, vectors = export_vectors(self._faiss, index)
+            else:
+                # FAISS 직렬화는 인덱스 전체를 읽으므로 락 안에서 기록
+                manifest = self.segments.write_base_index(self._faiss, index, kind, sorted(tombstones))
         
-        if IS_CLOUDTYPE:
-            # CloudType 환경: 임시 디렉토리 사용
-            print(f"사용자 {self.user_id}: CloudType 환경 감지, 임시 디렉토리 사용")
-            try:
-                import tempfile
-                # 임시 디렉토리에서 FAISS 인덱스 저장
-                temp_dir = tempfile.gettempdir()
-                temp_index_path = os.path.join(temp_dir, f"faiss_{self.user_id}.index")
-                temp_chunk_ids_path = os.path.join(temp_dir, f"faiss_{self.user_id}_chunks.pkl")
-                
-                if self._faiss and self.index is not None:
-                    self._faiss.write_index(self.index, temp_index_path)
-                    print(f"사용자 {self.user_id}: FAISS 인덱스를 임시 디렉토리에 저장됨: {temp_index_path}")
-                
-                # 청크 ID 저장
-                with open(temp_chunk_ids_path, 'w') as f:
-                    json.dump(self.chunk_ids, f)
-                print(f"사용자 {self.user_id}: 청크 ID 저장 완료: {temp_chunk_ids_path}")
-                
-                # 임시 경로를 실제 경로로 업데이트
-                self.index_path = temp_index_path
-                self.chunk_ids_path = temp_chunk_ids_path
-                
-            except Exception as e:
-                print(f"사용자 {self.user_id}: CloudType 환경 FAISS 저장 실패: {e}")
-                print(f"사용자 {self.user_id}: FAISS 저장 실패하지만 데이터베이스에는 임베딩이 저장됨")
-        else:
-            # 로컬 환경: 기존 방식 사용
+        if manifest is None:
+            if full:
+                manifest = self.segments.write_base_vectors(ids, vectors, sorted(tombstones))
+            else:
+                manifest = self.segments.append_delta(ids, vectors, sorted(tombstones))
+        
+        with self._index_lock:
+            # 기록하는 동안 인덱스가 교체되었거나 제자리 삭제로 행이 당겨졌다면
+            # 다음 저장 때 base 전체를 다시 기록 (추가만 있었다면 total 뒤에 붙었으므로 유효)
+            if self.index is index and self._shifted_generation <= generation:
+                self._persisted_rows = total
+                self._persisted_kind = kind
+                self._persisted_tombstones = tombstones
+        
+        # 세그먼트 이전 형식의 파일 제거 (로드 시 혼동 방지)
+        for stale_path in (self.index_path, self.vectors_path, self.chunk_ids_path):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        
+        mode = "base 전체" if full else f"delta {len(ids)}개"
+        print(f"사용자 {self.user_id}: 인덱스 저장 완료 ({kind}, {total}개, {mode}, "
+              f"delta 세그먼트 {len(manifest['deltas'])}개)")
+        self._maybe_schedule_compaction(manifest)
+    
+    def _maybe_schedule_compaction(self, manifest):
+        """delta 세그먼트 수나 크기가 임계값을 넘으면 백그라운드 병합 예약"""
+        deltas = len(manifest["deltas"])
+        delta_rows = SegmentStore.delta_rows(manifest)
+        if deltas == 0:
+            return
+        if deltas < SEGMENT_MAX_DELTAS and delta_rows < manifest["base"]["rows"] * SEGMENT_COMPACT_RATIO:
+            return
+        if self._compaction_future is not None and not self._compaction_future.done():
+            return
+        self._compaction_future = embedding_executor.submit(self.compact_segments)
+    
+    def compact_segments(self):
+        """base와 delta 세그먼트를 하나의 base로 병합
+        
+        Flat은 디스크의 세그먼트 파일만 읽어 병합하므로 검색과 업로드를 막지 않습니다.
+        HNSW/IVF는 delta를 이미 반영한 메모리 인덱스를 새 base로 기록합니다.
+        """
+        start = time.perf_counter()
+        with self._persist_lock:
             try:
-                import fcntl
-                import tempfile
-                
-                # 임시 파일로 저장 후 원자적 이동 (동시성 문제 해결)
-                temp_index_path = self.index_path + ".tmp"
-                temp_chunk_ids_path = self.chunk_ids_path + ".tmp"
-                
-                # FAISS 인덱스 저장
-                if self._faiss and self.index is not None:
-                    self._faiss.write_index(self.index, temp_index_path)
+                manifest = self.segments.read_manifest()
+                if manifest is None or not manifest["deltas"]:
+                    return None
+                before = len(manifest["deltas"])
                 
-                # 청크 ID 저장
-                with open(temp_chunk_ids_path, 'w') as f:
-                    json.dump(self.chunk_ids, f)
+                if manifest["kind"] == 'flat':
+                    manifest = self.segments.compact_flat(manifest)
+                else:
+                    with self._index_lock:
+                        if (self.read_only or self.index is None
+                                or self.get_index_kind() != manifest["kind"]
+                                or self.index.ntotal < SegmentStore.total_rows(manifest)):
+                            # 메모리 인덱스가 디스크 내용을 모두 담고 있지 않으면 다음 저장 때 처리
+                            return None
+                        tombstones = frozenset(self._tombstones)
+                        manifest = self.segments.write_base_index(self._faiss, self.index, manifest["kind"],
+                                                                  sorted(tombstones))
+                        self._persisted_rows = self.index.ntotal
+                        self._persisted_kind = manifest["kind"]
+                        self._persisted_tombstones = tombstones
                 
-                # 원자적으로 파일 이동 (다른 프로세스에서 읽는 도중 덮어쓰기 방지)
-                try:
-                    os.rename(temp_index_path, self.index_path)
-                    os.rename(temp_chunk_ids_path, self.chunk_ids_path)
-                    print(f"사용자 {self.user_id}: FAISS 인덱스 저장 완료")
-                except OSError as rename_err:
-                    print(f"사용자 {self.user_id}: 파일 이동 실패: {rename_err}")
-                    # 임시 파일 정리
-                    if os.path.exists(temp_index_path):
-                        os.remove(temp_index_path)
-                    if os.path.exists(temp_chunk_ids_path):
-                        os.remove(temp_chunk_ids_path)
-                    raise
-                    
-            except ImportError:
-                # fcntl이 없는 환경 (Windows 등)에서는 기본 저장 방식 사용
-                try:
-                    if self._faiss and self.index is not None:
-                        self._faiss.write_index(self.index, self.index_path)
-                    with open(self.chunk_ids_path, 'w') as f:
-                        json.dump(self.chunk_ids, f)
-                    print(f"사용자 {self.user_id}: FAISS 인덱스 저장 완료 (기본 방식)")
-                except Exception as basic_err:
-                    print(f"사용자 {self.user_id}: 기본 저장 방식 실패: {basic_err}")
+                seconds = time.perf_counter() - start
+                self.last_compaction = {
+                    "kind": manifest["kind"],
+                    "merged_deltas": before,
+                    "rows": manifest["base"]["rows"],
+                    "seconds": round(seconds, 3)
+                }
+                print(f"사용자 {self.user_id}: 세그먼트 병합 완료 (delta {before}개 -> base "
+                      f"{manifest['base']['rows']}개, {seconds:.2f}초)")
+                return self.last_compaction
             except Exception as e:
-                print(f"사용자 {self.user_id}: 인덱스 저장 실패: {e}")
+                print(f"사용자 {self.user_id}: 세그먼트 병합 실패: {e}")
+                return None
     
     def create_embedding(self, text):
         """텍스트를 임베딩으로 변환"""
@@ -191,21 +577,8 @@ class UserEmbeddingService:
             self._load_model()  # 임베딩 모델 로드
             self._load_faiss()  # FAISS 모듈 로드
             
-            # 모델이 로드되지 않았다면 대체 임베딩 사용
-            if self._model is None:
-                print("모델 로드 실패, 대체 임베딩 사용")
-                dummy_embedder = DummyEmbedder()
-                embedding = dummy_embedder.encode([text])
-                return embedding[0]
-            
-            embedding = self._model.encode([text])
-            # L2 정규화 (코사인 유사도를 위해)
-            if self._faiss:
-                try:
-                    self._faiss.normalize_L2(embedding.astype('float32'))
-                except Exception as norm_err:
-                    print(f"L2 정규화 실패: {norm_err}")
-            return embedding[0]
+            # 인코딩과 L2 정규화 (코사인 유사도를 위해)
+            return encode_texts([text], batch_size=1)[0]
         except Exception as e:
             print(f"임베딩 생성 실패: {e}")
             import traceback
@@ -215,8 +588,15 @@ class UserEmbeddingService:
             print("오류 발생, 대체 임베딩 사용")
             return np.random.rand(self.dimension).astype('float32')
     
+    async def create_embedding_async(self, text):
+        """임베딩 실행기에서 텍스트 임베딩 생성"""
+        return await embedding_executor.run(self.create_embedding, text)
+    
     def add_to_index(self, chunk_id, text):
         """FAISS 인덱스에 텍스트 추가"""
+        if self._uses_memory_keywords():
+            self.keyword_index.add_many([(chunk_id, text)])
+        self._bump_version()
         try:
             self._load_faiss()  # FAISS 모듈 로드
             
@@ -227,9 +607,6 @@ class UserEmbeddingService:
                     # 임베딩만 생성 (인덱스에는 추가하지 않음)
                     embedding = self.create_embedding(text)
                     print(f"인덱스 없이 임베딩만 생성: chunk_id={chunk_id}")
-                    
-                    # 청크 ID 추가 (인덱스 없이)
-                    self.chunk_ids.append(chunk_id)
                     return embedding.tolist()
                 except Exception as embed_err:
                     print(f"대체 임베딩 생성 실패: {embed_err}")
@@ -239,13 +616,20 @@ class UserEmbeddingService:
             embedding = self.create_embedding(text)
             
             # FAISS 인덱스에 추가
-            if self.index is None:
-                print("인덱스 초기화 중...")
-                self.index = self._faiss.IndexFlatIP(self.dimension)
-            
-            try:    
-                self.index.add(embedding.reshape(1, -1).astype('float32'))
-                self.chunk_ids.append(chunk_id)
+            try:
+                with self._index_lock:
+                    self._ensure_writable_locked()
+                    if self.index is None:
+                        print("인덱스 초기화 중...")
+                        self.index = self._new_index()
+                    self.index.add_with_ids(
+                        embedding.reshape(1, -1).astype('float32'),
+                        np.array([chunk_id], dtype='int64')
+                    )
+                    self._generation += 1
+                index_flusher.mark_dirty(self)
+                self._bump_version()
+                self._maybe_schedule_migration()
                 
                 print(f"인덱스에 추가됨: chunk_id={chunk_id}")
                 return embedding.tolist()
@@ -254,8 +638,7 @@ class UserEmbeddingService:
                 import traceback
                 print(traceback.format_exc())
                 
-                # 인덱스 추가 실패해도 임베딩은 반환
-                self.chunk_ids.append(chunk_id)
+                # 인덱스 추가 실패해도 임베딩은 반환 (DB 임베딩으로 나중에 재구성)
                 return embedding.tolist()
                 
         except Exception as e:
@@ -264,61 +647,525 @@ class UserEmbeddingService:
             print(traceback.format_exc())
             return None
     
-    async def search_similar(self, query, k=5):
-        """유사한 문서 청크 검색 (사용자별 격리)"""
+    def add_many(self, chunk_ids, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """여러 청크를 배치로 임베딩하여 FAISS 인덱스에 한 번에 추가
+        
+        반환값은 chunk_ids 순서와 같은 임베딩 벡터 리스트 (실패 시 None 항목)
+        """
+        if len(chunk_ids) != len(texts):
+            raise ValueError(f"chunk_ids({len(chunk_ids)})와 texts({len(texts)}) 길이가 다릅니다")
+        if not chunk_ids:
+            return []
+        
+        start = time.perf_counter()
+        # 임베딩 실패와 관계없이 키워드 검색에는 바로 반영 (DB 전문 검색은 트리거로 반영)
+        if self._uses_memory_keywords():
+            self.keyword_index.add_many(zip(chunk_ids, texts))
+        self._bump_version()
         try:
+            self._load_model()  # 임베딩 모델 로드
             self._load_faiss()  # FAISS 모듈 로드
+            embeddings = encode_texts(list(texts), batch_size=batch_size)
+        except Exception as e:
+            print(f"사용자 {self.user_id}: 배치 임베딩 생성 실패: {e}")
+            import traceback
+            print(traceback.format_exc())
+            return [None] * len(chunk_ids)
+        
+        if self._faiss is None:
+            print(f"사용자 {self.user_id}: FAISS 모듈을 로드할 수 없음, 임베딩만 생성 ({len(chunk_ids)}개)")
+        else:
+            try:
+                with self._index_lock:
+                    self._ensure_writable_locked()
+                    if self.index is None:
+                        print("인덱스 초기화 중...")
+                        self.index = self._new_index()
+                    # 전체 행렬을 청크 ID와 함께 한 번의 호출로 추가
+                    self.index.add_with_ids(embeddings, np.asarray(chunk_ids, dtype='int64'))
+                    self._generation += 1
+                index_flusher.mark_dirty(self)
+                self._bump_version()
+                self._maybe_schedule_migration()
+            except Exception as idx_err:
+                print(f"사용자 {self.user_id}: 배치 인덱스 추가 중 오류: {idx_err}")
+                import traceback
+                print(traceback.format_exc())
+        
+        elapsed = time.perf_counter() - start
+        self.ingested_chunks += len(chunk_ids)
+        self.ingest_seconds += elapsed
+        rate = len(chunk_ids) / elapsed if elapsed > 0 else 0.0
+        print(f"사용자 {self.user_id}: {len(chunk_ids)}개 청크 배치 임베딩 완료 "
+              f"({elapsed:.2f}초, {rate:.1f} chunks/sec, 배치 크기 {batch_size})")
+        
+        return list(embeddings)
+    
+    async def add_many_async(self, chunk_ids, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """임베딩 실행기에서 배치 임베딩 및 인덱스 추가 실행"""
+        return await embedding_executor.run(self.add_many, chunk_ids, texts, batch_size)
+    
+    def _search_index(self, query_embedding, k, ef_search=None, nprobe=None):
+        """FAISS 검색 (임베딩 워커에서 실행, efSearch/nprobe는 요청별로 적용)"""
+        with self._index_lock:
+            params = search_params(self._faiss, self.index, ef_search=ef_search, nprobe=nprobe,
+                                   exclude_ids=self._tombstone_array)
+            return self.index.search(
+                query_embedding.reshape(1, -1).astype('float32'),
+                max(1, min(k, self.live_count())),
+                params=params
+            )
+    
+    def _bump_version(self):
+        """인덱스 내용이 바뀐 뒤 호출 - 이전 버전으로 캐시된 검색 결과는 더 이상 조회되지 않음
+        
+        벡터 수나 인덱스 종류가 바뀌었을 수 있으므로 메모리 추정치도 함께 갱신합니다.
+        """
+        self.index_version = next(_index_versions)
+        self._update_memory_bytes()
+    
+    def live_count(self):
+        """삭제 표시된 벡터를 뺀 검색 가능한 벡터 수"""
+        if self.index is None:
+            return 0
+        return self.index.ntotal - len(self._tombstones)
+    
+    def _set_tombstones(self, tombstones):
+        """삭제 표시 목록 교체 (인덱스 락 내부에서 호출)"""
+        self._tombstones = set(int(chunk_id) for chunk_id in tombstones)
+        self._tombstone_array = np.array(sorted(self._tombstones), dtype='int64') if self._tombstones else None
+    
+    def remove_chunks(self, chunk_ids):
+        """청크 벡터 삭제 (문서 삭제 시 호출)
+        
+        Flat 인덱스는 제자리에서 바로 제거하고, 제자리 삭제가 불가능한 HNSW/IVF(IndexIDMap2)나
+        종류 전환 중인 인덱스는 삭제 표시(tombstone)만 남겨 검색에서 제외합니다.
+        삭제 표시 비율이 INDEX_TOMBSTONE_RATIO를 넘으면 백그라운드에서 인덱스를 재구성합니다.
+        """
+        ids = np.array(sorted({int(chunk_id) for chunk_id in chunk_ids}), dtype='int64')
+        chunk_cache.discard(self.user_id, ids.tolist())
+        self.keyword_index.remove(ids.tolist())
+        if not self._keyword_loaded:
+            self._keyword_removed.update(ids.tolist())
+        if not len(ids):
+            return 0
+        
+        self._load_faiss()  # FAISS 모듈 로드
+        if self._faiss is None or self.index is None:
+            return 0
+        
+        with self._index_lock:
+            self._ensure_writable_locked()
+            migrating = self._migration_future is not None and not self._migration_future.done()
+            if self.get_index_kind() == 'flat' and not migrating:
+                removed = int(self.index.remove_ids(self._faiss.IDSelectorBatch(ids)))
+                if removed:
+                    # 뒤쪽 행이 당겨졌으므로 다음 저장 때 base 전체를 다시 기록
+                    # (진행 중인 저장도 끝날 때 기록한 행 수를 남기지 않음)
+                    self._generation += 1
+                    self._shifted_generation = self._generation
+                    self._persisted_rows = None
+            else:
+                present = ids[np.isin(ids, self._faiss.vector_to_array(self.index.id_map))]
+                before = len(self._tombstones)
+                self._set_tombstones(self._tombstones | set(present.tolist()))
+                removed = len(self._tombstones) - before
+                self._generation += 1
+        
+        self._bump_version()
+        if removed:
+            self.removed_chunks += removed
+            index_flusher.mark_dirty(self)
+            self._maybe_schedule_migration()
+        print(f"사용자 {self.user_id}: 벡터 {removed}개 삭제 ({self.get_index_kind()}, "
+              f"삭제 표시 {len(self._tombstones)}개)")
+        return removed
+    
+    async def remove_chunks_async(self, chunk_ids):
+        """임베딩 실행기에서 청크 벡터 삭제"""
+        return await embedding_executor.run(self.remove_chunks, chunk_ids)
+    
+    def delete_files(self):
+        """디스크의 인덱스 파일 전체 삭제 (사용자 데이터 정리용)"""
+        with self._persist_lock:
+            removed = self.segments.delete_all()
+            for path in (self.index_path, self.vectors_path, self.chunk_ids_path):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+        return removed
+    
+    def get_index_kind(self):
+        """현재 인덱스 종류 ('flat', 'hnsw', 'ivf')"""
+        if self._faiss is None or self.index is None:
+            return 'flat'
+        return index_kind(self._faiss, self.index)
+    
+    def _maybe_schedule_migration(self):
+        """벡터 수가 임계값을 넘거나 삭제 표시가 많아지면 인덱스 재구성을 백그라운드로 예약"""
+        if self._faiss is None or self.index is None:
+            return
+        target = choose_index_kind(self.live_count())
+        tombstone_ratio = len(self._tombstones) / self.index.ntotal if self.index.ntotal else 0.0
+        if target == self.get_index_kind() and (not self._tombstones or tombstone_ratio < INDEX_TOMBSTONE_RATIO):
+            return
+        if self._migration_future is not None and not self._migration_future.done():
+            return
+        print(f"사용자 {self.user_id}: 인덱스 재구성 예약 {self.get_index_kind()} -> {target} "
+              f"({self.index.ntotal}개, 삭제 표시 {len(self._tombstones)}개)")
+        self._migration_future = embedding_executor.submit(self._migrate_index, target)
+    
+    def _migrate_index(self, target):
+        """새 인덱스를 락 밖에서 만든 뒤 교체 (검색과 업로드는 기존 인덱스로 계속 처리)
+        
+        종류 전환과 삭제 표시 정리를 함께 처리하며, 삭제 표시된 벡터는 새 인덱스에 넣지 않습니다.
+        """
+        start = time.perf_counter()
+        source_kind = self.get_index_kind()
+        try:
+            with self._index_lock:
+                source_index = self.index
+                snapshot_count = source_index.ntotal
+                applied = frozenset(self._tombstones)
+                ids, vectors = export_vectors(self._faiss, source_index)
             
-            # FAISS 모듈을 로드할 수 없거나 인덱스가 비어있는 경우
-            if self._faiss is None or self.index is None or self.index.ntotal == 0:
-                print(f"사용자 {self.user_id}: FAISS 인덱스가 없거나 비어있음, 대체 검색 로직 사용")
-                # 대체 검색 로직 (간단한 키워드 매칭)
-                return await self._fallback_search(query, k)
+            if applied:
+                keep = ~np.isin(ids, np.fromiter(applied, dtype='int64', count=len(applied)))
+                ids, vectors = ids[keep], vectors[keep]
+            new_index = build_index(self._faiss, target, self.dimension, vectors, ids)
+            
+            with self._index_lock:
+                if self.index is not source_index:
+                    # 구축 중에 인덱스가 통째로 교체됨 (DB 재구성 등) - 이번 전환은 버림
+                    print(f"사용자 {self.user_id}: 전환 중 인덱스가 교체되어 전환 취소")
+                    return
+                # 학습/구축 중에 추가된 벡터 반영 후 교체
+                tail_ids, tail = export_vectors(self._faiss, self.index, snapshot_count)
+                if len(tail):
+                    new_index.add_with_ids(tail, tail_ids)
+                self.index = new_index
+                # 구축 중에 새로 삭제 표시된 ID만 남김 (적용된 것은 새 인덱스에 없음)
+                self._set_tombstones(self._tombstones - applied)
+                # 종류가 바뀌었으므로 다음 저장 때 base 전체를 다시 기록
+                self._persisted_rows = None
+            index_flusher.mark_dirty(self)
+            # ANN 종류가 바뀌면 근사 검색 결과도 달라질 수 있음
+            self._bump_version()
+            
+            seconds = time.perf_counter() - start
+            self.last_migration = {
+                "from": source_kind,
+                "to": target,
+                "vectors": new_index.ntotal,
+                "dropped_tombstones": len(applied),
+                "seconds": round(seconds, 3)
+            }
+            print(f"사용자 {self.user_id}: 인덱스 전환 완료 {source_kind} -> {target} "
+                  f"({new_index.ntotal}개, {seconds:.2f}초)")
+        except Exception as e:
+            print(f"사용자 {self.user_id}: 인덱스 전환 실패 ({source_kind} -> {target}): {e}")
+            import traceback
+            print(traceback.format_exc())
+    
+    async def ensure_index_fresh(self):
+        """인덱스 파일이 없거나 DB와 어긋나면 저장된 임베딩으로 재구성 (서비스당 한 번 확인)
+        
+        벡터 수만 같고 다른 청크를 담은 경우(삭제 반영 누락 + 새 업로드 등)도 잡도록
+        청크 ID의 (개수, 최댓값, 합계)를 DB와 비교하며, DB에 임베딩이 없는데 인덱스에 벡터가 남아 있어도 재구성합니다.
+        동시에 들어온 첫 검색들은 락에서 확인/재구성이 끝나기를 기다리며,
+        수 조회나 재구성이 실패하면 확인하지 않은 상태로 남겨 다음 요청에서 다시 시도합니다.
+        """
+        if self._freshness_checked:
+            return
+        async with self._freshness_lock:
+            if self._freshness_checked:
+                return
+            
+            await embedding_executor.run(self._load_faiss)
+            if self._faiss is None:
+                self._freshness_checked = True
+                return
             
-            # 쿼리 임베딩 생성
             try:
-                query_embedding = self.create_embedding(query)
-            except Exception as embed_err:
-                print(f"사용자 {self.user_id}: 쿼리 임베딩 생성 실패: {embed_err}")
-                return await self._fallback_search(query, k)
+                async with async_session() as session:
+                    stmt = select(
+                        func.count(DocumentChunk.id), func.max(DocumentChunk.id), func.sum(DocumentChunk.id)
+                    ).where(
+                        DocumentChunk.user_id == self.user_id,
+                        DocumentChunk.embedding_vec.isnot(None)
+                    )
+                    count, max_id, id_sum = (await session.execute(stmt)).one()
+                    stored = (int(count or 0), int(max_id or 0), int(id_sum or 0))
+            except Exception as e:
+                print(f"사용자 {self.user_id}: 저장된 임베딩 수 조회 실패, 웜 스타트 건너뜀 (다음 요청에서 재시도): {e}")
+                return
             
-            # FAISS에서 검색
+            indexed = await embedding_executor.run(self._id_fingerprint)
+            if indexed != stored:
+                print(f"사용자 {self.user_id}: 인덱스가 없거나 오래됨 (인덱스 {indexed[0]}개, DB {stored[0]}개, "
+                      f"최대 ID {indexed[1]}/{stored[1]}), 저장된 임베딩으로 재구성")
+                await self.rebuild_index_from_db()
+            self._freshness_checked = True
+    
+    def _id_fingerprint(self):
+        """삭제 표시를 뺀 인덱스 청크 ID의 (개수, 최댓값, 합계) - DB 집계와 비교용"""
+        with self._index_lock:
+            if self.index is None or self.index.ntotal == 0:
+                return (0, 0, 0)
+            ids = index_ids(self._faiss, self.index)
+            if self._tombstone_array is not None:
+                ids = ids[~np.isin(ids, self._tombstone_array)]
+        if not len(ids):
+            return (0, 0, 0)
+        return (len(ids), int(ids.max()), int(ids.sum()))
+    
+    async def rebuild_index_from_db(self, batch_size=INDEX_REBUILD_BATCH_SIZE):
+        """DB에 저장된 임베딩을 스트리밍으로 읽어 인덱스 재구성 (모델 호출 없음)"""
+        await embedding_executor.run(self._load_faiss)
+        if self._faiss is None:
+            print(f"사용자 {self.user_id}: FAISS 모듈이 없어 인덱스를 재구성할 수 없음")
+            return None
+        
+        start = time.perf_counter()
+        new_index = self._new_index()
+        new_ids = []
+        
+        def snapshot_ids():
+            with self._index_lock:
+                if self.index is None:
+                    return np.empty(0, dtype='int64')
+                return index_ids(self._faiss, self.index)
+        # 재구성 시작 시점의 ID (이후 DB 스트림에 없으면 삭제된 청크이므로 옮기지 않음)
+        previous_ids = await embedding_executor.run(snapshot_ids)
+        
+        async with async_session() as session:
+            stmt = select(DocumentChunk.id, DocumentChunk.embedding_vec).where(
+                DocumentChunk.user_id == self.user_id,
+                DocumentChunk.embedding_vec.isnot(None)
+            ).order_by(DocumentChunk.id).execution_options(yield_per=batch_size)
+            result = await session.stream(stmt)
+            async for rows in result.partitions(batch_size):
+                blobs = [row.embedding_vec for row in rows]
+                matrix = await embedding_executor.run(decode_matrix, blobs, self.dimension)
+                ids = np.array([row.id for row in rows], dtype='int64')
+                await embedding_executor.run(new_index.add_with_ids, matrix, ids)
+                new_ids.extend(ids.tolist())
+        
+        def swap():
+            with self._index_lock:
+                # 재구성 도중 업로드로 추가된 벡터는 기존 인덱스에서 옮겨 옴
+                # (삭제 표시된 벡터는 제외)
+                known = np.asarray(new_ids, dtype='int64')
+                if self.index is not None and self.index.ntotal:
+                    ids, vectors = export_vectors(self._faiss, self.index)
+                    missing = ~np.isin(ids, known) & ~np.isin(ids, previous_ids)
+                    if self._tombstone_array is not None:
+                        missing &= ~np.isin(ids, self._tombstone_array)
+                    if missing.any():
+                        new_index.add_with_ids(vectors[missing], ids[missing])
+                        new_ids.extend(ids[missing].tolist())
+                # 재구성 도중 삭제된 청크가 DB 스트림에 포함되었을 수 있으므로 해당 표시만 유지
+                if self._tombstone_array is not None:
+                    self._set_tombstones(self._tombstone_array[np.isin(self._tombstone_array, known)].tolist())
+                self.index = new_index
+                self._persisted_rows = None
+                # 재구성된 인덱스는 메모리에 있으므로 저장 가능해야 함
+                self.read_only = False
+        await embedding_executor.run(swap)
+        index_flusher.mark_dirty(self)
+        self._bump_version()
+        # 코퍼스가 크면 ANN 인덱스로 전환
+        self._maybe_schedule_migration()
+        
+        seconds = time.perf_counter() - start
+        self.last_rebuild = {
+            "vectors": len(new_ids),
+            "seconds": round(seconds, 3),
+            "vectors_per_sec": round(len(new_ids) / seconds, 1) if seconds > 0 else 0.0
+        }
+        print(f"사용자 {self.user_id}: DB 임베딩으로 인덱스 재구성 완료 "
+              f"({len(new_ids)}개, {seconds:.2f}초)")
+        return self.last_rebuild
+    
+    def memory_bytes(self):
+        """인덱스 메모리 사용량 추정치 (캐시된 값 - 요청마다 호출되므로 디스크를 읽지 않음)"""
+        if self._memory_bytes is None:
+            self._update_memory_bytes()
+        return self._memory_bytes
+    
+    def _update_memory_bytes(self):
+        """메모리 추정치 다시 계산 (아직 로드 전이면 manifest의 행 수로 추정, 키워드 역색인 포함)
+        
+        인덱스나 키워드 색인이 바뀌는 곳(로드, 추가, 삭제, 종류 전환, 재구성)에서 호출합니다.
+        """
+        keyword_bytes = self.keyword_index.memory_bytes()
+        if self.index is not None:
+            size = estimate_index_bytes(self.get_index_kind(), self.index.ntotal, self.dimension) + keyword_bytes
+        else:
             try:
-                scores, indices = self.index.search(
-                    query_embedding.reshape(1, -1).astype('float32'), 
-                    min(k, self.index.ntotal)
+                manifest = self.segments.read_manifest()
+            except Exception:
+                manifest = None
+            if manifest is None:
+                size = keyword_bytes
+            else:
+                size = estimate_index_bytes(manifest["kind"], SegmentStore.total_rows(manifest),
+                                            self.dimension) + keyword_bytes
+        self._memory_bytes = size
+        return size
+    
+    async def ensure_keyword_index(self, batch_size=INDEX_REBUILD_BATCH_SIZE):
+        """키워드 역색인이 비어 있으면 DB의 청크 텍스트를 스트리밍으로 읽어 채움 (서비스당 한 번)"""
+        if self._keyword_loaded:
+            return
+        async with self._keyword_load_lock:
+            if self._keyword_loaded:
+                return
+            start = time.perf_counter()
+            async with async_session() as session:
+                stmt = select(DocumentChunk.id, DocumentChunk.chunk_text).where(
+                    DocumentChunk.user_id == self.user_id
+                ).order_by(DocumentChunk.id).execution_options(yield_per=batch_size)
+                result = await session.stream(stmt)
+                async for rows in result.partitions(batch_size):
+                    await embedding_executor.run(
+                        self.keyword_index.add_many, [(row.id, row.chunk_text) for row in rows]
+                    )
+            self._keyword_loaded = True
+            # 스트림이 삭제 전에 읽었을 수 있는 청크 다시 제거
+            self.keyword_index.remove(self._keyword_removed)
+            self._keyword_removed.clear()
+            await embedding_executor.run(self._update_memory_bytes)
+            
+            seconds = time.perf_counter() - start
+            self.last_keyword_build = {
+                "chunks": len(self.keyword_index),
+                "seconds": round(seconds, 3)
+            }
+            print(f"사용자 {self.user_id}: 키워드 역색인 구성 완료 "
+                  f"({len(self.keyword_index)}개 청크, {seconds:.2f}초)")
+    
+    def get_ingest_stats(self):
+        """누적 배치 임베딩 처리량 반환"""
+        return {
+            "ingested_chunks": self.ingested_chunks,
+            "ingest_seconds": round(self.ingest_seconds, 3),
+            "chunks_per_sec": round(self.ingested_chunks / self.ingest_seconds, 2) if self.ingest_seconds > 0 else 0.0
+        }
+    
+    async def fetch_chunks(self, chunk_ids):
+        """청크 ID 목록을 {chunk_id: (chunk_text, document_id)}로 조회
+        
+        프로세스 내 청크 캐시를 먼저 확인하고, 나머지는 필요한 컬럼만 한 번의 IN 쿼리로 읽습니다.
+        다른 사용자의 청크는 조회되지 않습니다.
+        """
+        if not chunk_ids:
+            return {}
+        found = chunk_cache.get_many(self.user_id, chunk_ids)
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+        if missing:
+            async with async_session() as session:
+                stmt = select(DocumentChunk.id, DocumentChunk.chunk_text, DocumentChunk.document_id).where(
+                    DocumentChunk.id.in_(missing),
+                    DocumentChunk.user_id == self.user_id  # 사용자별 필터링
+                )
+                rows = (await session.execute(stmt)).all()
+            chunk_cache.put_many(self.user_id, rows)
+            for chunk_id, chunk_text, document_id in rows:
+                found[chunk_id] = (chunk_text, document_id)
+        return found
+    
+    async def search_similar(self, query, k=5, ef_search=None, nprobe=None, mode=None,
+                             fusion=None, rrf_k=None, keyword_weight=None, candidates=None):
+        """유사한 문서 청크 검색 (사용자별 격리)
+        
+        ef_search(HNSW)와 nprobe(IVF)로 요청별 정확도/지연 시간을 조절할 수 있습니다.
+        mode는 dense(FAISS), keyword(BM25), hybrid(둘을 동시에 실행 후 fusion으로 결합) 중 하나이며,
+        hybrid는 rrf_k, keyword_weight, candidates(검색기별 후보 수)를 요청별로 바꿀 수 있습니다.
+        """
+        mode = (mode or SEARCH_MODE).lower()
+        fusion = (fusion or HYBRID_FUSION).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"지원하지 않는 검색 방식: {mode} ({', '.join(SEARCH_MODES)})")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"지원하지 않는 결합 방식: {fusion} ({', '.join(FUSION_METHODS)})")
+        keyword_weight = HYBRID_KEYWORD_WEIGHT if keyword_weight is None else min(max(keyword_weight, 0.0), 1.0)
+        
+        # 같은 쿼리 반복(/search 후 /chat 등)은 인덱스가 바뀌지 않았다면 캐시에서 반환
+        start = time.perf_counter()
+        version = self.index_version
+        cache_key = (normalize_query(query), mode, fusion, rrf_k, keyword_weight, candidates,
+                     ef_search, nprobe, version)
+        cached = search_cache.get(self.user_id, cache_key, k)
+        if cached is not None:
+            search_latency.record('cached', {'total': time.perf_counter() - start})
+            return cached
+        
+        results = await self._search_uncached(query, k, ef_search, nprobe, mode, fusion,
+                                              rrf_k, keyword_weight, candidates)
+        search_cache.put(self.user_id, cache_key, k, results)
+        return results
+    
+    async def _search_uncached(self, query, k, ef_search, nprobe, mode, fusion, rrf_k, keyword_weight, candidates):
+        """캐시를 거치지 않는 검색 본체 (단계별 지연 시간 기록)"""
+        start = time.perf_counter()
+        timings = {}
+        try:
+            if mode == 'keyword':
+                return await self._fallback_search(query, k, timings)
+            
+            # FAISS 모듈 및 인덱스 파일 로드 (파일 I/O는 임베딩 워커에서)
+            await embedding_executor.run(self._load_faiss)
+            # 재시작 등으로 인덱스가 없으면 DB 임베딩으로 웜 스타트
+            await self.ensure_index_fresh()
+            
+            # FAISS 모듈을 로드할 수 없거나 인덱스가 비어있는 경우
+            if self._faiss is None or self.index is None or self.live_count() == 0:
+                print(f"사용자 {self.user_id}: FAISS 인덱스가 없거나 비어있음, 대체 검색 로직 사용")
+                # 대체 검색 로직 (BM25 키워드 검색)
+                return await self._fallback_search(query, k, timings)
+            
+            if mode == 'dense':
+                dense_hits = await self._dense_hits(query, k, ef_search, nprobe, timings)
+                if dense_hits is None:
+                    return await self._fallback_search(query, k, timings)
+                fused = [(chunk_id, score, None, None) for chunk_id, score in dense_hits]
+            else:
+                # 두 검색기를 동시에 실행하고 각각 넉넉한 후보를 받아 결합
+                depth = max(k, candidates or HYBRID_CANDIDATES)
+                dense_hits, keyword_hits = await asyncio.gather(
+                    self._dense_hits(query, depth, ef_search, nprobe, timings),
+                    self._keyword_hits(query, depth, timings)
                 )
-            except Exception as search_err:
-                print(f"사용자 {self.user_id}: FAISS 검색 오류: {search_err}")
-                return await self._fallback_search(query, k)
+                fusion_start = time.perf_counter()
+                if fusion == 'rrf':
+                    fused = fuse_rrf(dense_hits or [], keyword_hits, k,
+                                     rrf_k=rrf_k or HYBRID_RRF_K, keyword_weight=keyword_weight)
+                else:
+                    fused = fuse_weighted(dense_hits or [], keyword_hits, k, keyword_weight=keyword_weight)
+                timings['fusion'] = time.perf_counter() - fusion_start
             
-            # 결과 처리 (사용자별 필터링)
+            # 결과 처리: 한 번의 IN 쿼리로 청크 조회 후 순위대로 정렬 (사용자별 필터링)
             results = []
             try:
-                async with async_session() as session:
-                    for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                        if idx >= 0 and idx < len(self.chunk_ids):
-                            chunk_id = self.chunk_ids[idx]
-                            
-                            # 데이터베이스에서 청크 정보 조회 (사용자 ID로 필터링)
-                            try:
-                                stmt = select(DocumentChunk).where(
-                                    DocumentChunk.id == chunk_id,
-                                    DocumentChunk.user_id == self.user_id  # 사용자별 필터링
-                                )
-                                result = await session.execute(stmt)
-                                chunk = result.scalar_one_or_none()
-                                
-                                if chunk:
-                                    results.append({
-                                        'chunk_id': chunk_id,
-                                        'text': chunk.chunk_text,
-                                        'score': float(score),
-                                        'document_id': chunk.document_id,
-                                        'user_id': chunk.user_id
-                                    })
-                            except Exception as db_err:
-                                print(f"사용자 {self.user_id}: 청크 ID {chunk_id} 조회 실패: {db_err}")
+                hydrate_start = time.perf_counter()
+                chunks = await self.fetch_chunks([chunk_id for chunk_id, _, _, _ in fused])
+                timings['hydrate'] = time.perf_counter() - hydrate_start
+                for chunk_id, score, dense_score, keyword_score in fused:
+                    chunk = chunks.get(chunk_id)
+                    if chunk:
+                        chunk_text, document_id = chunk
+                        result = {
+                            'chunk_id': chunk_id,
+                            'text': chunk_text,
+                            'score': score,
+                            'document_id': document_id,
+                            'user_id': self.user_id
+                        }
+                        if mode == 'hybrid':
+                            result['dense_score'] = dense_score
+                            result['keyword_score'] = keyword_score
+                        results.append(result)
                 
                 return results
             except Exception as result_err:
@@ -330,9 +1177,61 @@ class UserEmbeddingService:
             import traceback
             print(traceback.format_exc())
             return []
+        finally:
+            timings['total'] = time.perf_counter() - start
+            search_latency.record(mode, timings)
     
-    async def _fallback_search(self, query, k=5):
-        """FAISS가 없을 때 대체 검색 로직 (사용자별 격리)"""
+    async def _dense_hits(self, query, k, ef_search=None, nprobe=None, timings=None):
+        """쿼리 임베딩 + FAISS 검색 결과 [(chunk_id, 점수)] (실패 시 None)"""
+        timings = timings if timings is not None else {}
+        # 쿼리 임베딩 생성
+        embed_start = time.perf_counter()
+        try:
+            query_embedding = await query_batcher.encode(query)
+        except Exception as embed_err:
+            print(f"사용자 {self.user_id}: 쿼리 임베딩 생성 실패: {embed_err}")
+            return None
+        finally:
+            timings['embed'] = time.perf_counter() - embed_start
+        
+        # FAISS에서 검색
+        search_start = time.perf_counter()
+        try:
+            scores, indices = await embedding_executor.run(
+                self._search_index, query_embedding, k, ef_search, nprobe
+            )
+        except Exception as search_err:
+            print(f"사용자 {self.user_id}: FAISS 검색 오류: {search_err}")
+            return None
+        finally:
+            timings['dense'] = time.perf_counter() - search_start
+        return [(int(chunk_id), float(score)) for score, chunk_id in zip(scores[0], indices[0]) if chunk_id >= 0]
+    
+    def _uses_memory_keywords(self):
+        """메모리 BM25 역색인을 유지해야 하는지 (DB 전문 검색을 못 쓰거나 이미 대신 채워진 경우)"""
+        return not full_text_search.enabled() or self._keyword_loaded
+    
+    async def _keyword_hits(self, query, k, timings=None):
+        """키워드 검색 결과 [(chunk_id, 점수)]
+        
+        DB 전문 검색(SQLite FTS5 / PostgreSQL tsvector)을 우선 사용하고, 쓸 수 없거나 실패하면
+        메모리 BM25 역색인을 사용합니다 (역색인이 비어 있으면 DB에서 먼저 채움).
+        """
+        keyword_start = time.perf_counter()
+        try:
+            if full_text_search.enabled() and not self._keyword_loaded:
+                try:
+                    return await full_text_search.search(self.user_id, query, k)
+                except Exception as e:
+                    print(f"사용자 {self.user_id}: DB 전문 검색 실패, 메모리 BM25 사용: {e}")
+            await self.ensure_keyword_index()
+            return await embedding_executor.run(self.keyword_index.search, query, k)
+        finally:
+            if timings is not None:
+                timings['keyword'] = time.perf_counter() - keyword_start
+    
+    async def _fallback_search(self, query, k=5, timings=None):
+        """FAISS가 없을 때 대체 검색 로직 - BM25 키워드 검색 (사용자별 격리)"""
         print(f"사용자 {self.user_id}: 대체 검색 로직 사용 중...")
         results = []
         
@@ -352,36 +1251,22 @@ class UserEmbeddingService:
                     'user_id': self.user_id
                 }]
             
-            # 로컬 환경에서만 실제 데이터베이스 검색 수행 (사용자별 필터링)
-            async with async_session() as session:
-                # 단순 키워드 매칭으로 검색 (사용자별 필터링)
-                query_terms = set(query.lower().split())
-                
-                # 해당 사용자의 최근 문서 청크 가져오기
-                stmt = select(DocumentChunk).where(
-                    DocumentChunk.user_id == self.user_id
-                ).order_by(DocumentChunk.id.desc()).limit(100)
-                result = await session.execute(stmt)
-                chunks = result.scalars().all()
-                
-                # 각 청크와 쿼리의 유사도 계산 (간단한 용어 중복)
-                scored_chunks = []
-                for chunk in chunks:
-                    chunk_terms = set(chunk.chunk_text.lower().split())
-                    common_terms = query_terms.intersection(chunk_terms)
-                    if common_terms:
-                        score = len(common_terms) / len(query_terms)
-                        scored_chunks.append((chunk, score))
-                
-                # 점수로 정렬하고 상위 k개 반환
-                scored_chunks.sort(key=lambda x: x[1], reverse=True)
-                for chunk, score in scored_chunks[:k]:
+            # 로컬 환경: 사용자 전체 청크에 대한 BM25 역색인 검색
+            hits = await self._keyword_hits(query, k, timings)
+            hydrate_start = time.perf_counter()
+            chunks = await self.fetch_chunks([chunk_id for chunk_id, _ in hits])
+            if timings is not None:
+                timings['hydrate'] = time.perf_counter() - hydrate_start
+            for chunk_id, score in hits:
+                chunk = chunks.get(chunk_id)
+                if chunk:
+                    chunk_text, document_id = chunk
                     results.append({
-                        'chunk_id': chunk.id,
-                        'text': chunk.chunk_text,
+                        'chunk_id': chunk_id,
+                        'text': chunk_text,
                         'score': score,
-                        'document_id': chunk.document_id,
-                        'user_id': chunk.user_id
+                        'document_id': document_id,
+                        'user_id': self.user_id
                     })
                     
             return results
@@ -393,99 +1278,338 @@ class UserEmbeddingService:
 
 # 사용자별 임베딩 서비스 팩토리
 class EmbeddingServiceManager:
-    """사용자별 임베딩 서비스 관리자"""
+    """사용자별 임베딩 서비스 관리자
     
-    def __init__(self):
-        self._services = {}  # user_id -> UserEmbeddingService
-        self._max_services = 50  # 메모리 절약을 위한 최대 서비스 수 (100에서 50으로 감소)
-        self._access_count = {}  # user_id -> access count (LRU 구현용)
-        self._lock = None  # 동시성 보호용 락 (필요시 생성)
+    서비스는 최근 사용 순서(OrderedDict)로 보관하며, 인덱스 메모리 추정치의 합이
+    예산을 넘으면 가장 오래 사용되지 않은 서비스부터 O(1)로 제거합니다.
     
-    def _get_lock(self):
-        """필요시 락 생성 (지연 초기화)"""
-        if self._lock is None:
-            try:
-                import asyncio
-                self._lock = asyncio.Lock()
-            except Exception:
-                # asyncio가 없는 환경에서는 None으로 유지
-                pass
-        return self._lock
+    전역 맵 락은 O(1) 맵 갱신에만 사용하고, 서비스 생성/정리는 사용자별 락으로 직렬화합니다.
+    제거된 서비스의 디스크 기록은 락 밖의 백그라운드 작업에서 수행하며,
+    같은 사용자의 서비스를 다시 만들 때는 그 기록이 끝나기를 기다립니다.
+    인덱스를 변경하는 작업(업로드 처리, 문서 삭제)은 pinned()로 서비스를 고정해 작업 도중 제거되지 않게 합니다.
+    """
+    
+    def __init__(self, memory_budget_bytes: int = int(EMBEDDING_SERVICE_MEMORY_BUDGET_MB * 1024**2),
+                 max_services: int = EMBEDDING_MAX_SERVICES):
+        self._services = OrderedDict()  # user_id -> UserEmbeddingService (오래된 순서)
+        self._max_services = max(1, max_services)
+        self._memory_budget = memory_budget_bytes
+        self._sizes = {}  # user_id -> 마지막으로 추정한 인덱스 바이트 수
+        self._total_bytes = 0
+        self._access_count = {}  # user_id -> access count (통계용)
+        self._evictions = 0
+        self._map_lock = threading.Lock()  # 맵 갱신 전용 (락 안에서 I/O나 await 없음)
+        self._user_locks = {}  # user_id -> [asyncio.Lock, 사용 중인 요청 수] (생성/정리 직렬화)
+        self._evicting = {}  # user_id -> 제거된 서비스의 기록 작업
+        self._pins = {}  # user_id -> 서비스를 사용 중인 쓰기 작업 수 (0보다 크면 제거하지 않음)
+        
+        # 서비스 획득 대기 시간 통계
+        self._requests = 0
+        self._waited_requests = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
     
-    async def get_service(self, user_id: str) -> UserEmbeddingService:
-        """사용자별 임베딩 서비스 인스턴스 반환 (동시성 보호)"""
-        lock = self._get_lock()
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str):
+        """사용자별 락 획득 (없으면 생성, 다른 요청이 잡고 있었으면 True를 넘김)
         
-        if lock:
+        락을 기다리거나 잡은 요청이 없고 서비스도 메모리에 없으면 락 항목을 지워
+        사용자 수만큼 락이 계속 쌓이지 않게 합니다.
+        """
+        with self._map_lock:
+            entry = self._user_locks.get(user_id)
+            if entry is None:
+                entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        lock = entry[0]
+        contended = lock.locked()
+        try:
             async with lock:
-                return self._get_service_sync(user_id)
-        else:
-            return self._get_service_sync(user_id)
-    
-    def _get_service_sync(self, user_id: str) -> UserEmbeddingService:
-        """동기적 서비스 획득 (락 내부에서 호출)"""
-        if user_id not in self._services:
-            # 메모리 관리: 최대 서비스 수 초과 시 가장 적게 사용된 것 제거
-            if len(self._services) >= self._max_services:
-                # LRU (Least Recently Used) 방식으로 제거
-                if self._access_count:
-                    lru_user = min(self._access_count.items(), key=lambda x: x[1])[0]
-                else:
-                    # access_count가 비어있으면 첫 번째 제거
-                    lru_user = next(iter(self._services))
-                
-                old_service = self._services.pop(lru_user)
-                self._access_count.pop(lru_user, None)
-                
-                # 인덱스 저장
-                try:
-                    old_service.save_index()
-                    print(f"사용자 {lru_user} 서비스 정리 및 인덱스 저장 완료")
-                except Exception as e:
-                    print(f"사용자 {lru_user} 인덱스 저장 실패: {e}")
+                yield contended
+        finally:
+            with self._map_lock:
+                entry[1] -= 1
+                if entry[1] == 0 and user_id not in self._services and self._user_locks.get(user_id) is entry:
+                    del self._user_locks[user_id]
+    
+    def _drop_idle_lock(self, user_id: str):
+        """제거된 사용자의 락을 아무도 쓰지 않으면 삭제 (맵 락 내부에서 호출)"""
+        entry = self._user_locks.get(user_id)
+        if entry is not None and entry[1] == 0:
+            del self._user_locks[user_id]
+    
+    def _record_wait(self, seconds: float):
+        """서비스를 얻기까지 기다린 시간 기록"""
+        with self._map_lock:
+            self._requests += 1
+            if seconds > 0:
+                self._waited_requests += 1
+                self._wait_seconds += seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, seconds)
+    
+    async def get_service(self, user_id: str, read_only: bool = False, pin: bool = False) -> UserEmbeddingService:
+        """사용자별 임베딩 서비스 인스턴스 반환 (동시성 보호)
+        
+        read_only=True는 검색 전용 요청용이며, 새로 만드는 서비스의 인덱스를 memory map으로 엽니다.
+        pin=True면 반환 전에 서비스를 고정하며, 호출자가 _unpin으로 해제해야 합니다 (pinned() 사용).
+        """
+        service = self._touch(user_id, pin=pin)
+        if service is not None:
+            self._record_wait(0.0)
+            return service
+        
+        # 없으면 사용자별 락 안에서 생성 (다른 사용자의 요청은 기다리지 않음)
+        wait_start = time.perf_counter()
+        async with self._user_lock(user_id) as contended:
+            # 같은 사용자의 제거된 서비스가 아직 기록 중이면 끝날 때까지 대기
+            pending = self._evicting.get(user_id)
+            if pending is not None:
+                contended = True
+                await asyncio.shield(pending)
+            waited = time.perf_counter() - wait_start if contended else 0.0
             
-            # 새 서비스 생성
-            self._services[user_id] = UserEmbeddingService(user_id)
-            self._access_count[user_id] = 0
+            service = self._touch(user_id, pin=pin)
+            if service is None:
+                service = UserEmbeddingService(user_id, read_only=read_only)
+                # 로드 전 크기는 manifest로 추정하므로 이벤트 루프 밖에서 읽음
+                size = await embedding_executor.run(service.memory_bytes)
+                with self._map_lock:
+                    self._services[user_id] = service
+                    self._access_count[user_id] = 1
+                    self._set_size(user_id, size)
+                    if pin:
+                        self._pins[user_id] = self._pins.get(user_id, 0) + 1
+                    evicted = self._collect_evictions()
+                self._schedule_flushes(evicted)
         
-        # 접근 횟수 증가
-        self._access_count[user_id] = self._access_count.get(user_id, 0) + 1
-        return self._services[user_id]
+        self._record_wait(waited)
+        return service
     
-    async def cleanup_service(self, user_id: str):
-        """특정 사용자의 서비스 정리 (동시성 보호)"""
-        lock = self._get_lock()
+    async def get_loaded(self, user_id: str, pin: bool = False):
+        """이미 메모리에 있는 서비스만 반환 (없으면 None - 새로 만들거나 인덱스를 로드하지 않음)
         
-        if lock:
-            async with lock:
-                self._cleanup_service_sync(user_id)
+        같은 사용자의 서비스를 만드는 중이면 생성이 끝날 때까지 기다립니다.
+        """
+        async with self._user_lock(user_id):
+            with self._map_lock:
+                service = self._services.get(user_id)
+                if service is not None and pin:
+                    self._pins[user_id] = self._pins.get(user_id, 0) + 1
+                return service
+    
+    @asynccontextmanager
+    async def pinned(self, user_id: str, load: bool = True):
+        """작업 동안 사용자 서비스를 메모리에 고정 (업로드 처리, 문서 삭제 등 인덱스를 변경하는 작업)
+        
+        고정된 서비스는 예산을 넘어도 제거하지 않으므로, 작업 도중 같은 사용자의 서비스가 새로 만들어져
+        두 인스턴스가 같은 인덱스 파일에 쓰는 일이 없습니다.
+        load=False면 이미 메모리에 있는 서비스만 고정하고, 없으면 None을 넘깁니다.
+        """
+        if load:
+            service = await self.get_service(user_id, pin=True)
         else:
-            self._cleanup_service_sync(user_id)
+            service = await self.get_loaded(user_id, pin=True)
+        try:
+            yield service
+        finally:
+            if service is not None:
+                self._unpin(user_id)
+    
+    def _unpin(self, user_id: str):
+        """고정 해제 - 고정 때문에 미뤄진 제거가 있으면 이어서 처리"""
+        with self._map_lock:
+            count = self._pins.get(user_id, 0) - 1
+            if count > 0:
+                self._pins[user_id] = count
+            else:
+                self._pins.pop(user_id, None)
+            evicted = self._collect_evictions()
+        self._schedule_flushes(evicted)
+    
+    def _touch(self, user_id: str, pin: bool = False):
+        """이미 있는 서비스를 최근 사용으로 표시하고 반환 (없으면 None)"""
+        with self._map_lock:
+            service = self._services.get(user_id)
+            if service is None:
+                return None
+            self._services.move_to_end(user_id)
+            self._access_count[user_id] = self._access_count.get(user_id, 0) + 1
+            if pin:
+                self._pins[user_id] = self._pins.get(user_id, 0) + 1
+        
+        # 업로드로 인덱스가 커졌을 수 있으므로 크기 추정치 갱신 (서비스가 변경 때 계산해 둔 값)
+        size = service.memory_bytes()
+        with self._map_lock:
+            if self._services.get(user_id) is service:
+                self._set_size(user_id, size)
+            evicted = self._collect_evictions()
+        self._schedule_flushes(evicted)
+        return service
     
-    def _cleanup_service_sync(self, user_id: str):
-        """동기적 서비스 정리 (락 내부에서 호출)"""
-        if user_id in self._services:
-            service = self._services.pop(user_id)
-            self._access_count.pop(user_id, None)
+    def _set_size(self, user_id: str, size: int):
+        """서비스 크기 추정치를 전체 합계에 반영 (맵 락 내부에서 호출)"""
+        self._total_bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+    
+    def _pop_service(self, user_id: str):
+        """서비스를 맵에서 제거하고 크기 합계에서 제외 (맵 락 내부에서 호출)"""
+        service = self._services.pop(user_id)
+        self._total_bytes -= self._sizes.pop(user_id, 0)
+        self._access_count.pop(user_id, None)
+        self._drop_idle_lock(user_id)
+        return service
+    
+    def _over_budget(self) -> bool:
+        return self._total_bytes > self._memory_budget or len(self._services) > self._max_services
+    
+    def _collect_evictions(self):
+        """예산이나 최대 서비스 수를 넘는 만큼 가장 오래 사용되지 않은 서비스 제거 (맵 락 내부에서 호출)
+        
+        고정된(쓰기 작업 중인) 서비스는 건너뛰며, 고정이 풀릴 때 다시 확인합니다.
+        가장 최근에 사용한 서비스(방금 반환할 서비스)는 제거하지 않습니다.
+        """
+        evicted = []
+        if len(self._services) <= 1 or not self._over_budget():
+            return evicted
+        for lru_user in list(self._services)[:-1]:
+            if not self._over_budget():
+                break
+            if self._pins.get(lru_user):
+                continue
+            evicted.append((lru_user, self._pop_service(lru_user)))
+            self._evictions += 1
+        return evicted
+    
+    def _schedule_flushes(self, evicted):
+        """제거된 서비스의 남은 변경을 백그라운드에서 기록"""
+        for user_id, service in evicted:
+            print(f"사용자 {user_id} 서비스 제거 (사용 중 {self._total_bytes / (1024**2):.1f}MB / "
+                  f"예산 {self._memory_budget / (1024**2):.1f}MB)")
+            previous = self._evicting.get(user_id)
+            task = asyncio.ensure_future(self._flush_evicted(user_id, service, previous))
+            self._evicting[user_id] = task
+    
+    async def _flush_evicted(self, user_id: str, service: UserEmbeddingService, previous=None):
+        """제거된 서비스의 아직 기록되지 않은 변경 저장 (임베딩 실행기에서)"""
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            await embedding_executor.run(index_flusher.flush, service)
+            print(f"사용자 {user_id} 서비스 정리 및 인덱스 저장 완료")
+        except Exception as e:
+            print(f"사용자 {user_id} 인덱스 저장 실패: {e}")
+        finally:
+            self._retire(service)
+            if self._evicting.get(user_id) is asyncio.current_task():
+                del self._evicting[user_id]
+    
+    def _retire(self, service: UserEmbeddingService):
+        """맵에서 빠지고 정리까지 끝난 서비스가 더 이상 인덱스 파일에 쓰지 않도록 표시
+        
+        아직 서비스를 참조하던 요청이 남긴 변경은 기록하지 않으며,
+        DB에는 저장되어 있으므로 새 서비스의 ensure_index_fresh가 재구성합니다.
+        """
+        service.resident = False
+        if index_flusher.discard(service):
+            print(f"사용자 {service.user_id}: 제거된 서비스의 기록되지 않은 변경은 다음 로드 때 DB에서 재구성")
+    
+    async def cleanup_service(self, user_id: str):
+        """특정 사용자의 서비스 정리 (동시성 보호)"""
+        async with self._user_lock(user_id):
+            with self._map_lock:
+                if self._pins.get(user_id):
+                    print(f"사용자 {user_id} 서비스는 업로드/삭제 작업에서 사용 중이므로 정리하지 않음")
+                    return
+                service = self._pop_service(user_id) if user_id in self._services else None
+            if service is None:
+                return
             try:
-                service.save_index()
+                await embedding_executor.run(index_flusher.flush, service)
                 print(f"사용자 {user_id} 서비스 정리 완료")
             except Exception as e:
                 print(f"사용자 {user_id} 서비스 정리 중 오류: {e}")
+            finally:
+                self._retire(service)
+    
+    async def purge_user(self, user_id: str):
+        """사용자의 모든 데이터가 삭제될 때 서비스를 저장 없이 버리고 인덱스 파일 삭제
+        
+        반환값은 삭제한 인덱스 파일 수입니다.
+        """
+        async with self._user_lock(user_id):
+            # 제거 중인 서비스가 파일을 다시 쓰지 않도록 기록이 끝난 뒤 삭제
+            pending = self._evicting.get(user_id)
+            if pending is not None:
+                await asyncio.shield(pending)
+            with self._map_lock:
+                service = self._pop_service(user_id) if user_id in self._services else None
+            if service is None:
+                service = UserEmbeddingService(user_id)
+            else:
+                # 아직 실행 중인 업로드 작업이 있어도 삭제한 파일을 다시 쓰지 않음
+                service.resident = False
+                index_flusher.discard(service)
+            chunk_cache.discard_user(user_id)
+            search_cache.discard_user(user_id)
+            removed = await embedding_executor.run(service.delete_files)
+            print(f"사용자 {user_id}: 임베딩 서비스 및 인덱스 파일 {removed}개 삭제")
+            return removed
     
     def get_stats(self):
         """서비스 매니저 통계 반환"""
         return {
             "active_services": len(self._services),
             "max_services": self._max_services,
-            "users": list(self._services.keys()),
-            "access_counts": dict(self._access_count)
+            "memory_budget_mb": round(self._memory_budget / (1024**2), 2),
+            "memory_mb": round(self._total_bytes / (1024**2), 2),
+            "evictions": self._evictions,
+            "pending_eviction_flushes": len(self._evicting),
+            "pinned_services": len(self._pins),
+            "user_locks": len(self._user_locks),
+            "service_wait": {
+                "requests": self._requests,
+                "waited_requests": self._waited_requests,
+                "avg_wait_ms": round(self._wait_seconds / self._waited_requests * 1000, 3) if self._waited_requests else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 3)
+            },
+            "users": list(self._services.keys()),  # 오래 사용되지 않은 순서
+            "access_counts": dict(self._access_count),
+            "model": model_registry.get_stats(),
+            "executor": embedding_executor.get_stats(),
+            "embedding_cache": embedding_cache.get_stats(),
+            "chunk_cache": chunk_cache.get_stats(),
+            "search_cache": search_cache.get_stats(),
+            "keyword_search": full_text_search.get_stats(),
+            "search_latency": search_latency.get_stats(),
+            "query_batcher": query_batcher.get_stats(),
+            "index_flush": index_flusher.get_stats(),
+            "indexes": {
+                user_id: {
+                    "kind": service.get_index_kind(),
+                    "read_only_mmap": service.read_only,
+                    "vectors": service.index.ntotal if service.index is not None else 0,
+                    "tombstones": len(service._tombstones),
+                    "removed_chunks": service.removed_chunks,
+                    "memory_mb": round(self._sizes.get(user_id, 0) / (1024**2), 2),
+                    "last_migration": service.last_migration,
+                    "persisted_rows": service._persisted_rows,
+                    "last_compaction": service.last_compaction,
+                    "index_version": service.index_version,
+                    "keyword": service.keyword_index.get_stats()
+                }
+                for user_id, service in self._services.items()
+            },
+            "index_rebuilds": {
+                user_id: service.last_rebuild
+                for user_id, service in self._services.items()
+                if service.last_rebuild
+            }
         }
 
 # 전역 임베딩 서비스 매니저
 embedding_manager = EmbeddingServiceManager()
 
 # 하위 호환성을 위한 래퍼 함수들
-async def get_embedding_service(user_id: str = "default") -> UserEmbeddingService:
-    """사용자별 임베딩 서비스 반환"""
-    return await embedding_manager.get_service(user_id)
+async def get_embedding_service(user_id: str = "default", read_only: bool = False) -> UserEmbeddingService:
+    """사용자별 임베딩 서비스 반환 (검색 전용 요청은 read_only=True)"""
+    return await embedding_manager.get_service(user_id, read_only=read_only)
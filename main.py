@@ -2,13 +2,14 @@ from fastapi import FastAPI, File, UploadFile, Form, Depends, HTTPException, Req
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
+from sqlalchemy import select, delete, func, text
 import json
 import os
 import glob
-import re
-import unicodedata
 from datetime import datetime
+import time
+import asyncio
+import itertools
 import traceback
 # uvicorn은 조건부 import (CloudType 환경에서는 전역 설치)
 try:
@@ -21,137 +22,64 @@ except ImportError:
     psutil = None
 
 from database import get_db, get_db_session, create_tables, User, Document, DocumentChunk, async_session
-from document_processor import DocumentProcessor
+from document_processor import DocumentProcessor, pdf_page_pool
 # 사용자별 임베딩 서비스 사용
-from lightweight_embedding import get_embedding_service, embedding_manager
+from lightweight_embedding import get_embedding_service, embedding_manager, EMBEDDING_BATCH_SIZE
+
+# 업로드 파이프라인에서 한 번에 추출/임베딩/저장하는 청크 수 (진행률 갱신 단위)
+INGEST_PROGRESS_BATCH = int(os.environ.get('INGEST_PROGRESS_BATCH', str(EMBEDDING_BATCH_SIZE * 4)))
+# Document.content에 저장하는 원문 앞부분 최대 크기 (바이트)
+DOCUMENT_CONTENT_MAX_BYTES = 1000000
+SUPPORTED_UPLOAD_EXTENSIONS = ('pdf', 'docx', 'txt')
+from embedding_codec import encode_embedding, EMBEDDING_STORAGE_DTYPE
+from embedding_executor import embedding_executor
+from index_flusher import index_flusher
+from chunk_cache import chunk_cache
+from ingest_jobs import ingest_queue, UploadTooLarge, MAX_UPLOAD_BYTES
 from chat_service import chat_service
 from user_session import get_current_user_id, set_user_cookie, session_manager
+from text_cleaner import safe_truncate
 
-# PostgreSQL 호환 텍스트 정제 함수들
-def clean_for_postgresql(text):
-    """PostgreSQL에 안전하게 저장할 수 있도록 텍스트를 정제합니다."""
-    if not text:
-        return ""
-    
-    # 1. null 바이트 제거
-    text = text.replace('\x00', '')
-    
-    # 2. 대체 문자 제거
-    text = text.replace('\ufffd', '')
-    
-    # 3. 기타 제어 문자 제거 (탭, 개행, 캐리지 리턴은 유지)
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-    
-    # 4. Unicode 정규화 (NFD -> NFC)
-    text = unicodedata.normalize('NFC', text)
-    
-    # 5. 비인쇄 가능한 Unicode 문자 제거
-    text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char in '\t\n\r')
-    
-    # 6. 연속된 공백 정리
-    text = re.sub(r'\s+', ' ', text)
-    
-    # 7. 앞뒤 공백 제거
-    text = text.strip()
-    
-    return text
-
-def validate_utf8(text):
-    """UTF-8 인코딩이 유효한지 확인합니다."""
-    try:
-        text.encode('utf-8').decode('utf-8')
-        return True
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        return False
-
-def safe_truncate(text, max_length=1000000):
-    """텍스트를 안전하게 자릅니다. (UTF-8 문자 경계 고려)"""
-    if len(text.encode('utf-8')) <= max_length:
-        return text
-    
-    # 바이트 단위로 자르되, 문자 경계를 고려
-    encoded = text.encode('utf-8')
-    truncated = encoded[:max_length]
-    
-    # 불완전한 UTF-8 시퀀스 제거
-    while truncated and truncated[-1] & 0x80:
-        if truncated[-1] & 0x40:
-            break
-        truncated = truncated[:-1]
-    
-    try:
-        return truncated.decode('utf-8')
-    except UnicodeDecodeError:
-        # 안전하게 처리
-        return truncated.decode('utf-8', errors='ignore')
-
-import re
-import unicodedata
-
-class TextCleaner:
-    """PostgreSQL과 호환되는 텍스트 정제 유틸리티"""
+class UploadSizeLimitMiddleware:
+    """업로드 요청 본문을 받는 동안 크기 제한 적용
     
-    @staticmethod
-    def clean_for_postgresql(text):
-        """PostgreSQL에 안전하게 저장할 수 있도록 텍스트를 정제합니다."""
-        if not text:
-            return ""
-        
-        # 1. null 바이트 제거
-        text = text.replace('\x00', '')
-        
-        # 2. 대체 문자 제거
-        text = text.replace('\ufffd', '')
-        
-        # 3. 기타 제어 문자 제거 (탭, 개행, 캐리지 리턴은 유지)
-        text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-        
-        # 4. Unicode 정규화 (NFD -> NFC)
-        text = unicodedata.normalize('NFC', text)
-        
-        # 5. 비인쇄 가능한 Unicode 문자 제거
-        text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char in '\t\n\r')
-        
-        # 6. 연속된 공백 정리
-        text = re.sub(r'\s+', ' ', text)
-        
-        # 7. 앞뒤 공백 제거
-        text = text.strip()
-        
-        return text
+    Content-Length가 제한을 넘으면 본문을 받기 전에, chunked 요청은 누적 수신량이 넘는 순간 413으로 중단합니다.
+    (multipart 경계/폼 필드 여유분을 위해 본문 제한은 파일 제한보다 조금 큼)
+    """
     
-    @staticmethod
-    def validate_utf8(text):
-        """UTF-8 인코딩이 유효한지 확인합니다."""
-        try:
-            text.encode('utf-8').decode('utf-8')
-            return True
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            return False
+    def __init__(self, app, max_bytes: int, paths=("/upload",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
     
-    @staticmethod
-    def safe_truncate(text, max_length=1000000):
-        """텍스트를 안전하게 자릅니다. (UTF-8 문자 경계 고려)"""
-        if len(text.encode('utf-8')) <= max_length:
-            return text
-        
-        # 바이트 단위로 자르되, 문자 경계를 고려
-        encoded = text.encode('utf-8')
-        truncated = encoded[:max_length]
-        
-        # 불완전한 UTF-8 시퀀스 제거
-        while truncated and truncated[-1] & 0x80:
-            if truncated[-1] & 0x40:
-                break
-            truncated = truncated[:-1]
-        
-        try:
-            return truncated.decode('utf-8')
-        except UnicodeDecodeError:
-            # 안전하게 처리
-            return truncated.decode('utf-8', errors='ignore')
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        
+        detail = f"파일이 너무 큽니다. 최대 {MAX_UPLOAD_BYTES / (1024 * 1024):g}MB까지 업로드할 수 있습니다."
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            body = json.dumps({"detail": detail}).encode("utf-8")
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # 폼 파싱 중에 발생하므로 FastAPI가 그대로 413 응답으로 변환
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        await self.app(scope, limited_receive, send)
 
 app = FastAPI(title="N_GPT Document Search", version="1.3.7")
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES + 1024 * 1024)
 
 # 정적 파일 서빙
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -167,7 +95,7 @@ async def startup_event():
         # 기존 메서드: metadata.drop_all은 종속성 오류 발생
         # 수동으로 레거시 및 모델 테이블을 순서대로 CASCADE 삭제
         from sqlalchemy import text
-        for tbl in ["chunks", "document_chunks", "documents", "users"]:
+        for tbl in ["chunks", "document_chunks_fts", "document_chunks", "documents", "users"]:
             await conn.execute(text(f"DROP TABLE IF EXISTS {tbl} CASCADE"))
         # 모든 테이블 재생성
         await conn.run_sync(Base.metadata.create_all)
@@ -215,6 +143,19 @@ async def startup_event():
         os.environ['CLOUDTYPE_DEPLOYMENT'] = '1'
         print("외부 데이터베이스 사용 모드로 전환")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """애플리케이션 종료 시 대기 중인 업로드 작업 처리, 아직 기록되지 않은 인덱스 저장 및 실행기 종료"""
+    print("서버 종료: 업로드 작업 대기열 정리 중...")
+    await ingest_queue.shutdown()
+    pdf_page_pool.shutdown(wait=True)
+    print("서버 종료: 변경된 FAISS 인덱스 저장 중...")
+    try:
+        await embedding_executor.run(index_flusher.shutdown)
+    except Exception as e:
+        print(f"종료 시 인덱스 저장 실패: {e}")
+    embedding_executor.shutdown(wait=True)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request, response: Response, user_id: str = Depends(get_current_user_id)):
     """메인 페이지"""
@@ -222,190 +163,250 @@ async def read_root(request: Request, response: Response, user_id: str = Depends
     set_user_cookie(response, user_id)
     return HTMLResponse(content=open("templates/index.html", "r", encoding="utf-8").read())
 
-@app.post("/upload")
-async def upload_document(
-    request: Request,
-    response: Response,
-    file: UploadFile = File(...),
-    user_id: str = Depends(get_current_user_id),
-    db: AsyncSession = Depends(get_db)
-):
-    """문서 업로드 및 임베딩 (사용자별 격리)"""
-    try:
-        print(f"사용자 {user_id}: 문서 업로드 시작: {file.filename}")
-        print(f"환경: CloudType={os.environ.get('CLOUDTYPE_DEPLOYMENT', '0')}")
-        
-        # 사용자 쿠키 설정
-        set_user_cookie(response, user_id)
-        
-        # 사용자별 임베딩 서비스 가져오기
-        embedding_service = await get_embedding_service(user_id)
-        
-        # 파일 내용 읽기 시도
-        try:
-            file_content = await file.read()
-            print(f"사용자 {user_id}: 파일 크기: {len(file_content)} 바이트")
-        except Exception as file_err:
-            print(f"사용자 {user_id}: 파일 읽기 오류: {str(file_err)}")
-            raise HTTPException(status_code=400, detail=f"파일 읽기 실패: {str(file_err)}")
-        
-        # 텍스트 추출 시도
-        try:
-            text_content = DocumentProcessor.extract_text(file.filename, file_content)
-            print(f"사용자 {user_id}: 추출된 텍스트 크기: {len(text_content) if text_content else 0} 자")
-        except Exception as extract_err:
-            print(f"사용자 {user_id}: 텍스트 추출 오류: {str(extract_err)}")
-            raise HTTPException(status_code=400, detail=f"텍스트 추출 실패: {str(extract_err)}")
-        
-        if not text_content:
-            print(f"사용자 {user_id}: 추출된 텍스트가 없습니다.")
-            raise HTTPException(status_code=400, detail="텍스트를 추출할 수 없습니다.")
-        
-        # 문서 저장 시도 (사용자 ID 포함)
+async def run_ingest_job(job):
+    """업로드 작업 처리: 추출 -> 정제 -> 청킹 -> 배치 임베딩 -> DB 저장 (ingest_queue 워커에서 실행)
+    
+    단계들은 generator로 연결되어 INGEST_PROGRESS_BATCH개 청크 단위로 흘러가며,
+    현재 배치를 임베딩/저장하는 동안 다음 배치 하나만 미리 추출하므로 메모리에는 청크 배치 두 개와
+    Document.content로 저장할 앞부분(최대 1MB)만 남고 문서 크기와 무관하게 유지됩니다.
+    청크는 배치마다 커밋하므로(SQLite 쓰기 락을 문서 전체 처리 동안 잡지 않음) 실패하면 문서와 청크를 삭제합니다.
+    """
+    user_id = job.user_id
+    print(f"사용자 {user_id}: 업로드 작업 {job.id} 시작: {job.filename}")
+    
+    # 텍스트 조각(페이지/문단/블록, 정제 완료) -> 슬라이딩 윈도우 청크
+    job.set_stage("extracting")
+    content_parts = []  # Document.content용 앞부분
+    content_bytes = 0
+    def collect_content(segments):
+        nonlocal content_bytes
+        for segment in segments:
+            if content_bytes <= DOCUMENT_CONTENT_MAX_BYTES:
+                content_parts.append(segment)
+                content_bytes += len(segment.encode('utf-8')) + 1
+            yield segment
+    chunk_stream = DocumentProcessor.iter_chunks(
+        collect_content(DocumentProcessor.iter_text(job.filename, job.path, job.set_extract_progress))
+    )
+    def next_batch():
+        # 업로드 처리 스레드에서 다음 배치만큼 추출/정제/청킹 진행
+        return list(itertools.islice(chunk_stream, INGEST_PROGRESS_BATCH))
+    
+    indexed_ids = []  # 실패 시 인덱스에서 되돌릴 청크 ID
+    pending = None
+    embed_seconds = 0.0
+    embedded = 0
+    # 작업이 끝날 때까지 서비스를 고정 (작업 도중 제거되어 새 서비스와 함께 같은 인덱스 파일에 쓰지 않도록)
+    async with embedding_manager.pinned(user_id) as embedding_service, async_session() as db:
         try:
-            print(f"사용자 {user_id}: 문서 저장 시작...")
-            # PostgreSQL 호환성을 위한 강력한 텍스트 정제
-            clean_text = clean_for_postgresql(text_content)
-            
-            # UTF-8 유효성 검증
-            if not validate_utf8(clean_text):
-                print(f"사용자 {user_id}: UTF-8 인코딩 오류 감지, 강제 정제 중...")
-                clean_text = clean_text.encode('utf-8', errors='ignore').decode('utf-8')
-            
-            # 안전한 텍스트 길이 제한
-            clean_text = safe_truncate(clean_text, 1000000)  # 1MB 제한
-            if len(clean_text) != len(text_content):
-                print(f"사용자 {user_id}: 텍스트 정제 및 길이 조정: {len(text_content)} -> {len(clean_text)}")
-            
-            # 최종 검증: NULL 바이트가 완전히 제거되었는지 확인
-            if '\x00' in clean_text:
-                print(f"사용자 {user_id}: 경고: NULL 바이트가 여전히 존재함, 강제 제거 중...")
-                clean_text = clean_text.replace('\x00', '')
-            
+            # 문서 저장 (사용자 ID 포함, 내용은 청크를 모두 처리한 뒤 채움)
             document = Document(
                 user_id=user_id,  # 사용자 ID 설정
-                filename=file.filename,
-                content=clean_text
+                filename=job.filename,
+                content=""
             )
             db.add(document)
-            await db.flush()  # ID 생성을 위해
+            await db.commit()
             print(f"사용자 {user_id}: 문서 ID 생성: {document.id}")
-        except Exception as doc_err:
-            print(f"사용자 {user_id}: 문서 저장 오류: {str(doc_err)}")
-            await db.rollback()
-            raise HTTPException(status_code=500, detail=f"문서 저장 실패: {str(doc_err)}")
-        
-        # 텍스트 청킹
-        try:
-            chunks = DocumentProcessor.chunk_text(clean_text)
-            print(f"사용자 {user_id}: 텍스트 청킹 완료: {len(chunks)}개 청크 생성")
-        except Exception as chunk_err:
-            print(f"사용자 {user_id}: 텍스트 청킹 오류: {str(chunk_err)}")
-            await db.rollback()
-            raise HTTPException(status_code=500, detail=f"텍스트 청킹 실패: {str(chunk_err)}")
-        
-        # 각 청크를 임베딩하고 저장 (사용자별)
-        chunk_count = 0
-        try:
-            for i, chunk_text in enumerate(chunks):
-                print(f"사용자 {user_id}: 청크 {i+1}/{len(chunks)} 처리 중...")
-                
-                # 청크 텍스트도 PostgreSQL 호환성을 위해 정제
-                clean_chunk_text = clean_for_postgresql(chunk_text)
-                if '\x00' in clean_chunk_text:
-                    print(f"사용자 {user_id}: 청크 {i+1}에서 NULL 바이트 제거 중...")
-                    clean_chunk_text = clean_chunk_text.replace('\x00', '')
+            
+            pending = asyncio.ensure_future(ingest_queue.executor.run(next_batch))
+            while True:
+                chunks = await pending
+                if not chunks:
+                    pending = None
+                    break
+                # 현재 배치를 처리하는 동안 다음 배치 추출 (한 배치만 앞서 읽어 backpressure 유지)
+                pending = asyncio.ensure_future(ingest_queue.executor.run(next_batch))
+                if job.status == "extracting":
+                    job.set_stage("embedding")
                 
-                # 데이터베이스에 청크 저장 (사용자 ID 포함)
-                chunk = DocumentChunk(
-                    user_id=user_id,  # 사용자 ID 설정
-                    document_id=document.id,
-                    chunk_text=clean_chunk_text,
-                    chunk_index=i
-                )
-                db.add(chunk)
-                await db.flush()
+                # 데이터베이스에 청크 배치 저장 (사용자 ID 포함, 조각 단계에서 이미 정제된 텍스트)
+                chunk_rows = [
+                    DocumentChunk(
+                        user_id=user_id,  # 사용자 ID 설정
+                        document_id=document.id,
+                        chunk_text=chunk_text,
+                        chunk_index=job.chunked_chunks + i
+                    )
+                    for i, chunk_text in enumerate(chunks)
+                ]
+                job.chunked_chunks += len(chunk_rows)
+                db.add_all(chunk_rows)
+                await db.flush()  # 청크 ID 생성을 위해 배치당 한 번만 flush
                 
-                # FAISS 인덱스에 추가
-                print(f"사용자 {user_id}: 청크 {i+1} 임베딩 생성 중...")
+                # FAISS 인덱스에 배치로 추가
+                chunk_ids = [chunk.id for chunk in chunk_rows]
+                embed_start = time.perf_counter()
                 try:
-                    embedding = embedding_service.add_to_index(chunk.id, clean_chunk_text)
-                    
-                    # 임베딩을 데이터베이스에 저장
-                    if embedding:
-                        chunk.embedding = json.dumps(embedding)
-                        print(f"사용자 {user_id}: 청크 {i+1} 임베딩 저장 완료")
-                    else:
-                        print(f"사용자 {user_id}: 청크 {i+1} 임베딩 생성 실패")
+                    embeddings = await embedding_service.add_many_async(
+                        chunk_ids,
+                        [chunk.chunk_text for chunk in chunk_rows],
+                        batch_size=EMBEDDING_BATCH_SIZE
+                    )
                 except Exception as embed_err:
-                    print(f"사용자 {user_id}: 청크 {i+1} 임베딩 오류: {str(embed_err)}")
+                    print(f"사용자 {user_id}: 배치 임베딩 오류: {str(embed_err)}")
                     # 임베딩 실패해도 계속 진행
+                    embeddings = [None] * len(chunk_rows)
+                embed_seconds += time.perf_counter() - embed_start
+                indexed_ids.extend(chunk_ids)
                 
-                chunk_count += 1
-                
-                # 10개 청크마다 커밋
-                if chunk_count % 10 == 0:
-                    await db.commit()
-                    print(f"사용자 {user_id}: {chunk_count}개 청크 중간 커밋 완료")
-        
-        except Exception as chunks_err:
-            print(f"사용자 {user_id}: 청크 처리 중 오류: {str(chunks_err)}")
-            await db.rollback()
-            raise HTTPException(status_code=500, detail=f"청크 처리 실패: {str(chunks_err)}")
-        
-        # 최종 커밋
-        try:
+                # 임베딩을 바이너리로 데이터베이스에 저장
+                for chunk, embedding in zip(chunk_rows, embeddings):
+                    if embedding is not None:
+                        chunk.embedding_vec = encode_embedding(embedding)
+                        embedded += 1
+                await db.commit()  # 배치 단위 bulk 저장
+                job.embedded_chunks = embedded
+            
+            if job.chunked_chunks == 0:
+                raise ValueError("텍스트를 추출할 수 없습니다.")
+            job.total_chunks = job.chunked_chunks
+            print(f"사용자 {user_id}: 텍스트 청킹/임베딩 완료: {job.total_chunks}개 청크")
+            
+            # 안전한 텍스트 길이 제한
+            document.content = safe_truncate(" ".join(content_parts), DOCUMENT_CONTENT_MAX_BYTES)
+            
+            ingest_stats = {
+                "embedded_chunks": embedded,
+                "embedding_seconds": round(embed_seconds, 3),
+                "chunks_per_sec": round(job.total_chunks / embed_seconds, 2) if embed_seconds > 0 else 0.0,
+                "batch_size": EMBEDDING_BATCH_SIZE,
+                "storage_dtype": EMBEDDING_STORAGE_DTYPE
+            }
+            print(f"사용자 {user_id}: 임베딩 처리량 {ingest_stats['chunks_per_sec']} chunks/sec")
+            
+            # 최종 커밋 (문서 내용)
+            job.set_stage("saving")
             print(f"사용자 {user_id}: DB 커밋 중...")
             await db.commit()
-        except Exception as commit_err:
-            print(f"사용자 {user_id}: DB 커밋 오류: {str(commit_err)}")
+        except BaseException:
             await db.rollback()
-            raise HTTPException(status_code=500, detail=f"DB 커밋 실패: {str(commit_err)}")
-        
-        # FAISS 인덱스 저장
-        try:
-            print(f"사용자 {user_id}: FAISS 인덱스 저장 중...")
-            embedding_service.save_index()
-            print(f"사용자 {user_id}: 업로드 및 임베딩 완료")
-        except Exception as faiss_err:
-            print(f"사용자 {user_id}: FAISS 인덱스 저장 오류: {str(faiss_err)}")
-            # FAISS 저장 실패해도 계속 진행
-        
-        return {
-            "message": "문서가 성공적으로 업로드되었습니다.",
-            "document_id": document.id,
-            "chunks_count": len(chunks),
-            "user_id": user_id
-        }
-        
-    except HTTPException:
-        # 이미 처리된 예외는 그대로 전달
-        raise
+            if document.id is not None:
+                # 이미 커밋된 배치가 있으므로 문서와 청크를 삭제 (DELETE /documents와 같은 순서)
+                try:
+                    await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document.id))
+                    await db.execute(delete(Document).where(Document.id == document.id))
+                    await db.commit()
+                except Exception as cleanup_err:
+                    print(f"사용자 {user_id}: 실패한 업로드 문서 {document.id} 정리 실패: {cleanup_err}")
+            if indexed_ids:
+                # 삭제된 청크의 벡터가 검색되지 않도록 인덱스에서 제거
+                await embedding_service.remove_chunks_async(indexed_ids)
+            raise
+        finally:
+            if pending is not None:
+                # 추출 중인 배치가 끝난 뒤 generator 정리 (실행 중인 generator는 닫을 수 없음)
+                try:
+                    await pending
+                except BaseException:
+                    pass
+            chunk_stream.close()
+    
+    # FAISS 인덱스는 write-behind 스케줄러가 백그라운드에서 저장 (add_many_async에서 dirty 표시)
+    job.document_id = document.id
+    job.result = {
+        "document_id": document.id,
+        "chunks_count": job.total_chunks,
+        "ingest_stats": ingest_stats
+    }
+    print(f"사용자 {user_id}: 업로드 작업 {job.id} 완료 (문서 {document.id})")
+
+ingest_queue.configure(run_ingest_job)
+
+@app.post("/upload")
+async def upload_document(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """문서 업로드 (사용자별 격리)
+    
+    원본 파일을 저장하고 처리 작업을 대기열에 넣은 뒤 바로 job id를 반환합니다.
+    추출/청킹/임베딩 진행 상황은 GET /jobs/{job_id}로 확인합니다.
+    """
+    print(f"사용자 {user_id}: 문서 업로드 시작: {file.filename}")
+    print(f"환경: CloudType={os.environ.get('CLOUDTYPE_DEPLOYMENT', '0')}")
+    
+    # 사용자 쿠키 설정
+    set_user_cookie(response, user_id)
+    
+    extension = (file.filename or "").lower().split('.')[-1]
+    if extension not in SUPPORTED_UPLOAD_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 파일 형식: {extension}")
+    
+    # 업로드 파일(spool 임시 파일)을 조각 단위로 작업 디렉토리에 복사 (메모리에 전체를 올리지 않음)
+    try:
+        job = await ingest_queue.submit(user_id, file.filename, file.file)
+        print(f"사용자 {user_id}: 파일 크기: {job.size} 바이트")
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="업로드 대기열이 가득 찼습니다. 잠시 후 다시 시도해주세요.")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"사용자 {user_id}: 업로드 실패 상세 오류: {str(e)}")
-        await db.rollback()
+        print(f"사용자 {user_id}: 업로드 작업 등록 실패: {str(e)}")
         raise HTTPException(status_code=500, detail=f"업로드 실패: {str(e)}")
+    
+    print(f"사용자 {user_id}: 업로드 작업 {job.id} 등록")
+    response.status_code = 202
+    return {
+        "message": "문서 처리 작업이 등록되었습니다.",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "user_id": user_id
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_ingest_job(
+    job_id: str,
+    response: Response,
+    user_id: str = Depends(get_current_user_id)
+):
+    """업로드 작업 상태와 진행률 (임베딩된 청크 수 / 전체 청크 수)"""
+    set_user_cookie(response, user_id)
+    job = ingest_queue.get(job_id, user_id=user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job.to_dict()
 
 @app.post("/search")
 async def search_documents(
     request: Request,
     response: Response,
     query: str = Form(...),
+    ef_search: int = Form(None),
+    nprobe: int = Form(None),
+    mode: str = Form(None),
+    fusion: str = Form(None),
+    rrf_k: int = Form(None),
+    keyword_weight: float = Form(None),
+    candidates: int = Form(None),
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """문서 검색 (사용자별 격리)"""
+    """문서 검색 (사용자별 격리)
+    
+    ef_search/nprobe로 ANN 정확도를, mode(dense/keyword/hybrid)와 fusion(rrf/weighted),
+    rrf_k, keyword_weight, candidates로 hybrid 검색 방식을 요청별로 조절합니다.
+    """
     try:
         # 사용자 쿠키 설정
         set_user_cookie(response, user_id)
         
-        # 사용자별 임베딩 서비스 가져오기
-        embedding_service = await get_embedding_service(user_id)
+        # 사용자별 임베딩 서비스 가져오기 (검색 전용: 인덱스 mmap)
+        embedding_service = await get_embedding_service(user_id, read_only=True)
         
         print(f"사용자 {user_id}: 검색 쿼리 - {query}")
         
         # 유사한 청크 검색 (사용자별)
-        similar_chunks = await embedding_service.search_similar(query, k=5)
+        similar_chunks = await embedding_service.search_similar(
+            query, k=5, ef_search=ef_search, nprobe=nprobe, mode=mode, fusion=fusion,
+            rrf_k=rrf_k, keyword_weight=keyword_weight, candidates=candidates
+        )
         
         if not similar_chunks:
             return {
@@ -422,6 +423,8 @@ async def search_documents(
             "user_id": user_id
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"사용자 {user_id}: 검색 실패: {str(e)}")
         raise HTTPException(status_code=500, detail=f"검색 실패: {str(e)}")
@@ -439,8 +442,8 @@ async def chat_with_documents(
         # 사용자 쿠키 설정
         set_user_cookie(response, user_id)
         
-        # 사용자별 임베딩 서비스 가져오기
-        embedding_service = await get_embedding_service(user_id)
+        # 사용자별 임베딩 서비스 가져오기 (검색 전용: 인덱스 mmap)
+        embedding_service = await get_embedding_service(user_id, read_only=True)
         
         # CloudType 환경 감지
         IS_CLOUDTYPE = os.environ.get('CLOUDTYPE_DEPLOYMENT', '0') == '1'
@@ -607,6 +610,58 @@ async def list_documents(
             "user_id": user_id
         }
 
+@app.delete("/documents/{document_id}")
+async def delete_document(
+    document_id: int,
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """문서 삭제 - DB의 문서/청크와 사용자 인덱스의 벡터를 함께 제거"""
+    set_user_cookie(response, user_id)
+
+    document = await db.get(Document, document_id)
+    if document is None or document.user_id != user_id:
+        raise HTTPException(status_code=404, detail="문서를 찾을 수 없습니다.")
+
+    try:
+        result = await db.execute(
+            select(DocumentChunk.id).where(
+                DocumentChunk.document_id == document_id,
+                DocumentChunk.user_id == user_id
+            )
+        )
+        chunk_ids = [row[0] for row in result]
+
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
+        await db.delete(document)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"사용자 {user_id}: 문서 {document_id} 삭제 실패: {e}")
+        raise HTTPException(status_code=500, detail=f"문서 삭제 실패: {str(e)}")
+
+    # DB 커밋 후 메모리에 있는 인덱스에서만 제거 (삭제하려고 인덱스를 로드하지 않음)
+    # 메모리에 없거나 제거에 실패하면 다음 로드 때 ensure_index_fresh가 DB와 청크 ID를 비교해 재구성
+    removed_vectors = 0
+    try:
+        async with embedding_manager.pinned(user_id, load=False) as embedding_service:
+            if embedding_service is not None:
+                removed_vectors = await embedding_service.remove_chunks_async(chunk_ids)
+            else:
+                chunk_cache.discard(user_id, chunk_ids)
+    except Exception as e:
+        print(f"사용자 {user_id}: 문서 {document_id} 벡터 삭제 실패: {e}")
+
+    print(f"사용자 {user_id}: 문서 {document_id} 삭제 완료 (청크 {len(chunk_ids)}개, 벡터 {removed_vectors}개)")
+    return {
+        "message": "문서가 삭제되었습니다.",
+        "document_id": document_id,
+        "deleted_chunks": len(chunk_ids),
+        "removed_vectors": removed_vectors,
+        "user_id": user_id
+    }
+
 @app.get("/user/stats")
 async def get_user_stats(
     request: Request,
@@ -848,6 +903,8 @@ async def get_system_stats_admin(
                 "total_size_mb": round(faiss_total_size / (1024**2), 2)
             },
             "embedding_service": embedding_manager.get_stats(),
+            "ingest_jobs": ingest_queue.get_stats(),
+            "pdf_extraction": pdf_page_pool.get_stats(),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+JSON 텍스트 임베딩을 바이너리(float16/float32) 컬럼으로 변환하는 마이그레이션 스크립트
+
+사용법:
+    python migrate_embedding_to_binary.py              # embedding_vec 채우기 (JSON 유지)
+    python migrate_embedding_to_binary.py --drop-json  # 변환 후 JSON 컬럼 값 비우기
+"""
+
+import asyncio
+import sys
+from sqlalchemy import text
+from database import engine, get_db_session
+from embedding_codec import embedding_from_json, EMBEDDING_STORAGE_DTYPE
+
+BATCH_SIZE = 500
+TABLES = ["document_chunks", "documents"]
+
+async def add_binary_column(table: str):
+    """embedding_vec 컬럼 추가 (이미 존재하면 무시)"""
+    column_type = "BYTEA" if engine.dialect.name == "postgresql" else "BLOB"
+    async with engine.begin() as conn:
+        try:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN embedding_vec {column_type}"))
+            print(f"✅ {table} 테이블에 embedding_vec 컬럼 추가 완료")
+        except Exception as e:
+            if "already exists" in str(e) or "duplicate column name" in str(e).lower():
+                print(f"ℹ️  {table} 테이블의 embedding_vec 컬럼이 이미 존재합니다")
+            else:
+                print(f"❌ {table} 테이블 embedding_vec 컬럼 추가 실패: {e}")
+                raise
+
+async def convert_table(table: str, drop_json: bool) -> dict:
+    """JSON 임베딩을 배치 단위로 읽어 바이너리로 변환"""
+    stats = {"converted": 0, "failed": 0}
+    last_id = 0
+
+    while True:
+        async with get_db_session() as session:
+            result = await session.execute(text(f"""
+                SELECT id, embedding FROM {table}
+                WHERE id > :last_id AND embedding IS NOT NULL AND embedding_vec IS NULL
+                ORDER BY id
+                LIMIT :limit
+            """), {"last_id": last_id, "limit": BATCH_SIZE})
+            rows = result.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                last_id = row.id
+                try:
+                    updates.append({"id": row.id, "vec": embedding_from_json(row.embedding)})
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"  ❌ {table} id={row.id} 변환 실패: {e}")
+
+            if updates:
+                set_clause = "embedding_vec = :vec, embedding = NULL" if drop_json else "embedding_vec = :vec"
+                await session.execute(text(f"UPDATE {table} SET {set_clause} WHERE id = :id"), updates)
+                await session.commit()
+                stats["converted"] += len(updates)
+                print(f"  🔄 {table}: {stats['converted']}개 변환 완료 (마지막 id {last_id})")
+
+    return stats
+
+async def migrate_embedding_to_binary(drop_json: bool = False):
+    """모든 임베딩 테이블 마이그레이션"""
+    print(f"🔄 임베딩 바이너리 마이그레이션 시작 (저장 형식: {EMBEDDING_STORAGE_DTYPE})")
+
+    for table in TABLES:
+        try:
+            await add_binary_column(table)
+            stats = await convert_table(table, drop_json)
+            print(f"📊 {table}: 변환 {stats['converted']}개, 실패 {stats['failed']}개")
+        except Exception as e:
+            print(f"❌ {table} 마이그레이션 실패: {e}")
+
+    print("🎉 임베딩 바이너리 마이그레이션 완료!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate_embedding_to_binary(drop_json="--drop-json" in sys.argv))
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import time
+
+from embedding_executor import embedding_executor
+
+# 배치를 모으기 위해 첫 쿼리가 기다리는 최대 시간 (0이면 배칭 없이 즉시 인코딩)
+QUERY_BATCH_MAX_WAIT_MS = float(os.environ.get('QUERY_BATCH_MAX_WAIT_MS', '5'))
+# 한 번의 encode 호출에 넣을 최대 쿼리 수
+QUERY_BATCH_MAX_SIZE = int(os.environ.get('QUERY_BATCH_MAX_SIZE', '32'))
+
+class QueryMicroBatcher:
+    """동시에 들어온 /search, /chat 쿼리 임베딩을 모아 한 번의 encode 호출로 처리
+
+    max_wait_ms를 늘리면 배치가 커져 처리량이 늘고, 줄이면 p50 지연이 줄어듭니다.
+    """
+
+    def __init__(self, encode_fn, max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS,
+                 max_batch_size: int = QUERY_BATCH_MAX_SIZE, executor=embedding_executor):
+        self.encode_fn = encode_fn  # 텍스트 목록 -> (n, dim) 행렬 (동기 함수)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_batch_size = max(1, max_batch_size)
+        self.executor = executor
+        self._pending = []  # (text, future, enqueued_at)
+        self._timer = None
+
+        # 배칭 통계
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.queue_wait_seconds = 0.0
+
+    async def encode(self, text: str):
+        """쿼리 하나의 임베딩을 반환 (다른 동시 쿼리와 함께 인코딩됨)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size or self.max_wait_ms == 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """대기 중인 쿼리를 하나의 배치로 떼어 내 인코딩 시작"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        """임베딩 실행기에서 배치를 인코딩하고 각 호출자의 future를 완료"""
+        started = time.perf_counter()
+        self.batches += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.queue_wait_seconds += sum(started - enqueued_at for _, _, enqueued_at in batch)
+
+        try:
+            matrix = await self.executor.run(self.encode_fn, [text for text, _, _ in batch])
+        except Exception as e:
+            print(f"쿼리 배치 인코딩 실패 ({len(batch)}개): {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), vector in zip(batch, matrix):
+            # 호출자가 이미 취소된 경우는 건너뜀
+            if not future.done():
+                future.set_result(vector)
+
+    def get_stats(self):
+        """배칭 통계 반환"""
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_queue_wait_ms": round(self.queue_wait_seconds / self.queries * 1000, 3) if self.queries else 0.0
+        }
@@ -0,0 +1,114 @@
+import os
+import re
+import sys
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 검색 결과 캐시 최대 항목 수 (0이면 사용 안 함)
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', '1000'))
+# 캐시된 검색 결과의 유효 시간 (초)
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get('SEARCH_CACHE_TTL_SECONDS', '300'))
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_query(query: str) -> str:
+    """캐시 키용 쿼리 정규화 (NFC, 소문자, 연속 공백 하나로)"""
+    query = unicodedata.normalize('NFC', query or '')
+    return _WHITESPACE_RE.sub(' ', query).strip().lower()
+
+def _result_bytes(results) -> int:
+    """캐시 항목의 메모리 사용량 추정치 (청크 텍스트 + 결과 dict)"""
+    return sum(sys.getsizeof(result.get('text') or '') + 400 for result in results) + 200
+
+class SearchResultCache:
+    """(user_id, 정규화된 쿼리, 검색 옵션, 인덱스 버전) 키의 TTL + LRU 검색 결과 캐시
+
+    k는 항목에 함께 저장하며, 더 큰 k로 캐시된 결과가 있으면 앞부분을 잘라 반환합니다
+    (/search의 k=5 결과로 같은 쿼리의 /chat k=3 요청을 처리).
+    인덱스 버전은 업로드/삭제/재구성 때마다 바뀌므로 변경 이후의 조회는 새 키가 되어
+    예전 결과를 반환하지 않으며, 남은 예전 항목은 TTL이나 LRU로 밀려납니다.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (user_id, key) -> (만료 시각, k, 결과 목록, 추정 바이트)
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        # 적중 통계
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _pop(self, cache_key):
+        """항목 제거 및 메모리 합계 갱신 (락 내부에서 호출)"""
+        _, _, _, size = self._entries.pop(cache_key)
+        self._bytes -= size
+
+    def get(self, user_id: str, key, k: int):
+        """k개 이상으로 캐시된 유효한 결과의 앞 k개 복사본 반환 (없으면 None)"""
+        if self.max_entries == 0:
+            return None
+        cache_key = (user_id, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None or entry[1] < k:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._pop(cache_key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            results = entry[2][:k]
+        # 호출자가 결과 dict를 수정해도 캐시는 바뀌지 않도록 복사
+        return [dict(result) for result in results]
+
+    def put(self, user_id: str, key, k: int, results):
+        """k개 요청의 검색 결과 저장 (빈 결과는 오류일 수 있으므로 저장하지 않음)"""
+        if self.max_entries == 0 or not results:
+            return
+        cache_key = (user_id, key)
+        results = [dict(result) for result in results]
+        size = _result_bytes(results)
+        with self._lock:
+            existing = self._entries.get(cache_key)
+            if existing is not None:
+                if existing[1] > k and existing[0] > time.monotonic():
+                    # 더 많은 결과를 가진 유효한 항목 유지
+                    return
+                self._pop(cache_key)
+            self._entries[cache_key] = (time.monotonic() + self.ttl_seconds, k, results, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+
+    def discard_user(self, user_id: str):
+        """사용자의 모든 캐시 결과 제거"""
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == user_id]:
+                self._pop(cache_key)
+
+    def get_stats(self):
+        """캐시 적중 통계와 메모리 사용량 추정치 반환"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_mb": round(self._bytes / (1024**2), 3),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# 전역 검색 결과 캐시
+search_cache = SearchResultCache()
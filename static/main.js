@@ -88,9 +88,56 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // 업로드 작업 진행률 폴링 (/upload는 job id만 반환하고 처리는 백그라운드에서 진행)
+    async function pollUploadJob(jobId, onProgress, intervalMs = 1000) {
+        while (true) {
+            const response = await fetch(`/jobs/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.detail || '작업 상태 조회 실패');
+            }
+            if (onProgress) {
+                onProgress(job);
+            }
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
+    // 작업 상태를 사용자에게 보여줄 문구
+    function describeUploadJob(job) {
+        if (job.status === 'completed') {
+            return `업로드 완료: ${job.filename} (${job.total_chunks}개 청크)`;
+        }
+        if (job.status === 'failed') {
+            return `업로드 실패: ${job.error || '알 수 없는 오류'}`;
+        }
+        if (job.status === 'embedding' && job.total_chunks > 0) {
+            return `임베딩 중... ${job.embedded_chunks}/${job.total_chunks} 청크`;
+        }
+        if (job.status === 'embedding') {
+            // 원본을 다 읽기 전에는 전체 청크 수를 알 수 없으므로 진행률로 표시
+            return `임베딩 중... ${Math.round(job.progress * 100)}% (${job.embedded_chunks}개 청크)`;
+        }
+        const stages = {
+            queued: '대기 중...',
+            extracting: '텍스트 추출 중...',
+            saving: '저장 중...'
+        };
+        return stages[job.status] || '처리 중...';
+    }
+    
+    // templates/index.html의 업로드 스크립트에서도 사용
+    window.pollUploadJob = pollUploadJob;
+    window.describeUploadJob = describeUploadJob;
+    
     // 파일 업로드 폼 제출 이벤트 처리
     if (uploadForm) {
         uploadForm.addEventListener('submit', async function(e) {
+            // 페이지 스크립트가 이미 업로드를 처리했으면 중복 업로드하지 않음
+            if (e.defaultPrevented) return;
             e.preventDefault();
             
             const formData = new FormData(uploadForm);
@@ -112,13 +159,20 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
                 
                 const result = await response.json();
-                
-                if (statusElement) {
-                    statusElement.textContent = result.message;
+                if (!response.ok) {
+                    throw new Error(result.detail || result.message || '업로드 실패');
                 }
                 
+                const job = await pollUploadJob(result.job_id, job => {
+                    if (statusElement) {
+                        statusElement.textContent = describeUploadJob(job);
+                    }
+                });
+                
                 // 문서 목록 새로고침
-                refreshDocumentsList();
+                if (job.status === 'completed') {
+                    refreshDocumentsList();
+                }
                 
             } catch (error) {
                 console.error('업로드 오류:', error);
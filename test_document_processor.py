@@ -0,0 +1,34 @@
+"""문서 텍스트 추출 테스트"""
+import pytest
+from PyPDF2.errors import PdfReadError
+
+from document_processor import DocumentProcessor
+
+
+def test_unreadable_pdf_raises_from_stream():
+    with pytest.raises(PdfReadError):
+        list(DocumentProcessor.iter_text("broken.pdf", b"%PDF-1.4 not really a pdf"))
+
+
+def test_pdf_error_after_some_pages_is_not_truncated(monkeypatch):
+    def pages(source, stream, progress=None):
+        yield "첫 페이지"
+        raise PdfReadError("손상된 xref")
+
+    monkeypatch.setattr(DocumentProcessor, "_iter_pdf_pages", staticmethod(pages))
+    stream = DocumentProcessor.iter_text("partial.pdf", b"%PDF-1.4")
+    assert next(stream) == "첫 페이지"
+    with pytest.raises(PdfReadError):
+        next(stream)
+
+
+def test_extract_text_keeps_empty_string_on_error():
+    assert DocumentProcessor.extract_text("broken.pdf", b"garbage") == ""
+    assert DocumentProcessor.extract_text_from_pdf(b"garbage") == ""
+    with pytest.raises(ValueError):
+        DocumentProcessor.extract_text("image.png", b"")
+
+
+def test_txt_stream_round_trip():
+    text = "서울은 한국의 수도입니다. " * 50
+    assert DocumentProcessor.extract_text("a.txt", text.encode("utf-8")) == DocumentProcessor.clean_text(text)
@@ -0,0 +1,59 @@
+"""DB에 저장된 임베딩과 인덱스를 비교하는 웜 스타트 확인 테스트"""
+import numpy as np
+
+from ann_index import index_ids
+from database import Document, DocumentChunk, async_session
+from embedding_codec import encode_embedding
+
+
+async def store_chunks(user_id, count):
+    """임베딩이 저장된 청크를 DB에 추가하고 ID 목록 반환"""
+    async with async_session() as db:
+        document = Document(user_id=user_id, filename="doc.txt", content="")
+        db.add(document)
+        await db.flush()
+        rng = np.random.default_rng(0)
+        chunks = [
+            DocumentChunk(user_id=user_id, document_id=document.id, chunk_text=f"청크 {i}", chunk_index=i,
+                          embedding_vec=encode_embedding(rng.standard_normal(384).astype('float32')))
+            for i in range(count)
+        ]
+        db.add_all(chunks)
+        await db.commit()
+        return [chunk.id for chunk in chunks]
+
+
+def indexed_ids(service):
+    return sorted(index_ids(service._faiss, service.index).tolist())
+
+
+def test_same_count_with_different_ids_triggers_rebuild(service, run):
+    async def scenario():
+        ids = await store_chunks(service.user_id, 5)
+        # 벡터 수는 같지만 삭제된 청크 대신 DB에 없는 청크를 담은 인덱스
+        service.add_many(ids[:4] + [ids[-1] + 1000], ["x"] * 5)
+        await service.ensure_index_fresh()
+        return ids
+
+    ids = run(scenario())
+    assert indexed_ids(service) == ids
+    assert service._freshness_checked
+
+
+def test_stale_vectors_are_dropped_when_db_is_empty(service, run):
+    async def scenario():
+        service.add_many([1, 2, 3], ["x"] * 3)
+        await service.ensure_index_fresh()
+
+    run(scenario())
+    assert service.index.ntotal == 0
+
+
+def test_matching_index_is_not_rebuilt(service, run):
+    async def scenario():
+        ids = await store_chunks(service.user_id, 3)
+        service.add_many(ids, ["x"] * 3)
+        await service.ensure_index_fresh()
+
+    run(scenario())
+    assert service.last_rebuild is None
@@ -0,0 +1,206 @@
+"""사용자 인덱스의 세그먼트 저장 테스트
+
+디스크에 기록된 세그먼트를 새 서비스로 다시 읽어 메모리 인덱스와 같은 벡터를 담는지 확인합니다.
+"""
+import numpy as np
+
+from ann_index import index_ids
+from lightweight_embedding import UserEmbeddingService
+
+
+def texts(ids):
+    return [f"청크 {chunk_id} 본문" for chunk_id in ids]
+
+
+def add(service, ids):
+    ids = list(ids)
+    service.add_many(ids, texts(ids))
+
+
+def reload(service):
+    """디스크의 세그먼트만으로 같은 사용자의 인덱스를 다시 로드"""
+    reloaded = UserEmbeddingService(service.user_id)
+    reloaded._load_faiss()
+    return reloaded
+
+
+def live_ids(service):
+    ids = index_ids(service._faiss, service.index)
+    return sorted(set(ids.tolist()) - service._tombstones)
+
+
+def assert_disk_matches(service):
+    reloaded = reload(service)
+    assert live_ids(reloaded) == live_ids(service)
+    np.testing.assert_allclose(
+        reloaded.index.reconstruct_batch(np.array(live_ids(service), dtype='int64')),
+        service.index.reconstruct_batch(np.array(live_ids(service), dtype='int64')),
+        rtol=1e-2, atol=1e-2
+    )
+
+
+def test_in_place_delete_during_delta_write_forces_full_rewrite(service, monkeypatch):
+    add(service, range(1, 101))
+    service.save_index()
+    add(service, range(101, 111))
+
+    append_delta = service.segments.append_delta
+
+    def append_while_deleting(*args, **kwargs):
+        # delta를 기록하는 도중 문서 삭제로 앞쪽 행이 제자리에서 제거됨
+        service.remove_chunks(range(1, 11))
+        return append_delta(*args, **kwargs)
+
+    monkeypatch.setattr(service.segments, "append_delta", append_while_deleting)
+    service.save_index()
+    monkeypatch.undo()
+
+    # 삭제로 줄어든 행 수가 다시 이전 저장 시점의 행 수와 같아지는 경우
+    add(service, range(111, 121))
+    assert service.index.ntotal == 110
+    service.save_index()
+
+    assert_disk_matches(service)
+    assert 1 not in live_ids(reload(service))
+
+
+def test_missing_manifest_falls_back_to_full_write(service):
+    add(service, range(1, 51))
+    service.save_index()
+    add(service, range(51, 61))
+    # 사용자 파일 정리 등으로 manifest가 사라진 경우
+    service.segments.delete_all()
+
+    service.save_index()
+
+    manifest = service.segments.read_manifest()
+    assert manifest["base"]["rows"] == 60 and manifest["deltas"] == []
+    assert_disk_matches(service)
+
+
+def test_tombstone_only_change_without_manifest_rewrites_base(service):
+    add(service, range(1, 21))
+    service.save_index()
+    service._set_tombstones({3, 4})
+    service.segments.delete_all()
+
+    service.save_index()
+
+    manifest = service.segments.read_manifest()
+    assert manifest["base"]["rows"] == 20
+    assert manifest["tombstones"] == [3, 4]
+
+
+def test_save_failure_reaches_flusher_and_is_retried(service, monkeypatch):
+    from index_flusher import IndexFlushScheduler
+
+    flusher = IndexFlushScheduler(debounce_seconds=3600, max_delay_seconds=3600)
+    add(service, range(1, 11))
+
+    def fail(*args, **kwargs):
+        raise OSError("디스크 가득 참")
+
+    monkeypatch.setattr(service.segments, "write_base_vectors", fail)
+    flusher.mark_dirty(service)
+    assert flusher.flush(service) is False
+    assert flusher.failures == 1
+    assert flusher.is_dirty(service)
+
+    monkeypatch.undo()
+    assert flusher.flush(service) is True
+    assert flusher.flushes == 1
+    assert_disk_matches(service)
+
+
+def use_hnsw(monkeypatch):
+    """코퍼스 크기와 관계없이 HNSW를 목표 인덱스로 선택"""
+    import lightweight_embedding
+    monkeypatch.setattr(lightweight_embedding, "choose_index_kind", lambda count: 'hnsw')
+
+
+def wait_for_migration(service):
+    if service._migration_future is not None:
+        service._migration_future.result()
+
+
+def test_flat_delete_removes_rows_in_place(service):
+    add(service, range(1, 21))
+    service.save_index()
+
+    assert service.remove_chunks(range(1, 6)) == 5
+    assert service.index.ntotal == 15 and not service._tombstones
+    service.save_index()
+
+    manifest = service.segments.read_manifest()
+    assert manifest["base"]["rows"] == 15 and manifest["deltas"] == [] and manifest["tombstones"] == []
+    assert_disk_matches(service)
+
+
+def test_hnsw_delete_marks_tombstones(service, monkeypatch):
+    use_hnsw(monkeypatch)
+    add(service, range(1, 41))
+    wait_for_migration(service)
+    assert service.get_index_kind() == 'hnsw'
+
+    assert service.remove_chunks([1, 2]) == 2
+    wait_for_migration(service)
+    assert service.index.ntotal == 40 and service._tombstones == {1, 2}
+    assert service.live_count() == 38
+    _, labels = service._search_index(service.index.reconstruct(1), 10)
+    assert 1 not in labels[0].tolist()
+
+    service.save_index()
+    manifest = service.segments.read_manifest()
+    assert manifest["kind"] == 'hnsw' and manifest["tombstones"] == [1, 2]
+    reloaded = reload(service)
+    assert reloaded.get_index_kind() == 'hnsw' and reloaded._tombstones == {1, 2}
+    assert live_ids(reloaded) == live_ids(service)
+
+
+def test_migration_drops_tombstoned_vectors(service, monkeypatch):
+    use_hnsw(monkeypatch)
+    add(service, range(1, 31))
+    wait_for_migration(service)
+    service.save_index()
+
+    # 삭제 표시 비율이 INDEX_TOMBSTONE_RATIO를 넘으면 인덱스를 다시 만듦
+    service.remove_chunks(range(1, 11))
+    wait_for_migration(service)
+
+    assert service.index.ntotal == 20 and not service._tombstones
+    assert service.last_migration["dropped_tombstones"] == 10
+    service.save_index()
+    assert service.segments.read_manifest()["tombstones"] == []
+    assert_disk_matches(service)
+
+
+def test_flat_deltas_are_compacted(service):
+    from lightweight_embedding import SEGMENT_MAX_DELTAS
+
+    add(service, range(1, 101))
+    service.save_index()
+    for start in range(101, 101 + SEGMENT_MAX_DELTAS):
+        add(service, [start])
+        service.save_index()
+    service._compaction_future.result()
+
+    manifest = service.segments.read_manifest()
+    assert manifest["deltas"] == [] and manifest["base"]["rows"] == 100 + SEGMENT_MAX_DELTAS
+    assert service.last_compaction["merged_deltas"] == SEGMENT_MAX_DELTAS
+    assert_disk_matches(service)
+
+
+def test_hnsw_deltas_are_compacted_from_memory(service, monkeypatch):
+    use_hnsw(monkeypatch)
+    add(service, range(1, 41))
+    wait_for_migration(service)
+    service.save_index()
+    add(service, range(41, 46))
+    service.save_index()
+    assert len(service.segments.read_manifest()["deltas"]) == 1
+
+    result = service.compact_segments()
+
+    manifest = service.segments.read_manifest()
+    assert result["kind"] == 'hnsw' and manifest["deltas"] == [] and manifest["base"]["rows"] == 45
+    assert_disk_matches(service)
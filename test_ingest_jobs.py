@@ -0,0 +1,116 @@
+"""업로드 작업(추출 -> 청킹 -> 임베딩 -> 저장)과 업로드 크기 제한 테스트"""
+import os
+
+from sqlalchemy import select
+
+import main
+from ann_index import index_ids
+from conftest import wait_for_job
+from database import DocumentChunk, async_session
+from document_processor import DocumentProcessor
+from index_flusher import index_flusher
+from ingest_jobs import MAX_UPLOAD_BYTES, ingest_queue
+from lightweight_embedding import UserEmbeddingService
+
+
+def upload(client, filename, text):
+    response = client.post("/upload", files={"file": (filename, text.encode("utf-8"), "text/plain")})
+    return wait_for_job(client, response)
+
+
+def stored_chunk_ids(client, user_id):
+    """DB에 임베딩이 저장된 청크 ID"""
+    async def query():
+        async with async_session() as session:
+            result = await session.execute(select(DocumentChunk.id).where(
+                DocumentChunk.user_id == user_id, DocumentChunk.embedding_vec.isnot(None)))
+            return sorted(row[0] for row in result)
+    return client.portal.call(query)
+
+
+def disk_chunk_ids(user_id):
+    """디스크의 세그먼트만으로 로드한 인덱스의 검색 가능한 청크 ID"""
+    service = UserEmbeddingService(user_id)
+    service._load_faiss()
+    return sorted(set(index_ids(service._faiss, service.index).tolist()) - service._tombstones)
+
+
+def fail_after(monkeypatch, chunks, before_failure=None):
+    """청크를 chunks개 만든 뒤 실패하는 업로드 파이프라인"""
+    original = DocumentProcessor.iter_chunks
+
+    def failing_chunks(*args, **kwargs):
+        for i, chunk in enumerate(original(*args, **kwargs)):
+            if i == chunks:
+                if before_failure is not None:
+                    before_failure()
+                raise RuntimeError("청킹 중 오류")
+            yield chunk
+
+    monkeypatch.setattr(DocumentProcessor, "iter_chunks", staticmethod(failing_chunks))
+
+
+def test_failed_ingest_leaves_no_vectors_on_disk(client, monkeypatch):
+    ok = upload(client, "ok.txt", "서울은 한국의 수도입니다. " * 300)
+    assert ok["status"] == "completed"
+    user_id = ok["user_id"]
+
+    # 실패하기 전에 write-behind 기록이 실행되어 실패할 문서의 벡터 일부가 이미 디스크에 있는 상황
+    fail_after(monkeypatch, 2 * main.INGEST_PROGRESS_BATCH, before_failure=index_flusher.flush_all)
+    failed = upload(client, "bad.txt", "Paris is the capital of France. " * 10000)
+    assert failed["status"] == "failed"
+    monkeypatch.undo()
+
+    index_flusher.flush_all()
+    stored = stored_chunk_ids(client, user_id)
+    assert stored and disk_chunk_ids(user_id) == stored
+    documents = client.get("/documents").json()["documents"]
+    assert "bad.txt" not in [document["filename"] for document in documents]
+
+
+def test_unreadable_pdf_fails_job_and_rolls_back(client):
+    response = client.post("/upload", files={"file": ("broken.pdf", b"%PDF-1.4 broken", "application/pdf")})
+    job = wait_for_job(client, response)
+
+    assert job["status"] == "failed" and job["document_id"] is None
+    documents = client.get("/documents").json()["documents"]
+    assert "broken.pdf" not in [document["filename"] for document in documents]
+
+
+def test_unsupported_extension_is_rejected(client):
+    response = client.post("/upload", files={"file": ("image.png", b"png", "image/png")})
+    assert response.status_code == 400
+
+
+def rejected_without_leftovers(client, **request):
+    before = set(os.listdir(ingest_queue.upload_dir)) if os.path.isdir(ingest_queue.upload_dir) else set()
+    response = client.post("/upload", **request)
+    after = set(os.listdir(ingest_queue.upload_dir)) if os.path.isdir(ingest_queue.upload_dir) else set()
+    assert response.status_code == 413, response.text
+    assert after <= before
+    return response
+
+
+def test_upload_over_limit_rejected_by_content_length(client):
+    body = b"a" * (MAX_UPLOAD_BYTES * 3)
+    rejected_without_leftovers(client, files={"file": ("big.txt", body, "text/plain")})
+
+
+def test_upload_over_limit_rejected_while_copying(client):
+    # 본문 제한(파일 제한 + 폼 여유분)은 통과하지만 파일 자체는 제한을 넘음
+    body = b"a" * (MAX_UPLOAD_BYTES + MAX_UPLOAD_BYTES // 2)
+    response = rejected_without_leftovers(client, files={"file": ("big.txt", body, "text/plain")})
+    assert "너무 큽니다" in response.json()["detail"]
+
+
+def test_chunked_upload_over_limit_is_cut_off(client):
+    body = (b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="big.txt"\r\n'
+            b'Content-Type: text/plain\r\n\r\n' + b"a" * (MAX_UPLOAD_BYTES * 3) + b'\r\n--boundary--\r\n')
+
+    def stream():
+        # Content-Length 없이 조각으로 전송
+        for offset in range(0, len(body), 64 * 1024):
+            yield body[offset:offset + 64 * 1024]
+
+    rejected_without_leftovers(client, content=stream(),
+                               headers={"content-type": "multipart/form-data; boundary=boundary"})
@@ -0,0 +1,84 @@
+"""사용자 임베딩 서비스 매니저의 제거(eviction) 테스트"""
+import asyncio
+
+from index_flusher import IndexFlushScheduler
+from lightweight_embedding import EmbeddingServiceManager
+
+
+def test_pinned_service_is_not_evicted_until_released(user_id):
+    manager = EmbeddingServiceManager(max_services=1)
+    other = user_id + "_other"
+
+    async def scenario():
+        async with manager.pinned(user_id) as pinned_service:
+            # 업로드 작업 중에 다른 사용자의 요청이 들어와 서비스 수를 넘김
+            await manager.get_service(other)
+            assert manager._services.get(user_id) is pinned_service
+            assert pinned_service.resident
+        # 고정이 풀리면 미뤄진 제거가 처리됨
+        await asyncio.gather(*manager._evicting.values())
+        return pinned_service
+
+    service = asyncio.run(scenario())
+    assert user_id not in manager._services
+    assert not service.resident
+    assert manager._pins == {}
+
+
+def test_pinned_loaded_skips_missing_service(user_id):
+    manager = EmbeddingServiceManager()
+
+    async def scenario():
+        async with manager.pinned(user_id, load=False) as service:
+            return service, dict(manager._pins)
+
+    assert asyncio.run(scenario()) == (None, {})
+
+
+def test_retired_service_is_not_written(service):
+    flusher = IndexFlushScheduler(debounce_seconds=3600, max_delay_seconds=3600)
+    service.add_many([1, 2, 3], ["x"] * 3)
+    flusher.mark_dirty(service)
+    service.resident = False
+
+    assert flusher.flush(service) is False
+    flusher.mark_dirty(service)
+    assert not flusher.is_dirty(service)
+    assert service.segments.read_manifest() is None
+
+
+def test_user_locks_are_dropped_with_their_services(user_id):
+    manager = EmbeddingServiceManager(max_services=1)
+    users = [f"{user_id}_{i}" for i in range(5)]
+
+    async def scenario():
+        for other in users:
+            await manager.get_service(other)
+            await manager.get_loaded(other + "_missing")
+        await manager.purge_user(users[-1])
+
+    asyncio.run(scenario())
+    assert manager._user_locks == {}
+
+
+def test_touch_uses_cached_size_without_reading_manifest(user_id, monkeypatch):
+    manager = EmbeddingServiceManager()
+
+    async def scenario():
+        service = await manager.get_service(user_id)
+        reads = []
+        monkeypatch.setattr(service.segments, "read_manifest", lambda: reads.append(1))
+        for _ in range(3):
+            await manager.get_service(user_id)
+        assert reads == []
+
+        # 벡터가 추가되면 크기 추정치가 갱신됨
+        before = manager._sizes[user_id]
+        await service.add_many_async(list(range(1, 101)), ["x"] * 100)
+        await manager.get_service(user_id)
+        assert manager._sizes[user_id] > before
+        await service.remove_chunks_async(range(1, 51))
+        await manager.get_service(user_id)
+        assert manager._sizes[user_id] == service.memory_bytes()
+
+    asyncio.run(scenario())
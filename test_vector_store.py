@@ -0,0 +1,133 @@
+"""세그먼트 파일(base + delta)과 manifest 테스트"""
+import glob
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from ann_index import build_index, search_params
+from vector_store import MmapFlatIndex, SegmentStore, load_vectors, save_vectors
+
+DIMENSION = 8
+
+
+def random_vectors(count, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path / "user_"))
+
+
+def segment_files(store):
+    return sorted(os.path.basename(path) for path in glob.glob(store.prefix + "*-*"))
+
+
+def test_vectors_round_trip_with_ids(tmp_path):
+    path = str(tmp_path / "vectors.npy")
+    vectors = random_vectors(5)
+    save_vectors(path, [10, 11, 12, 13, 14], vectors)
+
+    for mmap in (False, True):
+        ids, loaded = load_vectors(path, mmap=mmap)
+        assert ids.tolist() == [10, 11, 12, 13, 14]
+        np.testing.assert_array_equal(loaded, vectors)
+
+
+def test_base_delta_and_tombstones_in_manifest(store):
+    vectors = random_vectors(15)
+    assert not store.exists() and store.read_manifest() is None
+
+    store.write_base_vectors(np.arange(10), vectors[:10])
+    store.append_delta(np.arange(10, 15), vectors[10:], tombstones=[3])
+    manifest = store.set_tombstones([3, 4])
+
+    assert store.read_manifest() == manifest
+    assert manifest["kind"] == "flat"
+    assert manifest["base"]["rows"] == 10
+    assert SegmentStore.delta_rows(manifest) == 5
+    assert SegmentStore.total_rows(manifest) == 15
+    assert manifest["tombstones"] == [3, 4]
+    [(delta_ids, delta_vectors)] = store.load_deltas(manifest)
+    assert delta_ids.tolist() == list(range(10, 15))
+    np.testing.assert_array_equal(delta_vectors, vectors[10:])
+
+
+def test_compaction_merges_deltas_into_one_base(store):
+    vectors = random_vectors(30)
+    store.write_base_vectors(np.arange(10), vectors[:10])
+    for start in (10, 20):
+        store.append_delta(np.arange(start, start + 10), vectors[start:start + 10], tombstones=[1])
+
+    manifest = store.compact_flat(store.read_manifest())
+
+    assert manifest["deltas"] == [] and manifest["base"]["rows"] == 30
+    assert manifest["tombstones"] == [1]
+    ids, merged = load_vectors(store.path(manifest["base"]["file"]))
+    assert ids.tolist() == list(range(30))
+    np.testing.assert_array_equal(merged, vectors)
+    # 병합 전 세그먼트 파일은 정리됨
+    assert segment_files(store) == [manifest["base"]["file"]]
+
+
+def test_new_base_removes_unreferenced_segments(store):
+    vectors = random_vectors(4)
+    store.write_base_vectors([1, 2], vectors[:2])
+    store.append_delta([3, 4], vectors[2:])
+    # 중단된 기록이 남긴 파일
+    save_vectors(store.path(os.path.basename(store.prefix) + "delta-000099.npy"), [9], vectors[:1])
+
+    manifest = store.write_base_vectors([1, 2, 3, 4], vectors)
+
+    assert segment_files(store) == [manifest["base"]["file"]]
+
+
+def test_faiss_base_segment(store):
+    vectors = random_vectors(50)
+    index = build_index(faiss, 'hnsw', DIMENSION, vectors, np.arange(100, 150))
+    manifest = store.write_base_index(faiss, index, 'hnsw', tombstones=[101])
+
+    loaded = faiss.read_index(store.path(manifest["base"]["file"]))
+    assert manifest["kind"] == 'hnsw' and manifest["base"]["rows"] == 50
+    assert loaded.ntotal == 50
+
+
+def test_appending_without_manifest_fails(store):
+    with pytest.raises(FileNotFoundError):
+        store.append_delta([1], random_vectors(1))
+    with pytest.raises(FileNotFoundError):
+        store.set_tombstones([1])
+
+
+def test_delete_all(store):
+    vectors = random_vectors(4)
+    store.write_base_vectors([1, 2], vectors[:2])
+    store.append_delta([3, 4], vectors[2:])
+
+    assert store.delete_all() == 3
+    assert not store.exists() and segment_files(store) == []
+
+
+def test_mmap_index_matches_faiss_and_skips_excluded_ids(tmp_path):
+    vectors = random_vectors(40, seed=1)
+    ids = np.arange(1000, 1040)
+    segments = []
+    for part, rows in enumerate((slice(0, 25), slice(25, 40))):
+        path = str(tmp_path / f"segment-{part}.npy")
+        save_vectors(path, ids[rows], vectors[rows])
+        segments.append(load_vectors(path, mmap=True))
+    mmap_index = MmapFlatIndex(segments, DIMENSION)
+    flat = build_index(faiss, 'flat', DIMENSION, vectors, ids)
+    queries = random_vectors(3, seed=2)
+
+    assert mmap_index.ntotal == 40
+    np.testing.assert_array_equal(mmap_index.search(queries, 5)[1], flat.search(queries, 5)[1])
+
+    excluded = flat.search(queries[:1], 2)[1][0]
+    params = search_params(faiss, flat, exclude_ids=excluded)
+    labels = mmap_index.search(queries[:1], 5, params=params)[1][0]
+    assert not set(excluded.tolist()) & set(labels.tolist())
+    np.testing.assert_array_equal(labels, flat.search(queries[:1], 5, params=params)[1][0])
@@ -1,65 +1,79 @@
 import re
 import unicodedata
 
-class TextCleaner:
-    """PostgreSQL과 호환되는 텍스트 정제 유틸리티"""
-    
-    @staticmethod
-    def clean_for_postgresql(text):
-        """PostgreSQL에 안전하게 저장할 수 있도록 텍스트를 정제합니다."""
-        if not text:
-            return ""
-        
-        # 1. null 바이트 제거
-        text = text.replace('\x00', '')
-        
-        # 2. 대체 문자 제거
-        text = text.replace('\ufffd', '')
-        
-        # 3. 기타 제어 문자 제거 (탭, 개행, 캐리지 리턴은 유지)
-        text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-        
-        # 4. Unicode 정규화 (NFD -> NFC)
+# 유지하는 제어 문자 (공백 정리 단계에서 공백 하나로 바뀜)
+_KEEP_CONTROL = '\t\n\r'
+
+def _build_delete_pattern():
+    """BMP의 제어/형식/서러게이트/개인용/미할당(Unicode 범주 C) 문자와 대체 문자(U+FFFD)를 지우는 정규식
+
+    지울 문자 표를 모듈 로드 시 한 번 계산해 연속 구간으로 묶은 문자 클래스로 컴파일합니다.
+    str.translate에 dict 표를 주면 문자마다 dict 조회를 하지만 BMP 문자 클래스는 비트맵으로 검사하므로 훨씬 빠릅니다.
+    """
+    ranges = []
+    for code in range(0x10000):
+        char = chr(code)
+        if (unicodedata.category(char)[0] == 'C' and char not in _KEEP_CONTROL) or code == 0xFFFD:
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    members = ''.join(f'\\u{start:04x}' if start == end else f'\\u{start:04x}-\\u{end:04x}' for start, end in ranges)
+    return re.compile(f'[{members}]+')
+
+# 모듈 로드 시 한 번만 계산 (BMP 65,536자 범주 조회)
+_DELETE_RE = _build_delete_pattern()
+# BMP 밖 문자(이모지, 확장 한자, 보조 평면의 형식/개인용 문자 등)는 있을 때만 그 구간의 범주를 직접 확인
+_ASTRAL_RE = re.compile('[\U00010000-\U0010FFFF]+')
+# 공백 하나가 아닌 공백(연속 공백, 탭, 개행 등)만 찾아 바꿈 - 단어 사이 공백마다 치환하지 않음
+_WHITESPACE_RE = re.compile(r'\s{2,}|[^\S ]')
+
+def _strip_astral_controls(match):
+    """BMP 밖 문자 구간에서 범주 C 문자만 제거"""
+    return ''.join(char for char in match.group() if unicodedata.category(char)[0] != 'C')
+
+def clean_text(text):
+    """PostgreSQL에 안전하게 저장하고 검색/청킹에 쓸 수 있도록 텍스트 정제
+
+    1. 제어/형식/서러게이트/개인용/미할당 문자와 대체 문자 제거 (null 바이트 포함, 탭/개행은 유지)
+    2. Unicode 정규화 (NFC, 이미 NFC이면 건너뜀)
+    3. 연속된 공백(줄바꿈 포함)을 공백 하나로, 앞뒤 공백 제거
+
+    각 단계는 미리 컴파일한 정규식 한 번으로 처리하므로 문자마다 Python 코드로
+    unicodedata.category를 호출하지 않습니다 (BMP 밖 문자가 있을 때 그 구간만 예외).
+    """
+    if not text:
+        return ""
+
+    text = _DELETE_RE.sub('', str(text))
+    if _ASTRAL_RE.search(text):
+        text = _ASTRAL_RE.sub(_strip_astral_controls, text)
+
+    # 제어 문자를 먼저 지워야 그 사이에 끼어 있던 결합 문자까지 정규화됨
+    if not unicodedata.is_normalized('NFC', text):
         text = unicodedata.normalize('NFC', text)
-        
-        # 5. 비인쇄 가능한 Unicode 문자 제거
-        text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char in '\t\n\r')
-        
-        # 6. 연속된 공백 정리
-        text = re.sub(r'\s+', ' ', text)
-        
-        # 7. 앞뒤 공백 제거
-        text = text.strip()
-        
+
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+def validate_utf8(text):
+    """UTF-8 인코딩이 유효한지 확인합니다."""
+    try:
+        text.encode('utf-8').decode('utf-8')
+        return True
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return False
+
+def safe_truncate(text, max_length=1000000):
+    """텍스트를 안전하게 자릅니다. (UTF-8 문자 경계 고려)"""
+    if len(text) * 4 <= max_length or len(text.encode('utf-8')) <= max_length:
         return text
-    
-    @staticmethod
-    def validate_utf8(text):
-        """UTF-8 인코딩이 유효한지 확인합니다."""
-        try:
-            text.encode('utf-8').decode('utf-8')
-            return True
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            return False
-    
-    @staticmethod
-    def safe_truncate(text, max_length=1000000):
-        """텍스트를 안전하게 자릅니다. (UTF-8 문자 경계 고려)"""
-        if len(text.encode('utf-8')) <= max_length:
-            return text
-        
-        # 바이트 단위로 자르되, 문자 경계를 고려
-        encoded = text.encode('utf-8')
-        truncated = encoded[:max_length]
-        
-        # 불완전한 UTF-8 시퀀스 제거
-        while truncated and truncated[-1] & 0x80:
-            if truncated[-1] & 0x40:
-                break
-            truncated = truncated[:-1]
-        
-        try:
-            return truncated.decode('utf-8')
-        except UnicodeDecodeError:
-            # 안전하게 처리
-            return truncated.decode('utf-8', errors='ignore')
+
+    # 바이트 단위로 자르되, 문자 경계를 고려 (errors='ignore'로 잘린 마지막 문자의 남은 바이트 제거)
+    return text.encode('utf-8')[:max_length].decode('utf-8', errors='ignore')
+
+class TextCleaner:
+    """PostgreSQL과 호환되는 텍스트 정제 유틸리티 (모듈 함수와 같은 정제 엔진)"""
+
+    clean_for_postgresql = staticmethod(clean_text)
+    validate_utf8 = staticmethod(validate_utf8)
+    safe_truncate = staticmethod(safe_truncate)
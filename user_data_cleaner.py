@@ -15,6 +15,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, func, text
 from database import get_db_session, Document, DocumentChunk
 from user_session import UserSessionManager
+from vector_store import SegmentStore
 
 class UserDataCleaner:
     def __init__(self):
@@ -52,12 +53,15 @@ class UserDataCleaner:
             return users_data
     
     def check_faiss_index_exists(self, user_id: str) -> bool:
-        """사용자의 FAISS 인덱스 파일 존재 여부 확인"""
+        """사용자의 FAISS 인덱스 존재 여부 확인 (세그먼트 manifest 또는 이전 형식의 단일 인덱스 파일)"""
         if not os.path.exists(self.faiss_index_dir):
             return False
         
-        pattern = os.path.join(self.faiss_index_dir, f"{user_id}_*.index")
-        return len(glob.glob(pattern)) > 0
+        segments = SegmentStore(os.path.join(self.faiss_index_dir, f"{user_id}_"))
+        if os.path.exists(segments.manifest_path):
+            return True
+        legacy_paths = [os.path.join(self.faiss_index_dir, f"{user_id}{extension}") for extension in (".index", ".vecs.npy")]
+        return any(os.path.exists(path) for path in legacy_paths)
     
     def get_faiss_index_files(self, user_id: str) -> list:
         """사용자의 FAISS 인덱스 파일 목록 반환"""
@@ -115,17 +119,16 @@ class UserDataCleaner:
                         )
                         stats["deleted_documents"] += doc_result.rowcount
                         
-                        # 3. FAISS 인덱스 파일 삭제
-                        faiss_files = self.get_faiss_index_files(user_id)
-                        for file_path in faiss_files:
-                            try:
-                                os.remove(file_path)
-                                stats["deleted_faiss_files"] += 1
-                                print(f"  ✅ FAISS 파일 삭제: {file_path}")
-                            except Exception as e:
-                                error_msg = f"FAISS 파일 삭제 실패 ({file_path}): {e}"
-                                print(f"  ❌ {error_msg}")
-                                stats["errors"].append(error_msg)
+                        # 3. 메모리의 임베딩 서비스 폐기 및 FAISS 인덱스 파일 삭제
+                        try:
+                            from lightweight_embedding import embedding_manager
+                            removed = await embedding_manager.purge_user(user_id)
+                            stats["deleted_faiss_files"] += removed
+                            print(f"  ✅ FAISS 파일 {removed}개 삭제")
+                        except Exception as e:
+                            error_msg = f"FAISS 파일 삭제 실패 ({user_id}): {e}"
+                            print(f"  ❌ {error_msg}")
+                            stats["errors"].append(error_msg)
                         
                         stats["inactive_users"] += 1
                         print(f"  ✅ 사용자 {user_id} 데이터 정리 완료")
@@ -106,6 +106,7 @@ class UserSessionManager:
                 stmt = select(User).where(User.last_active < cutoff_time)
                 result = await session.execute(stmt)
                 old_users = result.scalars().all()
+                old_user_ids = [user.id for user in old_users]
                 
                 for user in old_users:
                     print(f"오래된 사용자 데이터 정리: {user.id}")
@@ -132,6 +133,11 @@ class UserSessionManager:
                     print(f"사용자 {user.id}: {len(documents)}개 문서, {len(chunks)}개 청크 정리됨")
                 
                 await session.commit()
+                
+                # 메모리의 임베딩 서비스와 인덱스 파일도 함께 삭제
+                from lightweight_embedding import embedding_manager
+                for user_id in old_user_ids:
+                    await embedding_manager.purge_user(user_id)
                 print(f"{len(old_users)}개의 오래된 세션 및 연관 데이터 정리 완료")
                 
         except Exception as e:
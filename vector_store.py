@@ -0,0 +1,253 @@
+import os
+import glob
+import json
+
+import numpy as np
+
+MANIFEST_FORMAT = 1
+
+def flat_dtype(dimension: int) -> np.dtype:
+    """청크 ID(int64)와 벡터(float32)를 한 행에 담는 구조체 dtype"""
+    return np.dtype([('id', '<i8'), ('vector', '<f4', (dimension,))])
+
+def save_vectors(path: str, ids, vectors) -> None:
+    """청크 ID와 벡터를 하나의 .npy 파일로 원자적으로 저장 (임시 파일 기록 후 교체)
+
+    ID와 벡터가 같은 파일의 같은 행에 있으므로 서로 어긋날 수 없습니다.
+    """
+    vectors = np.asarray(vectors, dtype='float32')
+    dimension = vectors.shape[1] if vectors.ndim == 2 else 0
+    rows = np.empty(len(vectors), dtype=flat_dtype(dimension))
+    rows['id'] = np.asarray(ids, dtype='int64')
+    rows['vector'] = vectors
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_vectors(path: str, mmap: bool = False):
+    """.npy 파일에서 (ids, vectors) 로드
+
+    mmap=True면 읽기 전용 memory map으로 열어 페이지 캐시를 공유합니다.
+    반환되는 벡터 뷰는 행 간격이 있지만 BLAS가 그대로 사용할 수 있는 배치입니다.
+    ID가 없는 예전 형식(float32 행렬)이면 ids는 None입니다.
+    """
+    rows = np.load(path, mmap_mode='r' if mmap else None)
+    if rows.dtype.names is None:
+        return None, rows
+    return rows['id'], rows['vector']
+
+class MmapFlatIndex:
+    """memory-mapped (청크 ID, 벡터) 세그먼트들 위에서 동작하는 읽기 전용 정확 내적 검색 인덱스
+
+    FAISS IndexIDMap2(IndexFlatIP)와 같이 search가 청크 ID를 반환하며,
+    파일을 힙으로 읽지 않으므로 서비스 간, 워커 프로세스 간에 페이지 캐시가 공유됩니다.
+    base 세그먼트와 delta 세그먼트를 합치지 않고 각각 검색한 뒤 결과를 병합합니다.
+    """
+
+    def __init__(self, segments, dimension: int):
+        self.segments = [(ids, vectors) for ids, vectors in segments if len(ids)]
+        self.d = dimension
+        self.is_trained = True
+
+    @property
+    def ntotal(self) -> int:
+        return sum(len(ids) for ids, _ in self.segments)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """모든 세그먼트의 청크 ID (추가된 순서)"""
+        if not self.segments:
+            return np.empty(0, dtype='int64')
+        return np.concatenate([np.asarray(ids, dtype='int64') for ids, _ in self.segments])
+
+    def search(self, x, k: int, params=None):
+        """상위 k개의 (내적 점수, 청크 ID) 반환 - FAISS와 같이 부족한 자리는 -1로 채움"""
+        x = np.ascontiguousarray(x, dtype='float32').reshape(-1, self.d)
+        distances = np.full((x.shape[0], k), -np.inf, dtype='float32')
+        labels = np.full((x.shape[0], k), -1, dtype='int64')
+        if self.ntotal == 0 or k <= 0:
+            return distances, labels
+
+        # 삭제 표시된 청크 ID 제외 (ann_index.search_params 참고)
+        exclude_ids = getattr(params, 'exclude_ids', None) if params is not None else None
+
+        # 세그먼트별 상위 k개 후보를 모은 뒤 한 번 더 정렬
+        candidate_scores = []
+        candidate_ids = []
+        for ids, vectors in self.segments:
+            scores = x @ vectors.T  # (쿼리 수, 세그먼트 행 수)
+            if exclude_ids is not None:
+                scores[:, np.isin(ids, exclude_ids)] = -np.inf
+            top = min(k, scores.shape[1])
+            rows = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            candidate_scores.append(np.take_along_axis(scores, rows, axis=1))
+            candidate_ids.append(np.asarray(ids, dtype='int64')[rows])
+        scores = np.concatenate(candidate_scores, axis=1)
+        ids = np.concatenate(candidate_ids, axis=1)
+
+        top = min(k, scores.shape[1])
+        order = np.argsort(-scores, axis=1)[:, :top]
+        distances[:, :top] = np.take_along_axis(scores, order, axis=1)
+        labels[:, :top] = np.take_along_axis(ids, order, axis=1)
+        labels[np.isneginf(distances)] = -1
+        return distances, labels
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """start번째 행부터 count개 벡터를 메모리로 복사"""
+        parts = []
+        offset = 0
+        end = start + count
+        for _, vectors in self.segments:
+            rows = len(vectors)
+            lo, hi = max(start - offset, 0), min(end - offset, rows)
+            if lo < hi:
+                parts.append(np.array(vectors[lo:hi], dtype='float32'))
+            offset += rows
+        if not parts:
+            return np.empty((0, self.d), dtype='float32')
+        return np.concatenate(parts)
+
+class SegmentStore:
+    """사용자 인덱스의 base / delta 세그먼트 파일과 manifest 관리
+
+    - base 세그먼트: Flat은 (청크 ID, 벡터) .npy, HNSW/IVF는 ID 매핑을 포함한 FAISS 파일
+    - delta 세그먼트: base 이후 추가된 (청크 ID, 벡터) .npy (업로드마다 새 행만 기록)
+    새 세그먼트는 manifest를 원자적으로 교체하는 순간에 보이게 되므로,
+    기록 도중 중단되어도 참조되지 않는 파일만 남고 다음 교체 때 정리됩니다.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.directory = os.path.dirname(prefix) or "."
+        self.manifest_path = prefix + "manifest.json"
+
+    def path(self, name: str) -> str:
+        """manifest에 기록된 세그먼트 파일 이름의 전체 경로"""
+        return os.path.join(self.directory, name)
+
+    def exists(self) -> bool:
+        """manifest가 있는지 (없으면 delta를 이어 쓸 수 없으므로 base부터 기록해야 함)"""
+        return os.path.exists(self.manifest_path)
+
+    def read_manifest(self):
+        """manifest 로드 (없으면 None)"""
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def total_rows(manifest) -> int:
+        """manifest가 가리키는 전체 행 수"""
+        return manifest["base"]["rows"] + sum(delta["rows"] for delta in manifest["deltas"])
+
+    @staticmethod
+    def delta_rows(manifest) -> int:
+        """delta 세그먼트의 행 수 합계"""
+        return sum(delta["rows"] for delta in manifest["deltas"])
+
+    def _segment_name(self, manifest, label: str, extension: str):
+        seq = (manifest["seq"] if manifest else 0) + 1
+        return seq, f"{os.path.basename(self.prefix)}{label}-{seq:06d}{extension}"
+
+    def _require_manifest(self):
+        """이어 쓸 manifest 로드 - 없으면 호출자가 base 전체를 다시 기록해야 하므로 예외"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"manifest가 없어 기존 세그먼트에 이어 쓸 수 없음: {self.manifest_path}")
+        return manifest
+
+    def _write_manifest(self, manifest) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def remove_unreferenced(self, manifest) -> int:
+        """manifest가 참조하지 않는 세그먼트 파일 삭제"""
+        referenced = {manifest["base"]["file"]} | {delta["file"] for delta in manifest["deltas"]}
+        removed = 0
+        for label in ("base", "delta"):
+            for path in glob.glob(glob.escape(self.prefix) + label + "-*"):
+                if os.path.basename(path) not in referenced:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError as e:
+                        print(f"세그먼트 파일 삭제 실패 ({path}): {e}")
+        return removed
+
+    def write_base_vectors(self, ids, vectors, tombstones=()):
+        """Flat 인덱스 전체를 새 base 세그먼트로 기록하고 delta를 비움"""
+        manifest = self.read_manifest()
+        seq, name = self._segment_name(manifest, "base", ".npy")
+        save_vectors(self.path(name), ids, vectors)
+        manifest = {"format": MANIFEST_FORMAT, "kind": "flat", "seq": seq,
+                    "base": {"file": name, "rows": len(ids)}, "deltas": [],
+                    "tombstones": [int(chunk_id) for chunk_id in tombstones]}
+        self._write_manifest(manifest)
+        self.remove_unreferenced(manifest)
+        return manifest
+
+    def write_base_index(self, faiss, index, kind: str, tombstones=()):
+        """HNSW/IVF 인덱스 전체를 FAISS 형식의 새 base 세그먼트로 기록하고 delta를 비움"""
+        manifest = self.read_manifest()
+        seq, name = self._segment_name(manifest, "base", ".index")
+        tmp_path = self.path(name) + ".tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.path(name))
+        manifest = {"format": MANIFEST_FORMAT, "kind": kind, "seq": seq,
+                    "base": {"file": name, "rows": int(index.ntotal)}, "deltas": [],
+                    "tombstones": [int(chunk_id) for chunk_id in tombstones]}
+        self._write_manifest(manifest)
+        self.remove_unreferenced(manifest)
+        return manifest
+
+    def append_delta(self, ids, vectors, tombstones=()):
+        """새로 추가된 행만 delta 세그먼트로 기록 (manifest가 없으면 FileNotFoundError)"""
+        manifest = self._require_manifest()
+        seq, name = self._segment_name(manifest, "delta", ".npy")
+        save_vectors(self.path(name), ids, vectors)
+        manifest["seq"] = seq
+        manifest["deltas"].append({"file": name, "rows": len(ids)})
+        manifest["tombstones"] = [int(chunk_id) for chunk_id in tombstones]
+        self._write_manifest(manifest)
+        return manifest
+
+    def set_tombstones(self, tombstones):
+        """세그먼트는 그대로 두고 삭제 표시된 청크 ID 목록만 갱신 (manifest가 없으면 FileNotFoundError)"""
+        manifest = self._require_manifest()
+        manifest["tombstones"] = [int(chunk_id) for chunk_id in tombstones]
+        self._write_manifest(manifest)
+        return manifest
+
+    def delete_all(self) -> int:
+        """manifest와 모든 세그먼트 파일 삭제 (사용자 데이터 정리용)"""
+        removed = 0
+        paths = glob.glob(glob.escape(self.prefix) + "base-*") + glob.glob(glob.escape(self.prefix) + "delta-*")
+        for path in paths + [self.manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def load_deltas(self, manifest, mmap: bool = False):
+        """delta 세그먼트를 manifest 순서대로 (ids, vectors) 목록으로 로드"""
+        return [load_vectors(self.path(delta["file"]), mmap=mmap) for delta in manifest["deltas"]]
+
+    def compact_flat(self, manifest):
+        """Flat base와 delta 세그먼트를 디스크에서 읽어 하나의 base로 병합
+
+        메모리의 인덱스를 건드리지 않으므로 인덱스 락 없이 실행할 수 있습니다.
+        """
+        segments = [load_vectors(self.path(manifest["base"]["file"]), mmap=True)]
+        segments.extend(self.load_deltas(manifest, mmap=True))
+        ids = np.concatenate([np.asarray(seg_ids, dtype='int64') for seg_ids, _ in segments])
+        vectors = np.concatenate([np.asarray(seg_vectors, dtype='float32') for _, seg_vectors in segments])
+        return self.write_base_vectors(ids, vectors, manifest.get("tombstones", []))